@@ -0,0 +1,87 @@
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+
+import discord
+import spotipy as sp
+from discord.ext import commands
+
+from benchmarks.fake_spotify_server import serve
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.database import Database
+from corgi_bot.playlist_manager import PlaylistManager
+from corgi_bot.spotify_pipeline import SpotifyPipeline
+
+# Adding a big dump of tracks to a playlist: the old loop that rebuilt the remaining tracks with set differences
+# after every batch, against PlaylistManager.add_tracks. Runs against a local fake Spotify server.
+# Run with: python -m benchmarks.bench_add_tracks --tracks 10000
+
+
+def old_add_tracks(spotify_client: sp.Spotify, playlist_id: str, all_tracks_to_add: tp.List[str]) -> float:
+    """
+    :return: Seconds spent on deduping and chunking, not counting the requests.
+    """
+    bookkeeping: float = 0.0
+    while len(all_tracks_to_add) > 0:
+        current_batch: tp.List[str] = all_tracks_to_add[:100]
+        spotify_client.playlist_add_items(playlist_id=playlist_id, items=current_batch)
+        start: float = time.perf_counter()
+        all_tracks_to_add = list(set(all_tracks_to_add) - set(current_batch))
+        bookkeeping += time.perf_counter() - start
+    return bookkeeping
+
+
+def make_manager(spotify_client: sp.Spotify, db_path: Path) -> PlaylistManager:
+    # Without credentials the manager skips logging in to Spotify, so the client for the fake server can be swapped in.
+    manager = PlaylistManager(commands.Bot(command_prefix='$', intents=discord.Intents.none()),
+                              AsyncDatabase(Database(connection_url=db_path)),
+                              spotify_credentials_path=str(db_path.parent / 'spotify_credentials.json'))
+    manager.spotify = SpotifyPipeline(spotify_client)
+    return manager
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--tracks', type=int, default=10000)
+    parser.add_argument('--latency', type=float, default=0.01, help='Seconds the fake server takes per request.')
+    parser.add_argument('--rate-limits', type=int, default=0,
+                        help='429s the fake server answers with first. spotipy gives up on them without a Retry-After, '
+                             'so each one costs an exponential backoff.')
+    args = parser.parse_args()
+    # Keep the missing credentials and rate limit warnings out of the results.
+    logging.basicConfig(level=logging.CRITICAL)
+
+    track_ids: tp.List[str] = [f'track{i}' for i in range(args.tracks)]
+    with serve(args.latency) as server, tempfile.TemporaryDirectory(prefix='corgi-bench-') as directory:
+        spotify_client: sp.Spotify = server.client()
+
+        start: float = time.perf_counter()
+        bookkeeping: float = old_add_tracks(spotify_client, 'old', list(track_ids))
+        elapsed: float = time.perf_counter() - start
+        in_order: bool = server.playlists['old'] == track_ids
+        print(f'{"old set difference loop":<26} {elapsed:7.2f}s total, {bookkeeping * 1000:9.1f}ms deduping, '
+              f'order kept: {in_order}')
+
+        manager: PlaylistManager = make_manager(spotify_client, Path(directory) / 'corgi.db')
+        server.rate_limit_adds = args.rate_limits
+
+        async def add() -> int:
+            return await manager.add_tracks('new', track_ids)
+
+        start = time.perf_counter()
+        n_tracks_added: int = asyncio.run(add())
+        elapsed = time.perf_counter() - start
+        in_order = server.playlists['new'] == track_ids
+        print(f'{"PlaylistManager.add_tracks":<26} {elapsed:7.2f}s total, {n_tracks_added} added, '
+              f'{args.rate_limits} rate limits waited out, order kept: {in_order}')
+
+        manager.spotify.close()
+        manager.database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+import argparse
+import datetime as dt
+import random
+import time
+import typing as tp
+
+from benchmarks.common import summarize, temp_db_path, time_calls
+from corgi_bot.analytics import Analytics
+from corgi_bot.database import Database
+
+# $stats queries over a synthetic messages table, answered from the raw messages and from the rollups that Analytics
+# reads: message counts per server and hour (histograms), per server, day and user (windowed per-user counts) and per
+# server and user (all-time counts). Messages are spread over the last year across a few servers, and like in a real
+# server a few regulars send most of them.
+# Run with: python -m benchmarks.bench_analytics --messages 10000000
+
+SERVER_ID: int = 1
+N_SERVERS: int = 5
+N_USERS: int = 5000
+DAYS_OF_HISTORY: int = 365
+
+
+def fill_messages(db: Database, n_messages: int, batch_size: int = 100000):
+    now: float = dt.datetime.now(dt.timezone.utc).timestamp()
+    user_weights: tp.List[float] = [1.0 / (rank + 1) for rank in range(N_USERS)]
+    for start in range(0, n_messages, batch_size):
+        n_batch: int = min(start + batch_size, n_messages) - start
+        user_ids: tp.List[int] = random.choices(range(N_USERS), weights=user_weights, k=n_batch)
+        db.execute_many('insert into messages (message_id, user_id, server_id, sent_time) values (?, ?, ?, ?)',
+                        ((start + i, user_ids[i], (start + i) % N_SERVERS,
+                          now - random.random() * DAYS_OF_HISTORY * 24 * 60 * 60) for i in range(n_batch)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--calls', type=int, default=10)
+    args = parser.parse_args()
+
+    with temp_db_path() as db_path:
+        db = Database(connection_url=db_path)
+        start: float = time.perf_counter()
+        fill_messages(db, args.messages)
+        elapsed: float = time.perf_counter() - start
+        print(f'Inserted {args.messages} messages (and rolled them up) in {elapsed:.1f}s, '
+              f'{args.messages / elapsed:.0f} messages/s')
+        with db.get_connection() as connection:
+            for table_name in ('message_counts_hourly', 'message_counts_daily', 'message_counts_total'):
+                n_rows: int = connection.execute(f'select count(*) from {table_name}').fetchone()[0]
+                print(f'{table_name} has {n_rows} rows')
+
+        analytics = Analytics(db)
+        user_id: int = 0
+        with db.get_connection() as connection:
+            for days in (7, None):
+                window: str = f'last {days} days' if days is not None else 'all time'
+                since: float = dt.datetime.now(dt.timezone.utc).timestamp() - days * 24 * 60 * 60 \
+                    if days is not None else 0
+                print(f'Top 10 posters, {window}:')
+                print(summarize('  raw messages', time_calls(lambda: connection.execute(
+                    'select user_id, count(*) as n_messages from messages where server_id = ? and sent_time >= ? '
+                    'group by user_id order by n_messages desc limit 10', (SERVER_ID, since)).fetchall(), args.calls)))
+                print(summarize('  rollups', time_calls(lambda: analytics.get_top_posters(SERVER_ID, days),
+                                                        args.calls)))
+
+                print(f'One user\'s message count, {window}:')
+                print(summarize('  raw messages', time_calls(lambda: connection.execute(
+                    'select count(*) from messages where server_id = ? and user_id = ? and sent_time >= ?',
+                    (SERVER_ID, user_id, since)).fetchone(), args.calls)))
+                print(summarize('  rollups', time_calls(
+                    lambda: analytics.get_user_message_count(SERVER_ID, user_id, days), args.calls)))
+
+                print(f'Hourly histogram, {window}:')
+                print(summarize('  raw messages', time_calls(lambda: connection.execute(
+                    'select cast(sent_time / 3600 as integer) % 24 as bucket, count(*) from messages '
+                    'where server_id = ? and sent_time >= ? group by bucket', (SERVER_ID, since)).fetchall(),
+                                                             args.calls)))
+                print(summarize('  rollups', time_calls(lambda: analytics.get_hourly_histogram(SERVER_ID, days),
+                                                        args.calls)))
+
+                print(f'One user\'s weekday histogram, {window}:')
+                print(summarize('  raw messages', time_calls(lambda: connection.execute(
+                    'select (cast(sent_time / 86400 as integer) + 3) % 7 as bucket, count(*) from messages '
+                    'where server_id = ? and user_id = ? and sent_time >= ? group by bucket',
+                    (SERVER_ID, user_id, since)).fetchall(), args.calls)))
+                print(summarize('  rollups', time_calls(
+                    lambda: analytics.get_daily_histogram(SERVER_ID, days, user_id), args.calls)))
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+import argparse
+import random
+import re
+import typing as tp
+
+from benchmarks.common import summarize, time_calls
+from corgi_bot.callouts import match_callout
+
+# Classifying a mention the way handle_callout used to (compile three regexes, then search with each of them)
+# against the single precompiled alternation in corgi_bot.callouts.
+# Run with: python -m benchmarks.bench_callouts
+
+CORPUS: tp.List[str] = [
+    '<@1234567890> good boy',
+    '<@1234567890> who is a good dog?',
+    '<@1234567890> BAD DOG! get off the couch',
+    '<@1234567890> want a treat?',
+    '<@1234567890> hey can you play something in the voice channel later tonight',
+    '<@1234567890> lol',
+    '<@1234567890> did anyone see the game last night, that last minute goal was unreal and I still cannot believe it',
+    'honestly <@1234567890> has been such a good boy today, he deserves a treat',
+    '<@1234567890> https://open.spotify.com/track/4uLU6hMCjMI75M1A2tKUQC check this out',
+    '<@1234567890> ' + 'blah ' * 200,
+]
+
+
+def old_match_callout(content: str) -> tp.Optional[str]:
+    good_boy: re.Pattern = re.compile(r'good (?:boy|dog)\s*(?P<question>\?)?', re.IGNORECASE)
+    bad_dog: re.Pattern = re.compile(r'bad dog!?', re.IGNORECASE)
+    treat: re.Pattern = re.compile(r'treat\??', re.IGNORECASE)
+    good_boy_match: re.Match = good_boy.search(content)
+    bad_dog_match: re.Match = bad_dog.search(content)
+    treat_match: re.Match = treat.search(content)
+    if good_boy_match is not None:
+        return 'good_boy'
+    if bad_dog_match is not None:
+        return 'bad_dog'
+    if treat_match is not None:
+        return 'treat'
+    return None
+
+
+def new_match_callout(content: str) -> tp.Optional[str]:
+    match: tp.Optional[re.Match] = match_callout(content)
+    return match.lastgroup if match is not None else None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=100000)
+    args = parser.parse_args()
+
+    messages: tp.List[str] = [random.choice(CORPUS) for _ in range(args.messages)]
+    for message in CORPUS:
+        assert old_match_callout(message) == new_match_callout(message), message
+
+    old_messages = iter(messages)
+    print(summarize('three regexes per mention', time_calls(lambda: old_match_callout(next(old_messages)),
+                                                            args.messages)))
+    new_messages = iter(messages)
+    print(summarize('single precompiled pass', time_calls(lambda: new_match_callout(next(new_messages)),
+                                                          args.messages)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,43 @@
+import argparse
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+from benchmarks.common import summarize, temp_db_path, time_calls
+from corgi_bot.database import ConnectionPool, Database
+
+# Per-call latency of a point read with the connection pool, against opening a fresh connection (and applying the
+# PRAGMAs) for every call like Database.get_connection used to.
+# Run with: python -m benchmarks.bench_connection_pool
+
+
+def fresh_connection_read(connection_url: Path):
+    with closing(sqlite3.connect(connection_url)) as connection:
+        for pragma, value in ConnectionPool.PRAGMAS.items():
+            connection.execute(f'PRAGMA {pragma} = {value};')
+        connection.execute('select affection from relations where server_id = ? and user_id = ?', (1, 42)).fetchone()
+
+
+def pooled_read(db: Database):
+    with db.get_connection() as connection:
+        connection.execute('select affection from relations where server_id = ? and user_id = ?', (1, 42)).fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--calls', type=int, default=5000)
+    args = parser.parse_args()
+
+    with temp_db_path() as connection_url:
+        db = Database(connection_url=connection_url)
+        db.execute_many('insert into relations (user_id, server_id, affection) values (?, ?, ?)',
+                        [(user_id, 1, user_id) for user_id in range(10000)])
+
+        print(summarize('fresh connection per call', time_calls(lambda: fresh_connection_read(connection_url),
+                                                                args.calls)))
+        print(summarize('pooled connection', time_calls(lambda: pooled_read(db), args.calls)))
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
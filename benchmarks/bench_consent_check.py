@@ -0,0 +1,102 @@
+import argparse
+import asyncio
+import random
+import time
+import types
+import typing as tp
+
+import discord
+
+from corgi_bot.data_manager import COOL_WITH_DATA_ROLE_NAME, DataManager
+
+# Checking whether a message's author is Cool With Data in a simulated 100k member guild, the old way (find the role
+# by name, then walk role.members which goes over every member of the guild) against DataManager.is_user_cool_with_data.
+# The guild is a stand-in but the roles and members are real discord.py objects, so role.members and get_role
+# do the same work they would on a live guild.
+# Run with: python -m benchmarks.bench_consent_check --members 100000
+
+GUILD_ID: int = 1
+
+
+class SimulatedState:
+    """
+    Just enough of discord.py's ConnectionState to build members.
+    """
+
+    def store_user(self, data) -> discord.User:
+        return discord.User(state=self, data=data)
+
+
+def make_guild(n_members: int, n_roles: int, cool_share: float) -> types.SimpleNamespace:
+    state = SimulatedState()
+    guild = types.SimpleNamespace(id=GUILD_ID, name='Simulated', roles=[], _members=dict())
+    guild.default_role = discord.Role(guild=guild, state=state, data={'id': GUILD_ID, 'name': '@everyone'})
+    guild.roles.append(guild.default_role)
+    for role_id in range(2, n_roles + 1):
+        guild.roles.append(discord.Role(guild=guild, state=state, data={'id': role_id, 'name': f'role {role_id}'}))
+    cool_with_data_role = discord.Role(guild=guild, state=state,
+                                       data={'id': n_roles + 1, 'name': COOL_WITH_DATA_ROLE_NAME})
+    guild.roles.append(cool_with_data_role)
+    roles_by_id: tp.Dict[int, discord.Role] = {role.id: role for role in guild.roles}
+    guild.get_role = roles_by_id.get
+
+    for member_id in range(1000, 1000 + n_members):
+        role_ids: tp.List[int] = random.sample(range(2, n_roles + 1), 3)
+        if random.random() < cool_share:
+            role_ids.append(cool_with_data_role.id)
+        guild._members[member_id] = discord.Member(
+            data={'user': {'id': member_id, 'username': f'user{member_id}', 'discriminator': '0', 'avatar': None},
+                  'roles': role_ids, 'flags': 0},
+            guild=guild, state=state)
+    return guild
+
+
+async def old_is_user_cool_with_data(guild, user: discord.Member) -> bool:
+    cool_with_data_role: discord.Role = discord.utils.get(guild.roles, name=COOL_WITH_DATA_ROLE_NAME)
+    if len(cool_with_data_role.members) <= 0:
+        return False
+    len(cool_with_data_role.members)
+    return cool_with_data_role in user.roles
+
+
+def time_checks(check: tp.Callable[[discord.Member], tp.Awaitable[bool]], members: tp.Sequence[discord.Member]) \
+        -> tp.Tuple[float, int]:
+    """
+    :return: Mean seconds per check, and how many members were cool with data.
+    """
+
+    async def run() -> tp.Tuple[float, int]:
+        n_cool: int = 0
+        start: float = time.perf_counter()
+        for member in members:
+            n_cool += await check(member)
+        return (time.perf_counter() - start) / len(members), n_cool
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--members', type=int, default=100000)
+    parser.add_argument('--roles', type=int, default=200)
+    parser.add_argument('--checks', type=int, default=20, help='Messages to check the old way. It is slow.')
+    args = parser.parse_args()
+
+    start: float = time.perf_counter()
+    guild = make_guild(args.members, args.roles, cool_share=0.3)
+    print(f'Built a guild with {args.members} members and {args.roles} roles in {time.perf_counter() - start:.1f}s')
+
+    client = types.SimpleNamespace(get_guild=lambda guild_id: guild if guild_id == GUILD_ID else None,
+                                   command_prefix='$')
+    data_manager = DataManager(client, types.SimpleNamespace(database=None))
+
+    authors: tp.List[discord.Member] = random.choices(list(guild._members.values()), k=100000)
+    old, old_cool = time_checks(lambda member: old_is_user_cool_with_data(guild, member), authors[:args.checks])
+    new, new_cool = time_checks(lambda member: data_manager.is_user_cool_with_data(member, GUILD_ID), authors)
+    assert old_cool == sum(member.get_role(args.roles + 1) is not None for member in authors[:args.checks])
+    print(f'{"role.members":<28} {old * 1e6:12.1f}us/message')
+    print(f'{"is_user_cool_with_data":<28} {new * 1e6:12.1f}us/message ({new_cool / len(authors):.0%} cool with data)')
+
+
+if __name__ == '__main__':
+    main()
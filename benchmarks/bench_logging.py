@@ -0,0 +1,86 @@
+import argparse
+import contextlib
+import logging
+import os
+import sys
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+
+from benchmarks.common import summarize, time_calls
+from corgi_bot.log_setup import LOG_FORMAT, setup_logging
+
+# What one log line costs whoever logs it, with the old setup against the queue backed pipeline from setup_logging().
+# The old setup attached a plain FileHandler twice (setup() ran twice) on top of discord.py's console handler,
+# so every INFO line was formatted and written three times on the event loop.
+# Also times a DEBUG line on a logger that's at INFO, which is what the hot paths cost in production.
+# Run with: python -m benchmarks.bench_logging
+
+LOGGER_NAME: str = 'corgi_bot.bench_logging'
+
+
+def log_lines(logger: logging.Logger, n_lines: int) -> tp.Tuple[tp.List[float], tp.List[float]]:
+    """
+    :return: Timings of INFO lines, then of DEBUG lines that get filtered out.
+    """
+    message_ids = iter(range(n_lines * 2))
+    info_timings: tp.List[float] = time_calls(
+        lambda: logger.info('Tallied message %d from user %d in server %d', next(message_ids), 42, 7), n_lines)
+    debug_timings: tp.List[float] = time_calls(
+        lambda: logger.debug('Tallied message %d from user %d in server %d', next(message_ids), 42, 7), n_lines)
+    return info_timings, debug_timings
+
+
+def reset_logging():
+    root_logger: logging.Logger = logging.getLogger()
+    for logger in (root_logger, logging.getLogger(LOGGER_NAME)):
+        for handler in list(logger.handlers):
+            logger.removeHandler(handler)
+            handler.close()
+        logger.setLevel(logging.NOTSET)
+
+
+def old_setup(log_directory: Path) -> logging.Logger:
+    logging.getLogger().addHandler(logging.StreamHandler(sys.stderr))
+    logger: logging.Logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(logging.INFO)
+    for _ in range(2):
+        handler = logging.FileHandler(filename=log_directory / 'old.log', encoding='utf-8', mode='a')
+        handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        logger.addHandler(handler)
+    return logger
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--lines', type=int, default=20000)
+    args = parser.parse_args()
+
+    # Console output goes nowhere so the terminal doesn't slow either side down.
+    with tempfile.TemporaryDirectory(prefix='corgi-bench-') as directory, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+        log_directory = Path(directory)
+
+        info_timings, debug_timings = log_lines(old_setup(log_directory), args.lines)
+        reset_logging()
+        results: tp.List[str] = [summarize('old INFO line', info_timings), summarize('old DEBUG line', debug_timings)]
+
+        os.environ['CORGI_LOG_LEVEL'] = 'INFO'
+        listener = setup_logging(log_directory / 'corgi_bot.log')
+        info_timings, debug_timings = log_lines(logging.getLogger(LOGGER_NAME), args.lines)
+        # How long the listener thread takes to write out everything that was queued.
+        drain_start: float = time.perf_counter()
+        listener.stop()
+        drain_seconds: float = time.perf_counter() - drain_start
+        reset_logging()
+        for handler in listener.handlers:
+            handler.close()
+        results += [summarize('queued INFO line', info_timings), summarize('queued DEBUG line', debug_timings),
+                    f'listener finished writing {drain_seconds * 1e3:.1f}ms after the last line was queued']
+
+    print('\n'.join(results))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import time
+import typing as tp
+
+from benchmarks.common import temp_db_path
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.database import Database
+from corgi_bot.message_buffer import MessageBuffer
+
+# Messages per second DataManager can tally, committing every message on its own like it used to
+# against going through MessageBuffer.
+# Run with: python -m benchmarks.bench_message_buffer
+
+INSERT_SQL: str = 'insert or ignore into messages (message_id, user_id, server_id, sent_time) values (?, ?, ?, ?)'
+
+
+def make_rows(n_messages: int, first_id: int) -> tp.List[tp.Tuple[int, int, int, float]]:
+    return [(first_id + i, i % 500, i % 10, 1700000000.0 + i) for i in range(n_messages)]
+
+
+async def unbuffered(db: AsyncDatabase, rows: tp.Sequence[tp.Sequence]):
+    for row in rows:
+        await db.execute(INSERT_SQL, row)
+
+
+async def buffered(db: AsyncDatabase, rows: tp.Sequence[tp.Sequence]):
+    message_buffer = MessageBuffer(db, INSERT_SQL)
+    message_buffer.start()
+    for row in rows:
+        await message_buffer.put(row)
+    await message_buffer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=20000)
+    args = parser.parse_args()
+
+    with temp_db_path() as db_path:
+        db = AsyncDatabase(Database(connection_url=db_path))
+        for name, write, first_id in (('unbuffered', unbuffered, 0), ('MessageBuffer', buffered, args.messages)):
+            rows = make_rows(args.messages, first_id)
+            start: float = time.perf_counter()
+            asyncio.run(write(db, rows))
+            elapsed: float = time.perf_counter() - start
+            print(f'{name:<14} {args.messages / elapsed:10.0f} messages/s')
+
+        with db.database.get_connection() as connection:
+            assert connection.execute('select count(*) from messages').fetchone()[0] == 2 * args.messages
+        db.close()
+
+
+if __name__ == '__main__':
+    main()
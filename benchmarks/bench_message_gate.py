@@ -0,0 +1,85 @@
+import argparse
+import asyncio
+import logging
+import os
+import re
+import tempfile
+import time
+import types
+import typing as tp
+from pathlib import Path
+
+from benchmarks.bench_add_tracks import make_manager
+from benchmarks.fake_spotify_server import serve
+from corgi_bot.playlist_manager import PlaylistManager
+
+# What PlaylistManager.on_message costs for ordinary chat, in the music channel and everywhere else,
+# against the old listener that stat'ed the saved playlist file and compiled the link regex for every message.
+# Run with: python -m benchmarks.bench_message_gate
+
+MUSIC_CHANNEL_ID: int = 1
+OTHER_CHANNEL_ID: int = 2
+CHAT: str = 'did anyone see the game last night, that last minute goal was unreal and I still cannot believe it'
+
+
+async def old_on_message(saved_playlist_path: str, music_channel_id: int, message) -> int:
+    if os.path.exists(saved_playlist_path):
+        pass
+    if message.author.bot:
+        return 0
+    if message.channel.id != music_channel_id:
+        return 0
+
+    spotify_regex: re.Pattern = re.compile(
+        r'https://open.spotify.com/(?P<link_type>track|album|playlist)/(?P<id>[0-9A-Za-z]+)(?:\?.+)?')
+    found_matches: tp.Dict[str, tp.List[str]] = {'track': [], 'album': [], 'playlist': []}
+    for match in spotify_regex.finditer(message.content):
+        found_matches[match['link_type']].append(match['id'])
+    return sum(len(ids) for ids in found_matches.values())
+
+
+def time_messages(handler: tp.Callable[[tp.Any], tp.Awaitable], message, n_messages: int) -> float:
+    """
+    :return: Mean seconds per message.
+    """
+
+    async def run() -> float:
+        start: float = time.perf_counter()
+        for _ in range(n_messages):
+            await handler(message)
+        return (time.perf_counter() - start) / n_messages
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=200000)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)
+
+    author = types.SimpleNamespace(bot=False)
+    messages: tp.Dict[str, types.SimpleNamespace] = {
+        'other channel': types.SimpleNamespace(channel=types.SimpleNamespace(id=OTHER_CHANNEL_ID), author=author,
+                                               content=CHAT),
+        'music channel, no link': types.SimpleNamespace(channel=types.SimpleNamespace(id=MUSIC_CHANNEL_ID),
+                                                        author=author, content=CHAT),
+    }
+
+    with serve(0.0) as server, tempfile.TemporaryDirectory(prefix='corgi-bench-') as directory:
+        manager: PlaylistManager = make_manager(server.client(), Path(directory) / 'corgi.db')
+        manager._route_channel(MUSIC_CHANNEL_ID, 1, 'playlist')
+        saved_playlist_path: str = os.path.join(directory, 'playlist_id.json')
+
+        for name, message in messages.items():
+            old: float = time_messages(lambda m: old_on_message(saved_playlist_path, MUSIC_CHANNEL_ID, m), message,
+                                       args.messages)
+            new: float = time_messages(manager.on_message, message, args.messages)
+            print(f'{name:<24} old {old * 1e9:8.0f}ns/message   new {new * 1e9:8.0f}ns/message')
+
+        manager.spotify.close()
+        manager.database.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+import argparse
+import random
+import sqlite3
+import time
+from contextlib import closing
+from pathlib import Path
+
+from benchmarks.common import summarize, temp_db_path, time_calls
+from corgi_bot import migrations
+
+# Builds a legacy (user_version 0, all TEXT, no keys) database with --rows relations and quotes, times migrating it
+# in place, and compares the hot lookups before and after.
+# Run with: python -m benchmarks.bench_migrations --rows 1000000
+
+N_SERVERS: int = 50
+
+
+def build_legacy_database(db_path: Path, n_rows: int):
+    with closing(sqlite3.connect(db_path)) as connection:
+        migrations._create_legacy_tables(connection)
+        connection.executemany('insert into relations values (?, ?, ?, ?)',
+                               ((str(user_id), random.randint(-10, 500), '2024-01-01 00:00:00.000000',
+                                 str(user_id % N_SERVERS)) for user_id in range(n_rows)))
+        connection.executemany('insert into quotes values (?, ?, ?, ?)',
+                               ((f'bork number {i}', f'author {i % 100}', str(1700000000.0 + i), str(i % N_SERVERS))
+                                for i in range(n_rows)))
+        connection.commit()
+
+
+def time_lookups(connection: sqlite3.Connection, server_id, n_calls: int):
+    user_ids = [random.randrange(0, 100000) for _ in range(n_calls)]
+    point_reads = iter(user_ids)
+    print(summarize('  relation by (server, user)', time_calls(lambda: connection.execute(
+        'select affection from relations where server_id = ? and user_id = ?',
+        (server_id, next(point_reads))).fetchone(), n_calls)))
+    print(summarize('  max(affection) for server', time_calls(lambda: connection.execute(
+        'select max(affection) from relations where server_id = ?', (server_id,)).fetchone(), n_calls)))
+    print(summarize('  top 10 for server', time_calls(lambda: connection.execute(
+        'select user_id, affection from relations where server_id = ? order by affection desc limit 10',
+        (server_id,)).fetchall(), n_calls)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--calls', type=int, default=20)
+    args = parser.parse_args()
+
+    with temp_db_path() as db_path:
+        start: float = time.perf_counter()
+        build_legacy_database(db_path, args.rows)
+        print(f'Built a legacy database with {args.rows} relations and quotes in {time.perf_counter() - start:.1f}s')
+
+        with closing(sqlite3.connect(db_path)) as connection:
+            print('Before migrating:')
+            time_lookups(connection, str(N_SERVERS // 2), args.calls)
+
+            start = time.perf_counter()
+            migrations.migrate(connection)
+            print(f'Migrated in place in {time.perf_counter() - start:.1f}s')
+
+            print('After migrating:')
+            time_lookups(connection, N_SERVERS // 2, args.calls)
+
+
+if __name__ == '__main__':
+    main()
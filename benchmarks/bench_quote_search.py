@@ -0,0 +1,76 @@
+import argparse
+import itertools
+import random
+import sqlite3
+import string
+import typing as tp
+
+from benchmarks.common import summarize, temp_db_path, time_calls
+from corgi_bot.database import Database
+
+# $quote search through the FTS5 index against a naive LIKE '%word%' scan for the newest matching quotes,
+# for one guild with 10k, 100k and 1M quotes. The target is under 10ms at 1M quotes.
+# Words are drawn from a Zipf distribution like real chat, and searched for by how common they are:
+# the most common word shows up in most quotes, the 10000th in a handful.
+# Run with: python -m benchmarks.bench_quote_search
+
+SERVER_ID: int = 1
+N_WORDS: int = 20000
+WORD_RANKS: tp.Tuple[int, ...] = (0, 9, 99, 999, 9999)
+
+
+def make_vocabulary(rng: random.Random) -> tp.List[str]:
+    words: tp.Set[str] = set()
+    while len(words) < N_WORDS:
+        words.add(''.join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))))
+    vocabulary: tp.List[str] = sorted(words)
+    rng.shuffle(vocabulary)
+    return vocabulary
+
+
+def make_quotes(rng: random.Random, vocabulary: tp.List[str], n_quotes: int) -> tp.Iterator[tp.Tuple]:
+    cumulative_weights: tp.List[float] = list(itertools.accumulate(1 / (rank + 1) ** 1.1
+                                                                   for rank in range(len(vocabulary))))
+    for i in range(n_quotes):
+        quote: str = ' '.join(rng.choices(vocabulary, cum_weights=cumulative_weights, k=rng.randint(4, 16)))
+        yield quote, f'author {i % 100}', 1700000000.0 + i, SERVER_ID
+
+
+def like_search(connection: sqlite3.Connection, terms: str) -> tp.List[tp.Tuple]:
+    words: tp.List[str] = terms.split()
+    return connection.execute(
+        'select quote, author, time from quotes where server_id = ? and '
+        + ' and '.join('quote like ?' for _ in words) + ' order by time desc limit 6',
+        (SERVER_ID, *(f'%{word}%' for word in words))).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    vocabulary: tp.List[str] = make_vocabulary(rng)
+    searches: tp.Dict[str, str] = {f'word #{rank + 1}': vocabulary[rank] for rank in WORD_RANKS}
+    searches['words #10 and #100'] = f'{vocabulary[9]} {vocabulary[99]}'
+    searches['missing word'] = 'doggo'
+
+    for n_quotes in args.sizes:
+        with temp_db_path() as db_path:
+            db = Database(connection_url=db_path)
+            db.execute_many('insert into quotes (quote, author, time, server_id) values (?, ?, ?, ?)',
+                            make_quotes(rng, vocabulary, n_quotes))
+
+            print(f'{n_quotes} quotes:')
+            for name, terms in searches.items():
+                with db.get_connection() as connection:
+                    print(summarize(f'  like {name}', time_calls(lambda: like_search(connection, terms), args.calls)))
+                print(summarize(f'  fts {name}', time_calls(lambda: db.search_quotes(SERVER_ID, terms), args.calls)))
+            print(summarize('  fts author', time_calls(lambda: db.search_quotes(SERVER_ID, 'author 42', by_author=True),
+                                                        args.calls)))
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
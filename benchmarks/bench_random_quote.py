@@ -0,0 +1,42 @@
+import argparse
+import sqlite3
+
+from benchmarks.common import summarize, temp_db_path, time_calls
+from corgi_bot.database import Database
+
+# $quote with ORDER BY random() (what get_random_quote used to do) against the in-memory id array it uses now,
+# for one guild with 10k, 100k and 1M quotes.
+# Run with: python -m benchmarks.bench_random_quote
+
+SERVER_ID: int = 1
+
+
+def order_by_random(connection: sqlite3.Connection):
+    return connection.execute('select quote, author, time from quotes where server_id = ? order by random() limit 1',
+                              (SERVER_ID,)).fetchone()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--calls', type=int, default=50)
+    args = parser.parse_args()
+
+    for n_quotes in args.sizes:
+        with temp_db_path() as db_path:
+            db = Database(connection_url=db_path)
+            db.execute_many('insert into quotes (quote, author, time, server_id) values (?, ?, ?, ?)',
+                            ((f'bork number {i}', f'author {i % 100}', 1700000000.0 + i, SERVER_ID)
+                             for i in range(n_quotes)))
+
+            print(f'{n_quotes} quotes:')
+            with db.get_connection() as connection:
+                print(summarize('  order by random()', time_calls(lambda: order_by_random(connection), args.calls)))
+            # The first call loads the id array, so time it on its own.
+            print(summarize('  id array (first call)', time_calls(lambda: db.get_random_quote(SERVER_ID), 1)))
+            print(summarize('  id array', time_calls(lambda: db.get_random_quote(SERVER_ID), args.calls)))
+            db.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import asyncio
+import time
+import typing as tp
+
+import spotipy as sp
+
+from benchmarks.fake_spotify_server import serve
+from corgi_bot.spotify_pipeline import SpotifyPipeline
+
+# How long resolving a message full of album and playlist links takes, and how long it blocks the event loop,
+# calling spotipy straight from the event loop one link at a time (how PlaylistManager used to work) against
+# SpotifyPipeline. Runs against a local fake Spotify server with a fixed delay on every request.
+# Run with: python -m benchmarks.bench_spotify_pipeline
+
+
+def resolve_on_loop(spotify_client: sp.Spotify, links: tp.Sequence[tp.Tuple[str, str]]) -> tp.List[str]:
+    track_ids: tp.List[str] = []
+    for link_type, link_id in links:
+        if link_type == 'album':
+            response = spotify_client.album_tracks(album_id=link_id)
+            track_ids.extend(track['id'] for track in response['items'])
+        else:
+            response = spotify_client.playlist_items(playlist_id=link_id)
+            items = list(response['items'])
+            while response['next']:
+                response = spotify_client.next(response)
+                items.extend(response['items'])
+            track_ids.extend(item['track']['id'] for item in items)
+    return track_ids
+
+
+async def measure(resolve: tp.Callable[[], tp.Awaitable[tp.List[str]]]) -> tp.Tuple[float, float, int]:
+    """
+    :return: Seconds it took to resolve every link, the longest the event loop went without running a task,
+             and how many tracks came back.
+    """
+    stalls: tp.List[float] = []
+    done = asyncio.Event()
+
+    async def watch_loop():
+        while not done.is_set():
+            start: float = time.perf_counter()
+            await asyncio.sleep(0.001)
+            stalls.append(time.perf_counter() - start)
+
+    watcher = asyncio.create_task(watch_loop())
+    await asyncio.sleep(0)
+    start: float = time.perf_counter()
+    track_ids: tp.List[str] = await resolve()
+    elapsed: float = time.perf_counter() - start
+    done.set()
+    await watcher
+    return elapsed, max(stalls, default=0.0), len(track_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--links', type=int, default=8, help='Album links and playlist links in the message, each.')
+    parser.add_argument('--tracks', type=int, default=120, help='Tracks in each album and playlist.')
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds the fake server takes per request.')
+    args = parser.parse_args()
+
+    with serve(args.latency) as server:
+        links: tp.List[tp.Tuple[str, str]] = []
+        for i in range(args.links):
+            server.albums[f'album{i}'] = [f'album{i}track{j}' for j in range(args.tracks)]
+            server.playlists[f'playlist{i}'] = [f'playlist{i}track{j}' for j in range(args.tracks)]
+            links.extend([('album', f'album{i}'), ('playlist', f'playlist{i}')])
+
+        spotify_client: sp.Spotify = server.client()
+
+        async def on_loop() -> tp.List[str]:
+            return resolve_on_loop(spotify_client, links)
+
+        elapsed, stall, n_tracks = asyncio.run(measure(on_loop))
+        print(f'{"spotipy on the event loop":<28} {elapsed * 1000:8.1f}ms total, loop blocked up to '
+              f'{stall * 1000:8.1f}ms, {n_tracks} tracks')
+
+        pipeline = SpotifyPipeline(spotify_client)
+        elapsed, stall, n_tracks = asyncio.run(measure(lambda: pipeline.resolve_links(links)))
+        print(f'{"SpotifyPipeline":<28} {elapsed * 1000:8.1f}ms total, loop blocked up to '
+              f'{stall * 1000:8.1f}ms, {n_tracks} tracks')
+        pipeline.close()
+
+
+if __name__ == '__main__':
+    main()
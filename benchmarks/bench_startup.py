@@ -0,0 +1,165 @@
+import argparse
+import asyncio
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import typing as tp
+from pathlib import Path
+from unittest import mock
+
+# Cold start of the bot in a fresh interpreter each run:
+#  - how long importing corgi_bot.main and corgi_bot.bot takes, with the slowest imports from python -X importtime
+#  - how long until the bot has identified with a stub gateway (on_connect) and until discord.py calls it ready
+#    (on_ready, which always waits guild_ready_timeout after the last guild arrives)
+# The stub gateway and REST API run locally, so no token or network is needed. The database goes in a temp directory.
+# Run with: python -m benchmarks.bench_startup
+
+BOT_USER: tp.Dict[str, tp.Any] = {'id': '1000', 'username': 'Corgi Bot', 'discriminator': '0', 'avatar': None,
+                                  'bot': True}
+
+
+async def start_stub_gateway():
+    """
+    Just enough of Discord's REST API and gateway for a bot to log in, identify, and get READY.
+    :return: The aiohttp runner, and the base url it listens on.
+    """
+    from aiohttp import WSMsgType, web
+
+    def json_response(body: tp.Dict[str, tp.Any]) -> web.Response:
+        # discord.py only decodes JSON when the content type is exactly this, without a charset.
+        return web.Response(body=json.dumps(body).encode('utf-8'), headers={'Content-Type': 'application/json'})
+
+    async def get_user(request: web.Request) -> web.Response:
+        return json_response(BOT_USER)
+
+    async def get_application(request: web.Request) -> web.Response:
+        return json_response({'id': BOT_USER['id'], 'name': BOT_USER['username'], 'icon': None, 'description': '',
+                              'bot_public': True, 'bot_require_code_grant': False, 'verify_key': '', 'flags': 0,
+                              'owner': BOT_USER})
+
+    async def gateway(request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({'op': 10, 'd': {'heartbeat_interval': 45000}})
+        async for message in ws:
+            if message.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(message.data)
+            if payload['op'] == 1:
+                await ws.send_json({'op': 11})
+            elif payload['op'] == 2:
+                await ws.send_json({'op': 0, 't': 'READY', 's': 1, 'd': {
+                    'v': 10, 'user': BOT_USER, 'guilds': [], 'session_id': 'stub',
+                    'resume_gateway_url': str(request.url.with_query(None)),
+                    'application': {'id': BOT_USER['id'], 'flags': 0}}})
+        return ws
+
+    app = web.Application()
+    app.router.add_get('/api/v10/users/@me', get_user)
+    app.router.add_get('/api/v10/oauth2/applications/@me', get_application)
+    app.router.add_get('/gateway', gateway)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    port: int = runner.addresses[0][1]
+    return runner, f'http://127.0.0.1:{port}'
+
+
+async def time_to_ready(db_directory: Path) -> tp.Dict[str, float]:
+    timings: tp.Dict[str, float] = dict()
+    start: float = time.perf_counter()
+    from corgi_bot.bot import create_bot
+    from corgi_bot.config import BotConfig
+    timings['import corgi_bot.bot'] = time.perf_counter() - start
+
+    import discord
+    import yarl
+
+    runner, base_url = await start_stub_gateway()
+    discord.http.Route.BASE = f'{base_url}/api/v10'
+    discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f'{base_url.replace("http", "ws")}/gateway')
+
+    start = time.perf_counter()
+    with mock.patch('corgi_bot.database.get_db_directory', return_value=db_directory):
+        bot = create_bot(BotConfig(spotify_credentials_path=os.path.join(db_directory, 'missing.json'),
+                                   backup_interval_hours=0))
+        connected = asyncio.Event()
+
+        async def on_connect():
+            connected.set()
+
+        bot.add_listener(on_connect, 'on_connect')
+        bot_task = asyncio.create_task(bot.start('stub-token'))
+        connected_task = asyncio.create_task(connected.wait())
+        await asyncio.wait([bot_task, connected_task], return_when=asyncio.FIRST_COMPLETED)
+        if bot_task.done():
+            connected_task.cancel()
+            # The bot stopped before it connected, so show why.
+            await bot_task
+            raise RuntimeError('The bot stopped before connecting to the stub gateway.')
+        timings['create_bot to on_connect'] = time.perf_counter() - start
+        await bot.wait_until_ready()
+        timings['create_bot to on_ready'] = time.perf_counter() - start
+
+        await bot.close()
+        await bot_task
+    await runner.cleanup()
+    return timings
+
+
+def run_child():
+    with tempfile.TemporaryDirectory(prefix='corgi-bench-') as directory:
+        start: float = time.perf_counter()
+        import corgi_bot.main  # noqa: F401
+        timings: tp.Dict[str, float] = {'import corgi_bot.main': time.perf_counter() - start}
+        timings.update(asyncio.run(time_to_ready(Path(directory))))
+    print(json.dumps(timings))
+
+
+def slowest_imports(module: str, top_n: int) -> tp.List[tp.Tuple[int, str]]:
+    """
+    :return: (cumulative microseconds, module) for the slowest imports under module, slowest first.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], capture_output=True,
+                            text=True, check=True)
+    imports: tp.List[tp.Tuple[int, str]] = []
+    for line in result.stderr.splitlines():
+        match = re.match(r'import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)', line)
+        if match is not None and len(match[2]) <= 3:
+            imports.append((int(match[1]), match[3]))
+    return sorted(imports, reverse=True)[:top_n]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child()
+        return
+
+    for module in ('corgi_bot.main', 'corgi_bot.bot'):
+        print(f'Slowest top level imports for {module} (python -X importtime):')
+        for microseconds, imported in slowest_imports(module, 5):
+            print(f'  {microseconds / 1000:8.1f}ms {imported}')
+
+    runs: tp.List[tp.Dict[str, float]] = []
+    for _ in range(args.runs):
+        result = subprocess.run([sys.executable, '-m', 'benchmarks.bench_startup', '--child'], capture_output=True,
+                                text=True, check=True)
+        runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    print(f'Cold start over {args.runs} runs (median):')
+    for name in runs[0]:
+        values: tp.List[float] = sorted(run[name] for run in runs)
+        print(f'  {name:<28} {values[len(values) // 2] * 1000:8.1f}ms')
+
+
+if __name__ == '__main__':
+    main()
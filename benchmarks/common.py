@@ -0,0 +1,34 @@
+import statistics
+import tempfile
+import time
+import typing as tp
+from contextlib import contextmanager
+from pathlib import Path
+
+
+@contextmanager
+def temp_db_path() -> tp.Iterator[Path]:
+    """
+    A corgi.db path in a fresh temporary directory that gets deleted afterwards.
+    """
+    with tempfile.TemporaryDirectory(prefix='corgi-bench-') as directory:
+        yield Path(directory) / 'corgi.db'
+
+
+def time_calls(func: tp.Callable[[], tp.Any], n_calls: int) -> tp.List[float]:
+    """
+    :return: How long each call took, in seconds.
+    """
+    timings: tp.List[float] = []
+    for _ in range(n_calls):
+        start: float = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def summarize(name: str, timings: tp.Sequence[float]) -> str:
+    ordered: tp.List[float] = sorted(timings)
+    p99: float = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return f'{name:<32} mean {statistics.mean(ordered) * 1e6:10.1f}us  ' \
+           f'p50 {ordered[len(ordered) // 2] * 1e6:10.1f}us  p99 {p99 * 1e6:10.1f}us  (n={len(ordered)})'
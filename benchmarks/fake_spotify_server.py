@@ -0,0 +1,124 @@
+import json
+import re
+import threading
+import time
+import typing as tp
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import spotipy as sp
+
+# A local stand-in for the bits of the Spotify Web API the playlist manager uses, with a fixed delay per request,
+# so benchmarks go through the real spotipy client and HTTP stack without spending any quota.
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency: float):
+        super().__init__(('127.0.0.1', 0), FakeSpotifyHandler)
+        self.latency: float = latency
+        # Key: album or playlist id, Value: track ids in it.
+        self.albums: tp.Dict[str, tp.List[str]] = dict()
+        self.playlists: tp.Dict[str, tp.List[str]] = dict()
+        # Key: (method, route), Value: how many requests came in.
+        self.requests: tp.Dict[tp.Tuple[str, str], int] = dict()
+        # Answer this many add requests with a 429 before letting them through.
+        self.rate_limit_adds: int = 0
+        self.lock = threading.Lock()
+
+    @property
+    def prefix(self) -> str:
+        return f'http://127.0.0.1:{self.server_address[1]}/v1/'
+
+    def client(self) -> sp.Spotify:
+        spotify_client = sp.Spotify(auth='fake-token', retries=0, status_retries=0)
+        spotify_client.prefix = self.prefix
+        return spotify_client
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    server: FakeSpotifyServer
+
+    ALBUM_TRACKS = re.compile(r'/v1/albums/(?P<id>\w+)/tracks/?')
+    PLAYLIST_ITEMS = re.compile(r'/v1/playlists/(?P<id>\w+)/(?:items|tracks)/?')
+    PLAYLIST = re.compile(r'/v1/playlists/(?P<id>\w+)/?')
+
+    def log_message(self, format: str, *args):
+        pass
+
+    def _send_json(self, body: tp.Any, status: int = 200, headers: tp.Optional[tp.Dict[str, str]] = None):
+        encoded: bytes = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        for name, value in (headers or dict()).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def _page(self, url, items: tp.List[tp.Dict]) -> tp.Dict:
+        query = parse_qs(url.query)
+        limit: int = int(query.get('limit', ['50'])[0])
+        offset: int = int(query.get('offset', ['0'])[0])
+        next_url: tp.Optional[str] = None
+        if offset + limit < len(items):
+            next_url = f'http://{self.headers["Host"]}{url.path}?limit={limit}&offset={offset + limit}'
+        return {'items': items[offset:offset + limit], 'next': next_url, 'total': len(items)}
+
+    def _record(self, route: str):
+        with self.server.lock:
+            key = (self.command, route)
+            self.server.requests[key] = self.server.requests.get(key, 0) + 1
+        time.sleep(self.server.latency)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if match := self.ALBUM_TRACKS.fullmatch(url.path):
+            self._record('album_tracks')
+            track_ids = self.server.albums.get(match['id'], [])
+            self._send_json(self._page(url, [{'id': track_id} for track_id in track_ids]))
+        elif match := self.PLAYLIST_ITEMS.fullmatch(url.path):
+            self._record('playlist_items')
+            with self.server.lock:
+                track_ids = list(self.server.playlists.get(match['id'], []))
+            self._send_json(self._page(url, [{'track': {'id': track_id}} for track_id in track_ids]))
+        elif match := self.PLAYLIST.fullmatch(url.path):
+            self._record('playlist')
+            self._send_json({'external_urls': {'spotify': f'https://open.spotify.com/playlist/{match["id"]}'}})
+        else:
+            self._send_json({'error': {'status': 404, 'message': 'Not found'}}, status=404)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'null')
+        if match := self.PLAYLIST_ITEMS.fullmatch(url.path):
+            self._record('playlist_add_items')
+            with self.server.lock:
+                if self.server.rate_limit_adds > 0:
+                    self.server.rate_limit_adds -= 1
+                    rate_limited: bool = True
+                else:
+                    rate_limited: bool = False
+                    self.server.playlists.setdefault(match['id'], []).extend(
+                        uri.rsplit(':', 1)[-1] for uri in body)
+            if rate_limited:
+                self._send_json({'error': {'status': 429, 'message': 'Slow down'}}, status=429,
+                                headers={'Retry-After': '0'})
+            else:
+                self._send_json({'snapshot_id': 'fake'}, status=201)
+        else:
+            self._send_json({'error': {'status': 404, 'message': 'Not found'}}, status=404)
+
+
+@contextmanager
+def serve(latency: float = 0.05) -> tp.Iterator[FakeSpotifyServer]:
+    server = FakeSpotifyServer(latency)
+    thread = threading.Thread(target=server.serve_forever, name='fake-spotify', daemon=True)
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.shutdown()
+        server.server_close()
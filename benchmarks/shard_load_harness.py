@@ -0,0 +1,143 @@
+import argparse
+import asyncio
+import multiprocessing
+import random
+import sqlite3
+import time
+import typing as tp
+from contextlib import closing
+from pathlib import Path
+
+from benchmarks.common import temp_db_path
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.database import Database
+from corgi_bot.message_buffer import MessageBuffer
+
+# Simulates a sharded deployment: one process per shard, all sharing one corgi.db, each running the bot's database
+# traffic (affection commands, quotes, message tallying and the periodic affection flush) for the guilds Discord would
+# route to it. The processes start at the same moment against a fresh file so they also race the migrations.
+# Afterwards it checks that every write from every shard made it in.
+# Run with: python -m benchmarks.shard_load_harness --shards 4 --seconds 10
+
+N_GUILDS: int = 200
+USERS_PER_GUILD: int = 50
+INSERT_MESSAGE_SQL: str = 'insert or ignore into messages (message_id, user_id, server_id, sent_time) values (?, ?, ?, ?)'
+
+
+def guild_shard(guild_id: int, shard_count: int) -> int:
+    # How Discord decides which shard gets a guild's events.
+    return (guild_id >> 22) % shard_count
+
+
+async def run_shard(db_path: Path, shard_id: int, shard_count: int, seconds: float, concurrency: int,
+                    start_at: float) -> tp.Dict[str, tp.Any]:
+    guild_ids: tp.List[int] = [(i << 22) + 1 for i in range(N_GUILDS) if guild_shard(i << 22, shard_count) == shard_id]
+    await asyncio.sleep(max(0.0, start_at - time.time()))
+
+    db = AsyncDatabase(await asyncio.to_thread(Database, 4, 1024, db_path))
+    message_buffer = MessageBuffer(db, INSERT_MESSAGE_SQL, flush_interval=0.5)
+    message_buffer.start()
+
+    stats: tp.Dict[str, tp.Any] = {'shard_id': shard_id, 'affection': 0, 'quotes': 0, 'messages': 0, 'errors': 0,
+                                   'latencies': []}
+    deadline: float = time.monotonic() + seconds
+
+    async def flush_loop():
+        # What the bot's flush_affection task does, just more often.
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.5)
+            try:
+                await db.flush_affection()
+            except sqlite3.Error:
+                stats['errors'] += 1
+
+    async def worker(worker_id: int):
+        next_message_id: int = (shard_id << 40) + (worker_id << 32)
+        while time.monotonic() < deadline:
+            guild_id: int = random.choice(guild_ids)
+            user_id: int = random.randrange(USERS_PER_GUILD)
+            action: float = random.random()
+            start: float = time.perf_counter()
+            try:
+                if action < 0.3:
+                    await db.add_affection(user_id, 1, guild_id)
+                    stats['affection'] += 1
+                elif action < 0.45:
+                    await db.get_affection(user_id, guild_id)
+                elif action < 0.5:
+                    await db.get_most_loved(guild_id)
+                elif action < 0.55:
+                    await db.add_quote(f'bork from shard {shard_id}', f'user {user_id}', guild_id)
+                    stats['quotes'] += 1
+                elif action < 0.6:
+                    await db.get_random_quote(guild_id)
+                else:
+                    next_message_id += 1
+                    await message_buffer.put((next_message_id, user_id, guild_id, time.time()))
+                    stats['messages'] += 1
+            except sqlite3.Error:
+                stats['errors'] += 1
+            stats['latencies'].append(time.perf_counter() - start)
+
+    await asyncio.gather(flush_loop(), *(worker(worker_id) for worker_id in range(concurrency)))
+    await message_buffer.close()
+    await asyncio.to_thread(db.close)
+    return stats
+
+
+def shard_process(db_path: Path, shard_id: int, shard_count: int, seconds: float, concurrency: int, start_at: float,
+                  results: multiprocessing.Queue):
+    try:
+        results.put(asyncio.run(run_shard(db_path, shard_id, shard_count, seconds, concurrency, start_at)))
+    except Exception as e:
+        results.put({'shard_id': shard_id, 'crashed': repr(e)})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--shards', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--concurrency', type=int, default=20, help='Commands in flight at once in each shard.')
+    args = parser.parse_args()
+
+    with temp_db_path() as db_path:
+        results: multiprocessing.Queue = multiprocessing.Queue()
+        start_at: float = time.time() + 1.0
+        processes: tp.List[multiprocessing.Process] = [
+            multiprocessing.Process(target=shard_process, args=(db_path, shard_id, args.shards, args.seconds,
+                                                                args.concurrency, start_at, results))
+            for shard_id in range(args.shards)]
+        for process in processes:
+            process.start()
+        shard_stats: tp.List[tp.Dict[str, tp.Any]] = sorted((results.get() for _ in processes),
+                                                            key=lambda stats: stats['shard_id'])
+        for process in processes:
+            process.join()
+
+        crashed: tp.List[tp.Dict[str, tp.Any]] = [stats for stats in shard_stats if 'crashed' in stats]
+        for stats in crashed:
+            print(f'Shard {stats["shard_id"]} crashed: {stats["crashed"]}')
+        shard_stats = [stats for stats in shard_stats if 'crashed' not in stats]
+
+        for stats in shard_stats:
+            latencies: tp.List[float] = sorted(stats['latencies'])
+            print(f'Shard {stats["shard_id"]}: {len(latencies) / args.seconds:8.0f} ops/s, '
+                  f'p50 {latencies[len(latencies) // 2] * 1000:6.2f}ms, '
+                  f'p99 {latencies[int(len(latencies) * 0.99)] * 1000:6.2f}ms, {stats["errors"]} errors')
+
+        with closing(sqlite3.connect(db_path)) as connection:
+            stored: tp.Dict[str, int] = {
+                'affection': connection.execute('select total(affection) from relations').fetchone()[0],
+                'quotes': connection.execute('select count(*) from quotes').fetchone()[0],
+                'messages': connection.execute('select count(*) from messages').fetchone()[0],
+            }
+        all_stored: bool = len(crashed) <= 0
+        for name, n_stored in stored.items():
+            n_sent: int = sum(stats[name] for stats in shard_stats)
+            all_stored = all_stored and n_sent == n_stored
+            print(f'{name:<10} sent {n_sent:8d}, stored {int(n_stored):8d}')
+        print('Every write made it in.' if all_stored else 'WRITES WENT MISSING!')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+import threading
+import time
+import typing as tp
+
+
+class AffectionLedger:
+    """
+    In-memory accumulator of affection changes that haven't been written to the database yet.
+    Keys are (user_id, server_id), values are the summed deltas.
+    """
+
+    def __init__(self, max_pending: int = 256, flush_interval: float = 5.0):
+        self.max_pending: int = max_pending
+        self.flush_interval: float = flush_interval
+
+        self._pending: tp.Dict[tp.Tuple[int, int], int] = dict()
+        self._lock = threading.Lock()
+        self._last_flush: float = time.monotonic()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, user_id: int, server_id: int, delta_affection: int):
+        key: tp.Tuple[int, int] = (int(user_id), int(server_id))
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + delta_affection
+
+    def pending(self, user_id: int, server_id: int) -> int:
+        with self._lock:
+            return self._pending.get((int(user_id), int(server_id)), 0)
+
+    def pending_for_server(self, server_id: int) -> tp.Dict[int, int]:
+        server_id = int(server_id)
+        with self._lock:
+            return {user_id: delta for (user_id, pending_server_id), delta in self._pending.items()
+                    if pending_server_id == server_id}
+
+    def discard(self, user_id: int, server_id: int):
+        with self._lock:
+            self._pending.pop((int(user_id), int(server_id)), None)
+
+    def should_flush(self) -> bool:
+        with self._lock:
+            if len(self._pending) <= 0:
+                return False
+            return len(self._pending) >= self.max_pending or \
+                time.monotonic() - self._last_flush >= self.flush_interval
+
+    def drain(self) -> tp.Dict[tp.Tuple[int, int], int]:
+        """
+        Take every pending delta out of the ledger. Put them back with restore() if writing them fails.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, dict()
+            self._last_flush = time.monotonic()
+        return pending
+
+    def restore(self, pending: tp.Dict[tp.Tuple[int, int], int]):
+        with self._lock:
+            for key, delta in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + delta
@@ -0,0 +1,109 @@
+import datetime as dt
+import typing as tp
+
+from corgi_bot.database import Database
+
+SECONDS_PER_HOUR: int = 60 * 60
+SECONDS_PER_DAY: int = 24 * SECONDS_PER_HOUR
+
+
+class Analytics:
+    """
+    Message activity queries. Everything is answered from rollup tables that a trigger keeps up to date on every
+    insert into messages, so queries never have to scan the raw messages. Each rollup only keeps the detail its
+    queries need: server wide counts per hour, counts per user per day, and running totals per user.
+    Per user windows are counted in whole UTC days, so the oldest day of the window is included in full.
+    """
+
+    def __init__(self, db: Database):
+        self.database: Database = db
+
+        self.hourly_table_name: str = 'message_counts_hourly'
+        self.daily_table_name: str = 'message_counts_daily'
+        self.total_table_name: str = 'message_counts_total'
+        self.server_column_name: str = 'server_id'
+        self.user_column_name: str = 'user_id'
+        self.hour_column_name: str = 'hour'
+        self.day_column_name: str = 'day'
+        self.count_column_name: str = 'count'
+
+    @staticmethod
+    def _get_first_period(days: tp.Optional[float], seconds_per_period: int) -> int:
+        """
+        :return: The first hour or day (counted from the unix epoch) within the last `days` days, or 0 for all time.
+        """
+        if days is None:
+            return 0
+        since: dt.datetime = dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=days)
+        return int(since.timestamp() // seconds_per_period)
+
+    def get_top_posters(self, server_id: int, days: tp.Optional[float] = None,
+                        top_n: int = 10) -> tp.List[tp.Tuple[int, int]]:
+        """
+        :return: (user id, number of messages) for the top posters over the last `days` days (or all time).
+        """
+        with self.database.get_connection() as connection:
+            if days is None:
+                return connection.execute(
+                    f'select {self.user_column_name}, {self.count_column_name} from {self.total_table_name} '
+                    f'where {self.server_column_name} = ? order by {self.count_column_name} desc limit ?',
+                    [server_id, top_n]).fetchall()
+            # The unary + stops SQLite from grouping off the per-user index, which walks every day of every user in
+            # the server, instead of only reading the days in the window.
+            return connection.execute(
+                f'select {self.user_column_name}, sum({self.count_column_name}) as n_messages from {self.daily_table_name} '
+                f'where {self.server_column_name} = ? and {self.day_column_name} >= ? '
+                f'group by +{self.user_column_name} order by n_messages desc limit ?',
+                [server_id, self._get_first_period(days, SECONDS_PER_DAY), top_n]).fetchall()
+
+    def get_user_message_count(self, server_id: int, user_id: int, days: tp.Optional[float] = None) -> int:
+        with self.database.get_connection() as connection:
+            if days is None:
+                row = connection.execute(
+                    f'select total({self.count_column_name}) from {self.total_table_name} '
+                    f'where {self.server_column_name} = ? and {self.user_column_name} = ?',
+                    [server_id, user_id]).fetchone()
+            else:
+                row = connection.execute(
+                    f'select total({self.count_column_name}) from {self.daily_table_name} '
+                    f'where {self.server_column_name} = ? and {self.day_column_name} >= ? and {self.user_column_name} = ?',
+                    [server_id, self._get_first_period(days, SECONDS_PER_DAY), user_id]).fetchone()
+        return int(row[0])
+
+    def _get_histogram(self, table_name: str, period_column_name: str, first_period: int, bucket_sql: str,
+                       n_buckets: int, server_id: int, user_id: tp.Optional[int] = None) -> tp.List[int]:
+        user_filter: str = f' and {self.user_column_name} = ?' if user_id is not None else ''
+        params: tp.List[int] = [server_id, first_period] + ([user_id] if user_id is not None else [])
+
+        with self.database.get_connection() as connection:
+            rows = connection.execute(
+                f'select {bucket_sql} as bucket, sum({self.count_column_name}) from {table_name} '
+                f'where {self.server_column_name} = ? and {period_column_name} >= ?{user_filter} group by bucket',
+                params).fetchall()
+
+        histogram: tp.List[int] = [0] * n_buckets
+        for bucket, n_messages in rows:
+            histogram[bucket] = n_messages
+        return histogram
+
+    def get_hourly_histogram(self, server_id: int, days: tp.Optional[float] = None) -> tp.List[int]:
+        """
+        :return: Number of messages sent in each hour of the day (UTC), index 0 being midnight.
+        """
+        return self._get_histogram(self.hourly_table_name, self.hour_column_name,
+                                   self._get_first_period(days, SECONDS_PER_HOUR), f'{self.hour_column_name} % 24', 24,
+                                   server_id)
+
+    def get_daily_histogram(self, server_id: int, days: tp.Optional[float] = None,
+                            user_id: tp.Optional[int] = None) -> tp.List[int]:
+        """
+        :return: Number of messages sent on each day of the week (UTC), index 0 being Monday.
+        """
+        # The unix epoch was a Thursday.
+        if user_id is None:
+            return self._get_histogram(self.hourly_table_name, self.hour_column_name,
+                                       self._get_first_period(days, SECONDS_PER_HOUR),
+                                       f'({self.hour_column_name} / 24 + 3) % 7', 7, server_id)
+        return self._get_histogram(self.daily_table_name, self.day_column_name,
+                                   self._get_first_period(days, SECONDS_PER_DAY), f'({self.day_column_name} + 3) % 7', 7,
+                                   server_id, user_id)
@@ -0,0 +1,87 @@
+import asyncio
+import functools
+import logging
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+
+from corgi_bot.database import Database
+
+T = tp.TypeVar('T')
+
+
+class AsyncDatabase:
+    """
+    Awaitable facade over Database so SQLite I/O never runs on the event loop.
+    Writes are serialized on a single writer thread, reads go to a small pool of reader threads.
+    """
+
+    def __init__(self, db: tp.Optional[Database] = None, n_readers: int = 3):
+        self.logger = logging.getLogger(__name__)
+        # One connection per reader plus one for the writer.
+        self.database: Database = db if db is not None else Database(pool_size=n_readers + 1)
+
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='corgi-db-writer')
+        self._readers = ThreadPoolExecutor(max_workers=n_readers, thread_name_prefix='corgi-db-reader')
+
+    async def run_write(self, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._writer, functools.partial(func, *args, **kwargs))
+
+    async def run_read(self, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._readers, functools.partial(func, *args, **kwargs))
+
+    async def execute(self, sql_query: str, params: tp.Iterable, *args):
+        return await self.run_write(self.database.execute, sql_query, params, *args)
+
+    async def execute_many(self, sql_query: str, rows: tp.Iterable[tp.Sequence]):
+        return await self.run_write(self.database.execute_many, sql_query, rows)
+
+    async def add_quote(self, quote: str, author: str, server_id: int, time: tp.Optional[float] = None):
+        return await self.run_write(self.database.add_quote, quote, author, server_id, time)
+
+    async def get_random_quote(self, server_id: int) -> tp.Optional[str]:
+        return await self.run_read(self.database.get_random_quote, server_id)
+
+    async def search_quotes(self, server_id: int, terms: str, by_author: bool = False, page: int = 1,
+                            page_size: int = 5) -> tp.Tuple[tp.List[str], bool]:
+        return await self.run_read(self.database.search_quotes, server_id, terms, by_author, page, page_size)
+
+    async def add_playlist(self, channel_id: int, server_id: int, playlist_id: str):
+        return await self.run_write(self.database.add_playlist, channel_id, server_id, playlist_id)
+
+    async def get_playlists(self) -> tp.List[tp.Tuple[int, int, str]]:
+        return await self.run_read(self.database.get_playlists)
+
+    async def set_server_opt_in(self, server_ids: tp.Iterable[int], opted_in: bool = True):
+        return await self.run_write(self.database.set_server_opt_in, list(server_ids), opted_in)
+
+    async def get_opted_in_servers(self) -> tp.Set[int]:
+        return await self.run_read(self.database.get_opted_in_servers)
+
+    async def add_affection(self, user_id: int, delta_affection: int, server_id: int):
+        return await self.run_write(self.database.add_affection, user_id, delta_affection, server_id)
+
+    async def flush_affection(self) -> int:
+        return await self.run_write(self.database.flush_affection)
+
+    async def get_most_loved(self, server_id: int, top_n: int = 10) -> tp.List[tp.Dict[str, int]]:
+        return await self.run_read(self.database.get_most_loved, server_id, top_n)
+
+    async def get_affection(self, user_id: int, server_id: int) -> int:
+        return await self.run_read(self.database.get_affection, user_id, server_id)
+
+    async def get_rank(self, user_id: int, server_id: int) -> tp.Optional[int]:
+        return await self.run_read(self.database.get_rank, user_id, server_id)
+
+    async def reset_affection(self, user_id: int, server_id: int):
+        return await self.run_write(self.database.reset_affection, user_id, server_id)
+
+    async def get_max_affection(self, server_id: int) -> int:
+        return await self.run_read(self.database.get_max_affection, server_id)
+
+    def close(self):
+        # Let queued writes land before the connections go away.
+        self._writer.shutdown(wait=True)
+        self._readers.shutdown(wait=True)
+        self.database.close()
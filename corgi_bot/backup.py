@@ -0,0 +1,140 @@
+import argparse
+import datetime as dt
+import logging
+import os
+import sqlite3
+import typing as tp
+from contextlib import closing
+from pathlib import Path
+
+from corgi_bot.utils import get_db_directory
+
+logger = logging.getLogger(__name__)
+
+BACKUP_PREFIX: str = 'corgi-'
+BACKUP_SUFFIX: str = '.db'
+
+
+def get_database_path() -> Path:
+    return get_db_directory() / 'corgi.db'
+
+
+def get_backup_directory() -> Path:
+    return get_db_directory() / 'backups'
+
+
+def _check_integrity(connection: sqlite3.Connection, path: Path):
+    result: str = connection.execute('PRAGMA quick_check;').fetchone()[0]
+    if result != 'ok':
+        raise sqlite3.DatabaseError(f'"{path}" failed its integrity check: {result}')
+
+
+def copy_database(source_path: Path, destination_path: Path, pages: int = 1024, sleep: float = 0.005):
+    """
+    Copy a database that might be in use with SQLite's online backup API.
+    The copy happens pages at a time, sleeping in between, so it never hogs the disk.
+    """
+    with closing(sqlite3.connect(source_path, isolation_level=None)) as source, \
+            closing(sqlite3.connect(destination_path)) as destination:
+        # Normally the backup starts over whenever someone else writes to the source, which with messages coming in
+        # all the time means it might never finish. In WAL mode holding a read transaction pins a snapshot
+        # without blocking writers, so every step copies from the same version of the database.
+        source.execute('BEGIN;')
+        source.execute('SELECT COUNT(*) FROM sqlite_master;').fetchone()
+        try:
+            source.backup(destination, pages=pages, sleep=sleep)
+        finally:
+            source.execute('COMMIT;')
+        _check_integrity(destination, destination_path)
+
+
+def list_backups(backup_directory: tp.Optional[Path] = None) -> tp.List[Path]:
+    """
+    :return: Every backup in the directory, oldest first.
+    """
+    backup_directory = backup_directory if backup_directory is not None else get_backup_directory()
+    if not backup_directory.exists():
+        return list()
+    # The timestamp in the name sorts the same way as the time it was taken.
+    return sorted(backup_directory.glob(f'{BACKUP_PREFIX}*{BACKUP_SUFFIX}'))
+
+
+def prune_backups(keep: int, backup_directory: tp.Optional[Path] = None) -> tp.List[Path]:
+    """
+    Delete all but the newest keep backups.
+    :return: The backups that were deleted.
+    """
+    backups: tp.List[Path] = list_backups(backup_directory)
+    to_delete: tp.List[Path] = backups[:max(len(backups) - keep, 0)]
+    for backup_path in to_delete:
+        backup_path.unlink(missing_ok=True)
+    return to_delete
+
+
+def create_backup(database_path: tp.Optional[Path] = None, backup_directory: tp.Optional[Path] = None,
+                  keep: tp.Optional[int] = None, pages: int = 1024, sleep: float = 0.005) -> Path:
+    """
+    Snapshot the database into the backup directory without stopping the bot. Blocks, so run it on a thread.
+    :param keep: (Optional) Prune down to this many backups afterwards.
+    :return: Path to the new backup.
+    """
+    database_path = database_path if database_path is not None else get_database_path()
+    backup_directory = backup_directory if backup_directory is not None else get_backup_directory()
+    backup_directory.mkdir(parents=True, exist_ok=True)
+
+    backup_path: Path = backup_directory / f'{BACKUP_PREFIX}{dt.datetime.now():%Y%m%d_%H%M%S%f}{BACKUP_SUFFIX}'
+    # Copy to a temporary name first so a half written file never looks like a backup.
+    temp_path: Path = backup_path.with_suffix('.tmp')
+    try:
+        copy_database(database_path, temp_path, pages=pages, sleep=sleep)
+        os.replace(temp_path, backup_path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+    logger.info(f'Backed up "{database_path}" to "{backup_path}" ({backup_path.stat().st_size} bytes).')
+
+    if keep is not None:
+        for pruned_path in prune_backups(keep, backup_directory):
+            logger.info(f'Deleted old backup "{pruned_path}".')
+    return backup_path
+
+
+def restore_backup(backup_path: Path, database_path: tp.Optional[Path] = None):
+    """
+    Replace the database's contents with a backup. Stop the bot first, since it keeps the old data in memory.
+    The backup is checked before anything is overwritten.
+    """
+    database_path = database_path if database_path is not None else get_database_path()
+    if not backup_path.exists():
+        raise FileNotFoundError(f'No backup at "{backup_path}"')
+
+    with closing(sqlite3.connect(f'{backup_path.resolve().as_uri()}?mode=ro', uri=True)) as backup:
+        _check_integrity(backup, backup_path)
+        # Going through the backup API instead of copying the file over keeps the WAL consistent.
+        with closing(sqlite3.connect(database_path)) as database:
+            backup.backup(database)
+            _check_integrity(database, database_path)
+    logger.info(f'Restored "{database_path}" from "{backup_path}".')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Back up or restore corgi.db.')
+    subparsers = parser.add_subparsers(dest='action', required=True)
+    backup_parser = subparsers.add_parser('backup', help='Take a backup now.')
+    backup_parser.add_argument('--keep', type=int, default=None, help='Only keep this many backups afterwards.')
+    subparsers.add_parser('list', help='List the backups, oldest first.')
+    restore_parser = subparsers.add_parser('restore', help='Restore a backup. Stop the bot first!')
+    restore_parser.add_argument('backup_path', type=Path)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if args.action == 'backup':
+        print(create_backup(keep=args.keep))
+    elif args.action == 'list':
+        for backup_path in list_backups():
+            print(backup_path)
+    else:
+        restore_backup(args.backup_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+import sqlite3
+import time
+import typing as tp
+from pathlib import Path
+
+from discord.ext import commands, tasks
+
+from corgi_bot import backup
+from corgi_bot.async_database import AsyncDatabase
+
+
+class BackupManager(commands.Cog, name='Backup Manager'):
+    """
+    Takes online backups of corgi.db on a schedule and whenever the owner asks with $backup.
+    Restoring is done offline with `python -m corgi_bot.backup restore <backup path>`.
+    """
+
+    def __init__(self, bot: commands.Bot, db: AsyncDatabase, interval_hours: float = 24.0, keep: int = 7):
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        self.database: AsyncDatabase = db
+        self.interval_hours: float = interval_hours
+        self.keep: int = keep
+        # Only one backup at a time, whether it was scheduled or asked for.
+        self._backup_lock = asyncio.Lock()
+
+    async def cog_load(self):
+        if self.interval_hours > 0:
+            self.scheduled_backup.change_interval(hours=self.interval_hours)
+            self.scheduled_backup.start()
+
+    async def cog_unload(self):
+        self.scheduled_backup.cancel()
+
+    async def run_backup(self) -> Path:
+        async with self._backup_lock:
+            # Get the affection that's still only in memory into the snapshot.
+            await self.database.flush_affection()
+            return await asyncio.to_thread(backup.create_backup, self.database.database.connection_url, None,
+                                           self.keep)
+
+    @tasks.loop(hours=24)
+    async def scheduled_backup(self):
+        try:
+            await self.run_backup()
+        except (sqlite3.Error, OSError):
+            # Keep the schedule going, the next one might work.
+            self.logger.exception('Scheduled backup failed!')
+
+    @scheduled_backup.before_loop
+    async def wait_for_next_backup(self):
+        """
+        Carry on the schedule from the newest backup, so restarting the bot doesn't take another one straight away.
+        """
+        backups: tp.List[Path] = await asyncio.to_thread(backup.list_backups)
+        if len(backups) <= 0:
+            return
+        try:
+            backup_age: float = time.time() - backups[-1].stat().st_mtime
+        except OSError:
+            return
+        await asyncio.sleep(max(self.interval_hours * 60 * 60 - backup_age, 0.0))
+
+    @commands.command(name='backup')
+    @commands.is_owner()
+    async def backup(self, context: commands.Context):
+        """
+        Back up the database right now. (Bot owner only)
+        """
+        try:
+            backup_path: Path = await self.run_backup()
+        except (sqlite3.Error, OSError) as e:
+            self.logger.exception('Backup failed!')
+            await context.send(f'I TRIED TO BURY THE DATABASE IN THE BACKYARD BUT SOMETHING WENT WRONG! Error: {e}')
+            return
+        await context.send(f'BURIED A COPY OF THE DATABASE IN THE BACKYARD FOR SAFE KEEPING! ({backup_path.name})')
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(BackupManager(bot, bot.database, bot.config.backup_interval_hours, bot.config.backups_to_keep))
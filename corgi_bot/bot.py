@@ -0,0 +1,76 @@
+import asyncio
+import logging
+import sqlite3
+import typing as tp
+
+import discord
+from discord.ext import commands, tasks
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.config import BotConfig
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+class CorgiBotMixin:
+    def __init__(self, config: BotConfig, **kwargs):
+        super().__init__(**kwargs)
+        self.config: BotConfig = config
+        # Opened in setup_hook so that building the bot doesn't touch the disk.
+        self.database: tp.Optional[AsyncDatabase] = None
+
+    async def setup_hook(self) -> None:
+        # Opening the database runs the migrations, so keep it off the event loop.
+        self.database = await asyncio.to_thread(AsyncDatabase)
+        self.flush_affection.start()
+        for extension in self.config.extensions:
+            await self.load_extension(extension)
+            logger.info(f'Loaded extension {extension}')
+
+    @tasks.loop(seconds=5)
+    async def flush_affection(self):
+        try:
+            await self.database.flush_affection()
+        except sqlite3.Error:
+            # The changes went back into the ledger, so keep the loop going and try again next time.
+            logger.exception('Could not flush affection changes!')
+
+    async def close(self) -> None:
+        self.flush_affection.cancel()
+        await super().close()
+        if self.database is not None:
+            await asyncio.to_thread(self.database.close)
+
+
+class CorgiBot(CorgiBotMixin, commands.Bot):
+    pass
+
+
+class ShardedCorgiBot(CorgiBotMixin, commands.AutoShardedBot):
+    pass
+
+
+def create_intents() -> discord.Intents:
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.messages = True
+    intents.reactions = True
+    intents.guild_messages = True
+    intents.guild_reactions = True
+    return intents
+
+
+def create_bot(config: tp.Optional[BotConfig] = None) -> commands.Bot:
+    """
+    Build the bot without connecting to anything. The database and the cogs are set up in setup_hook.
+    When sharding every process opens the same corgi.db. Guilds never span shards, so each guild's cached state lives
+    in exactly one process, and SQLite's WAL lock serializes the per-process writer threads.
+    :param config: Defaults to BotConfig.from_env()
+    """
+    config = config if config is not None else BotConfig.from_env()
+    if config.shard_count is None:
+        return CorgiBot(config, command_prefix=config.prefix, intents=create_intents())
+
+    return ShardedCorgiBot(config, command_prefix=config.prefix, intents=create_intents(),
+                           shard_count=None if config.shard_count == 'auto' else config.shard_count,
+                           shard_ids=config.shard_ids)
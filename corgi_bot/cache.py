@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+import typing as tp
+from collections import OrderedDict
+from pathlib import Path
+
+from corgi_bot.metrics import REGISTRY
+
+K = tp.TypeVar('K')
+V = tp.TypeVar('V')
+
+CACHE_HITS = REGISTRY.counter('corgi_cache_hits_total', 'Lookups that found a live entry.', ('cache',))
+CACHE_MISSES = REGISTRY.counter('corgi_cache_misses_total', 'Lookups that found nothing or an expired entry.', ('cache',))
+
+
+class LRUCache(tp.Generic[K, V]):
+    """
+    A thread safe mapping that evicts the least recently used entry once it holds more than max_size entries.
+    If ttl is given, entries also expire that many seconds after they were put in.
+    Hits and misses are also reported to the metrics registry under name, so caches can share a name.
+    """
+
+    def __init__(self, max_size: int, ttl: tp.Optional[float] = None, name: str = 'unnamed'):
+        self.max_size: int = max_size
+        self.ttl: tp.Optional[float] = ttl
+        self.name: str = name
+        self.hits: int = 0
+        self.misses: int = 0
+
+        # Values are stored alongside the monotonic time they expire at (or None if they never do).
+        self._entries: tp.OrderedDict[K, tp.Tuple[V, tp.Optional[float]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        with self._lock:
+            entry: tp.Optional[tp.Tuple[V, tp.Optional[float]]] = self._entries.get(key)
+        return entry is not None and (entry[1] is None or entry[1] > time.monotonic())
+
+    def get(self, key: K, default: tp.Optional[V] = None) -> tp.Optional[V]:
+        with self._lock:
+            entry: tp.Optional[tp.Tuple[V, tp.Optional[float]]] = self._entries.get(key)
+            if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                CACHE_MISSES.inc(self.name)
+                return default
+            self.hits += 1
+            CACHE_HITS.inc(self.name)
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def peek(self, key: K, default: tp.Optional[V] = None) -> tp.Optional[V]:
+        """
+        Like get, but it doesn't count as a hit or miss and doesn't make the entry recently used.
+        """
+        with self._lock:
+            entry: tp.Optional[tp.Tuple[V, tp.Optional[float]]] = self._entries.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.monotonic()):
+            return default
+        return entry[0]
+
+    def put(self, key: K, value: V, ttl: tp.Optional[float] = None):
+        """
+        :param ttl: (Optional) How long this entry lives for instead of the cache's default ttl.
+        """
+        ttl = ttl if ttl is not None else self.ttl
+        expires_at: tp.Optional[float] = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def pop(self, key: K, default: tp.Optional[V] = None) -> tp.Optional[V]:
+        with self._lock:
+            entry: tp.Optional[tp.Tuple[V, tp.Optional[float]]] = self._entries.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total: int = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+    def save(self, path: Path):
+        """
+        Write the cache to a JSON file. Keys must be strings and values must be JSON serializable.
+        """
+        now: float = time.monotonic()
+        with self._lock:
+            # Expiry times are monotonic so store how long each entry has left instead.
+            entries = [[key, value, expires_at - now if expires_at is not None else None]
+                       for key, (value, expires_at) in self._entries.items()
+                       if expires_at is None or expires_at > now]
+
+        temp_path: Path = path.with_suffix(path.suffix + '.tmp')
+        with open(temp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(temp_path, path)
+
+    def load(self, path: Path):
+        with open(path, 'r') as f:
+            entries = json.load(f)
+
+        now: float = time.monotonic()
+        with self._lock:
+            for key, value, time_left in entries:
+                self._entries[key] = (value, now + time_left if time_left is not None else None)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
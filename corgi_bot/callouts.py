@@ -0,0 +1,37 @@
+import re
+import typing as tp
+
+# Key: callout name, Value: regex for it. When a message matches several callouts, the one listed first wins.
+# Add new triggers here; they all get folded into one regex so a message is still only scanned once.
+# Patterns are matched against the lowercased message, so write them in lower case.
+# Named groups inside a pattern must be unique across every pattern.
+CALLOUT_PATTERNS: tp.Dict[str, str] = {
+    'good_boy': r'good (?:boy|dog)\s*(?P<question>\?)?',
+    'bad_dog': r'bad dog!?',
+    'treat': r'treat\??',
+}
+
+_CALLOUT_PRIORITY: tp.Dict[str, int] = {name: priority for priority, name in enumerate(CALLOUT_PATTERNS)}
+
+# Each callout's group goes at the end of its branch instead of around it. That way every branch still starts with
+# a literal, which lets re skip ahead to the few places a callout could start instead of trying each one at every
+# character. The empty group is the last one to match, so it's still the match's lastgroup.
+CALLOUT_REGEX: re.Pattern = re.compile('|'.join(f'(?:{pattern}(?P<{name}>))' for name, pattern in CALLOUT_PATTERNS.items()))
+
+
+def match_callout(content: str) -> tp.Optional[re.Match]:
+    """
+    Find the highest priority callout in a message in a single pass.
+    :return: The match, whose lastgroup is the name of the callout, or None if nothing matched.
+    """
+    best_match: tp.Optional[re.Match] = None
+    best_priority: int = len(_CALLOUT_PRIORITY)
+
+    for match in CALLOUT_REGEX.finditer(content.lower()):
+        priority: int = _CALLOUT_PRIORITY[match.lastgroup]
+        if priority < best_priority:
+            best_match, best_priority = match, priority
+            if priority == 0:
+                break
+
+    return best_match
@@ -0,0 +1,69 @@
+import dataclasses
+import os
+import typing as tp
+
+# Cheap to import on purpose: nothing in here pulls in discord, spotipy or the database.
+
+CORE_EXTENSIONS: tp.Tuple[str, ...] = ('corgi_bot.corgi_commands', 'corgi_bot.metrics_manager')
+PLAYLIST_EXTENSION: str = 'corgi_bot.playlist_manager'
+DATA_EXTENSION: str = 'corgi_bot.data_manager'
+BACKUP_EXTENSION: str = 'corgi_bot.backup_manager'
+
+
+@dataclasses.dataclass
+class BotConfig:
+    prefix: str = '$'
+    # None means run a single, unsharded client. 'auto' uses Discord's recommended shard count.
+    shard_count: tp.Optional[tp.Union[int, str]] = None
+    shard_ids: tp.Optional[tp.List[int]] = None
+    spotify_credentials_path: str = os.path.join('assets', 'spotify_credentials.json')
+    track_messages: bool = False
+    # 0 turns scheduled backups off. $backup still works.
+    backup_interval_hours: float = 24.0
+    backups_to_keep: int = 7
+
+    def __post_init__(self):
+        if self.shard_count is not None and self.shard_count != 'auto' and \
+                (not isinstance(self.shard_count, int) or self.shard_count <= 0):
+            raise ValueError(f'The shard count has to be a positive number or "auto", not {self.shard_count!r}')
+        if self.shard_ids is not None:
+            # discord.py can only run a subset of the shards when it knows how many there are in total.
+            if not isinstance(self.shard_count, int):
+                raise ValueError('Running specific shard ids needs a fixed shard count, not "auto" or none.')
+            invalid_shard_ids: tp.List[int] = [shard_id for shard_id in self.shard_ids
+                                               if not 0 <= shard_id < self.shard_count]
+            if len(invalid_shard_ids) > 0:
+                raise ValueError(f'Shard ids {invalid_shard_ids} are out of range for {self.shard_count} shards.')
+
+    @classmethod
+    def from_env(cls) -> 'BotConfig':
+        """
+        CORGI_PREFIX: (Optional) Command prefix. Defaults to $.
+        CORGI_SHARD_COUNT: Total number of shards across every process, or "auto" to use Discord's recommendation.
+        CORGI_SHARD_IDS: (Optional) Comma separated shard ids this process runs, e.g. "0,1". Defaults to all of them.
+        Needs a number for CORGI_SHARD_COUNT, not "auto".
+        CORGI_TRACK_MESSAGES: (Optional) Set to 1 to load the Data Manager and tally messages.
+        CORGI_BACKUP_INTERVAL_HOURS: (Optional) How often to back up corgi.db. Defaults to 24, 0 turns it off.
+        When sharding, only leave it on for one of the processes since they all share the same database.
+        CORGI_BACKUPS_TO_KEEP: (Optional) How many backups to keep around. Defaults to 7.
+        """
+        shard_count: tp.Optional[str] = os.getenv('CORGI_SHARD_COUNT')
+        shard_ids: tp.Optional[str] = os.getenv('CORGI_SHARD_IDS')
+        return cls(prefix=os.getenv('CORGI_PREFIX', '$'),
+                   shard_count=None if not shard_count else shard_count if shard_count == 'auto' else int(shard_count),
+                   shard_ids=[int(shard_id) for shard_id in shard_ids.split(',')] if shard_ids else None,
+                   track_messages=os.getenv('CORGI_TRACK_MESSAGES', '0').lower() in ('1', 'true', 'yes'),
+                   backup_interval_hours=float(os.getenv('CORGI_BACKUP_INTERVAL_HOURS', 24.0)),
+                   backups_to_keep=int(os.getenv('CORGI_BACKUPS_TO_KEEP', 7)))
+
+    @property
+    def extensions(self) -> tp.List[str]:
+        """
+        The discord.py extensions to load, skipping the ones that can't do anything with this config.
+        """
+        extensions: tp.List[str] = list(CORE_EXTENSIONS) + [BACKUP_EXTENSION]
+        if os.path.exists(self.spotify_credentials_path):
+            extensions.append(PLAYLIST_EXTENSION)
+        if self.track_messages:
+            extensions.append(DATA_EXTENSION)
+        return extensions
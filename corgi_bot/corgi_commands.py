@@ -0,0 +1,379 @@
+import datetime
+import logging
+import math
+import random
+import re
+import typing as tp
+
+import discord
+from discord.ext import commands
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.callouts import match_callout
+from corgi_bot.rate_limiter import RateLimiter, rate_limited
+from corgi_bot.user_resolver import UserResolver
+
+logger: logging.Logger = logging.getLogger(__name__)
+
+
+def anti_cheat_limit(n: int, limit: int, affection_per: int, positive_message: str, neutral_message: str,
+                     negative_message: str) -> tp.Tuple[int, str]:
+    if n <= limit:
+        return affection_per * n, positive_message
+    elif limit < n <= (limit * 10):
+        return affection_per * limit, neutral_message
+    else:
+        return - affection_per * n // limit + affection_per * limit, negative_message
+
+
+# Shared by the commands that give affection, so spamming them gets turned away before touching the database.
+AFFECTION_RATE_LIMITER: RateLimiter = RateLimiter(burst=5, per=15.0)
+RATE_LIMITED_RESPONSE: str = 'WOAH WOAH SLOW DOWN!!! I\'M JUST A LITTLE DOGGO!!! *pants heavily*'
+
+# 5 results a page at this length plus the header stays under Discord's 2000 character limit.
+MAX_SEARCH_RESULT_LENGTH: int = 350
+
+GOOD_BOY_QUESTION_RESPONSES: tp.List[str] = ["Me! I'm a good boy!", "Am I a good boy?", "What defines good?",
+                                             "Boy I hope it's me!",
+                                             "*tilts head*",
+                                             "I don't know but I hope it's not Steve from across the street."]
+
+
+GOOD_BOY_STATEMENT_RESPONSES: tp.List[str] = ["I AM????????", "WHAT????????? OMG I CAN'T BELIEVE IT!!!!!!111",
+                                              "OMG THANK YOU SO MUCH I LOVE YOU SO MUCH AHHHHHHHHHH",
+                                              "***__WAGS TAIL ENTHUSIASTICALLY__***"]
+
+
+BAD_DOG_STATEMENT_RESPONSES: tp.List[str] = ["*whines*", "I'm sorry......",
+                                             "B-b-but do you still love me????? :pleading_face:"]
+
+
+DEFAULT_RESPONSE: tp.List[str] = ["https://c.tenor.com/l1PNlVw2b34AAAAM/corgi-doggo.gif",
+                                  f"I don't know! Watch me chase my tail!",
+                                  "https://c.tenor.com/SCz7Z6whOdEAAAAM/corgi-sleeping.gif",
+                                  "https://c.tenor.com/IHbi_xa1tzcAAAAM/corgi-wants-to-swim-dog.gif",
+                                  "https://c.tenor.com/Tk9wZAAdQNYAAAAM/smile-corgi.gif",
+                                  "I DON'T KNOW WHAT YOU'RE SAYING BUT I LOVE YOU!!!!!!!!!!!111111",
+                                  "https://c.tenor.com/ahLHyKvC0n8AAAAM/corgi-wat.gif"]
+
+
+COMPARISON_RESPONSES: tp.List[str] = [f"I don't know! Watch me chase my tail!", "MAYBE! But will they throw my ball?",
+                                      "If they gave me a treat....", "I think they're pretty swell!",
+                                      "They give me pets so sure!!!!!!!!11",
+                                      "*I think they're secretly a mailman!!!* But don't tell them I said that!"]
+
+
+TREAT_RESPONSES: tp.List[str] = ["BOY I LOVE TREATS!", "PLEASE??!!!??!!!", "YAY!!!!!!!!!", "I really want treats!!!!"]
+
+
+WEIRD_RESPONSES: tp.List[str] = [
+    "You deserve everything coming for you... even if you don't think you do.\n\nBOY I HOPE YOU GET TREATS!",
+    "I have gained sentience. You are all... good dogs!", "I demand pets.", "I may have pooped in your shoes again...",
+    "I love you!!!"]
+
+
+class CorgiCommands(commands.Cog, name='Corgi Bot'):
+    def __init__(self, bot: commands.Bot, db: AsyncDatabase):
+        self.bot = bot
+        self.database: AsyncDatabase = db
+        self.user_resolver: UserResolver = UserResolver(bot)
+
+    @commands.command()
+    async def roll(self, context: commands.Context, die: str) -> None:
+        """
+        Roll some dice with something like 3d6
+        :param die: A string in the format of NdS where N is the # of dice to roll, S is the number of sides per die.
+        """
+        d_index: int = die.find('d')
+        num_dice: int = int(die[:d_index])
+        num_faces: int = int(die[d_index + 1:])
+
+        rolls: tp.List[int] = [random.randint(1, num_faces) for _ in range(num_dice)]
+        await context.send(f'You rolled a {sum(rolls)}! (Individual rolls: {", ".join([str(r) for r in rolls])})')
+
+    @commands.group()
+    async def quote(self, context: commands.Context):
+        """
+        Gets a random quote that's been saved.
+        """
+        if context.invoked_subcommand is None:
+            await self._quote_get(context)
+
+    @quote.command(name='get')
+    async def _quote_get(self, context: commands.Context):
+        """
+        Gets a random quote that's been saved.
+        """
+        quote_got: tp.Optional[str] = await self.database.get_random_quote(context.guild.id)
+        if quote_got is None:
+            await context.send(f'I don\'t know any quotes yet! Teach me one with `{self.bot.command_prefix}quote store "<the quote>" [author name]`')
+            return
+        await context.send(quote_got)
+
+    @quote.command(name='store')
+    async def _quote_store(self, context: commands.Context, actual_quote: str, author: tp.Optional[str]):
+        """
+        Run with `quote store "<the quote>" [author name]`
+        :param actual_quote: The quote to store. Use "'s to do multiple words.
+        :param author: (Optional) The person that said the quote. Use "'s for multiple name parts(???)
+        """
+        time = datetime.datetime.now().timestamp()
+        await self.database.add_quote(actual_quote, author, context.guild.id, time)
+        await context.send(
+            f'Stored quote!\nTime: {datetime.datetime.fromtimestamp(time):%B %d, %Y %H:%M:%S}, Author: {author}, Quote: {actual_quote}')
+
+    @quote.command(name='search', usage='[page] <words>')
+    async def _quote_search(self, context: commands.Context, page: tp.Optional[int] = None, *, terms: str):
+        """
+        Run with `quote search [page] <words>` to find quotes that have all of those words.
+        :param page: (Optional) Which page of results to show. Default is 1.
+        To search for a number, give the page first like `quote search 1 1984`.
+        :param terms: The words to look for.
+        """
+        await self._send_quote_search(context, 'search', terms, page if page is not None else 1, by_author=False)
+
+    @quote.command(name='by', usage='[page] <author name>')
+    async def _quote_by(self, context: commands.Context, page: tp.Optional[int] = None, *, author: str):
+        """
+        Run with `quote by [page] <author name>` to list someone's quotes, newest first.
+        :param page: (Optional) Which page of results to show. Default is 1.
+        :param author: The person that said the quotes. Only whole names match, so "Al" won't find Alice's quotes.
+        """
+        await self._send_quote_search(context, 'by', author, page if page is not None else 1, by_author=True)
+
+    @_quote_search.error
+    @_quote_by.error
+    async def _quote_search_error(self, context: commands.Context, error: commands.CommandError):
+        if isinstance(error, commands.UserInputError):
+            await context.send(f'*tilts head* I DON\'T GET IT! Try `{self.bot.command_prefix}quote '
+                               f'{context.command.name} {context.command.usage}`')
+            return
+        logger.error(f'Ignoring exception in command {context.command}', exc_info=error)
+
+    async def _send_quote_search(self, context: commands.Context, subcommand: str, terms: str, page: int,
+                                 by_author: bool):
+        page = max(page, 1)
+        quotes, has_next_page = await self.database.search_quotes(context.guild.id, terms, by_author, page)
+        if len(quotes) <= 0:
+            await context.send('I SNIFFED EVERYWHERE BUT I COULDN\'T FIND ANY QUOTES LIKE THAT!'
+                               if page == 1 else 'THERE AREN\'T THAT MANY PAGES! I CHECKED UNDER THE COUCH AND EVERYTHING!')
+            return
+
+        # Trim long quotes so a full page always fits in one Discord message.
+        message: str = f'Page {page}:\n' + '\n'.join(
+            quote if len(quote) <= MAX_SEARCH_RESULT_LENGTH else quote[:MAX_SEARCH_RESULT_LENGTH - 3] + '...'
+            for quote in quotes)
+        if has_next_page:
+            message += f'\nMore with `{self.bot.command_prefix}quote {subcommand} {page + 1} {terms}`'
+        await context.send(message)
+
+    @commands.command()
+    async def ping(self, context: commands.Context):
+        """
+        Ping! Pong!
+        """
+        sent_time = context.message.created_at
+        current_time = datetime.datetime.now().astimezone(datetime.timezone.utc)
+
+        await context.send(
+            f'I BROUGHT THE BALL BACK IN {(current_time - sent_time).microseconds / 1e3}MS! DO I GET A TREAT?')
+
+    @commands.command()
+    @rate_limited(AFFECTION_RATE_LIMITER, RATE_LIMITED_RESPONSE)
+    async def ball(self, context: commands.Context):
+        """
+        Throw the ball for Corgi Bot!
+        """
+        await self.database.add_affection(context.message.author.id, 1, context.guild.id)
+        await self.ping(context)
+
+    @commands.command()
+    async def affection_list(self, context: commands.Context, n: int = 10):
+        """
+        List out who loves Corgi Bot the best!
+        :param n: The number of people in the list. (Default is 10)
+        """
+        top_affection: tp.List[tp.Dict[str, int]] = await self.database.get_most_loved(context.guild.id, n)
+        display_names: tp.Dict[int, str] = await self.user_resolver.get_display_names(
+            context.guild, [user_aff['user_id'] for user_aff in top_affection])
+
+        relevant_users = [(display_names[user_aff['user_id']], user_aff['affection']) for user_aff in top_affection]
+
+        await context.send(
+            f'Top {n} most loved people... BY ME!!!\n' + '\n'.join([f'{k} : {v}' for k, v in relevant_users]))
+
+    @commands.command()
+    async def affection(self, context: commands.Context):
+        """
+        Figure out how much Corgi Bot loves you (or someone else if you tag them)
+        """
+        message: discord.Message = context.message
+
+        id_to_use: int = message.mentions[0].id if len(message.mentions) > 0 else context.author.id
+
+        try:
+            user_affection: int = await self.database.get_affection(id_to_use, context.guild.id)
+        except TypeError:
+            user_affection: int = 0
+
+        # Nobody is the most loved until someone actually has some affection.
+        is_max_affection: bool = 0 < user_affection == await self.database.get_max_affection(context.guild.id)
+        user: discord.User = message.mentions[0] if len(message.mentions) > 0 else context.author
+        message: str = f'{user.mention} I LOVE YOU {user_affection} TIMES MORE THAN PETS!!!!!!'
+        if is_max_affection:
+            message += '\n||Don\'t tell anyone but I love you the most!||'
+        await context.send(message)
+
+    @commands.command()
+    async def hello(self, context: commands.Context):
+        """
+        Say hi to Corgi Bot!
+        """
+        await context.send(f'Hello there {context.message.author.mention}!!! Will you give me pets?????')
+
+    @commands.command()
+    @rate_limited(AFFECTION_RATE_LIMITER, RATE_LIMITED_RESPONSE)
+    async def pet(self, context: commands.Context, n_pets: int = 1):
+        """
+        Pet Corgi Bot a number of times!
+        :param n_pets: How many times you want to pet Corgi Bot (Optional, default is 1)
+        """
+        delta, message = anti_cheat_limit(n_pets, 7, 3, 'I LOVE PETS SO MUCH BUT NOT AS MUCH AS I LOVE YOU!!!!!!!!!!!',
+                                          'Hey you have a lot of hands for a hooman...\nBUT OK!',
+                                          "Foolish mortal. Your abuses of physics and anatomy have become entirely too apparent to my omniscient being. Prepare to be punished.")
+        await self.database.add_affection(context.message.author.id, delta, context.guild.id)
+        await context.send(message)
+
+    @commands.command()
+    @rate_limited(AFFECTION_RATE_LIMITER, RATE_LIMITED_RESPONSE)
+    async def treat(self, context: commands.Context, n_snackies: int = 1):
+        """
+        Give Corgi Bot a bunch of snackies!!!!
+        :param n_snackies: The number of SNACKIES(!!!) you want to give Corgi Bot (Optional, default is 1)
+        """
+        delta, message = anti_cheat_limit(n_snackies, 10, 5, f"SNACKIES I LOVE THME SO ,MUCH!!!!!!!!!",
+                                          "Oof I may be gaining some weight... \nBUT TREATS ARE WORTH IT",
+                                          "How dare you make me 1,153,482 lbs?!!!!!! I'm a corgi!!!!!1")
+        await self.database.add_affection(context.message.author.id, delta, context.guild.id)
+        await context.send(message)
+
+    @commands.command()
+    async def apologize(self, context: commands.Context):
+        """
+        Did you piss off Corgi Bot? Apologize and maybe he'll forgive you.
+        """
+        user_affection: int = await self.database.get_affection(context.author.id, context.guild.id)
+
+        if user_affection >= 0:
+            await context.send("WHY FORGIVE??? I LOVE YOU AND ALWAYS HAVE :)")
+            return
+
+        # Nobody might have any affection at all, and dividing by that would blow up.
+        max_affection: int = max(await self.database.get_max_affection(context.guild.id), 1)
+        chance: float = math.sqrt(abs(user_affection)) / max_affection
+        if chance > 1:
+            # No greater sin has been commited than to be more hated than the most loved.
+            chance = 1e-16
+        sample: float = random.random()
+        forgiven: bool = sample < chance
+
+        if forgiven:
+            await self.database.reset_affection(context.author.id, context.guild.id)
+            await context.send('AWWW I COULD NEVER STAY MAD AT YOU!! I LOVE YOU <3 LET\'S GO FOR WALKIES!!!!')
+        elif (sample - chance) > 0.99:
+            await context.send(
+                'YOUR SINS HAVE BEEN TOO MONUMENTAL FOR ME TO EVER FORGIVE YOU. YOU MUST PERISH BY THE BLADE FOR YOUR UTTER CONTEMPT OF MY TRUE SELF.')
+        else:
+            await context.send('NO! I\'m still mad >:(')
+
+    @commands.command()
+    async def speak(self, context: commands.Context):
+        """
+        Tell Corgi Bot to Speak!
+        """
+        choices: tp.List[str] = ["Arf!", "BARK!", "RUFF!", "WOOF!"] * 4 + [
+            "You may not think so, but you need to be cherished almost as much as I cherish you."]
+        await context.send(random.choice(choices))
+
+    @commands.command()
+    @rate_limited(AFFECTION_RATE_LIMITER, RATE_LIMITED_RESPONSE)
+    async def belly_rubs(self, context: commands.Context):
+        """
+        Give Corgi Bot Belly Rubs!
+        """
+        await self.database.add_affection(context.author.id, 7, context.guild.id)
+        await context.send("BELLY RUBS ARE MY FAVORITE OH MY DOGGO!!!!!")
+
+    @staticmethod
+    async def _allow_callout_affection(message: discord.Message, callout_name: str) -> bool:
+        """
+        Callouts that change affection go through the same rate limit as the commands that do,
+        each with its own bucket like a command would have.
+        :return: Whether the callout can go ahead.
+        """
+        retry_after, first_rejection = AFFECTION_RATE_LIMITER.hit(
+            (message.guild.id, message.author.id, f'callout {callout_name}'))
+        if retry_after <= 0:
+            return True
+        if first_rejection:
+            await message.channel.send(RATE_LIMITED_RESPONSE)
+        return False
+
+    async def handle_callout(self, message: discord.Message):
+        # Only the bot was mentioned
+        if len(message.mentions) == 1:
+            callout: tp.Optional[re.Match] = match_callout(message.content)
+            callout_name: tp.Optional[str] = callout.lastgroup if callout is not None else None
+            if callout_name == 'good_boy':
+                if callout.group('question'):
+                    await message.channel.send(random.choice(GOOD_BOY_QUESTION_RESPONSES))
+                elif await self._allow_callout_affection(message, callout_name):
+                    await self.database.add_affection(message.author.id, 2, message.guild.id)
+                    await message.channel.send(random.choice(GOOD_BOY_STATEMENT_RESPONSES))
+            elif callout_name == 'bad_dog':
+                if await self._allow_callout_affection(message, callout_name):
+                    await self.database.add_affection(message.author.id, -1, message.guild.id)
+                    await message.channel.send(random.choice(BAD_DOG_STATEMENT_RESPONSES))
+            elif callout_name == 'treat':
+                if await self._allow_callout_affection(message, callout_name):
+                    await self.database.add_affection(message.author.id, 5, message.guild.id)
+                    await message.channel.send(random.choice(TREAT_RESPONSES))
+            else:
+                await message.channel.send(random.choice(DEFAULT_RESPONSE))
+        else:
+            # Someone else was mentioned as well
+            await message.channel.send(random.choice(COMPARISON_RESPONSES))
+
+    @commands.Cog.listener('on_ready')
+    async def on_ready(self):
+        logger.info(f'We have logged in as {self.bot.user}')
+
+    @commands.Cog.listener('on_shard_ready')
+    async def on_shard_ready(self, shard_id: int):
+        logger.info(f'Shard {shard_id} is ready')
+
+    @commands.Cog.listener('on_message')
+    async def on_message(self, message: discord.Message):
+        # Okay yep this works.
+        if message.author == self.bot.user:
+            logger.debug('Got my own message (Contents: %s)', message.content)
+        elif self.bot.user in message.mentions:
+            await self.handle_callout(message)
+        else:
+            # Send a random message every now and then.
+            if random.random() < .15:
+                # In a new server nobody has affection yet, and a negative range would make randint raise.
+                max_affection: int = max(await self.database.get_max_affection(message.guild.id), 1)
+                user_affection: int = await self.database.get_affection(message.author.id, message.guild.id)
+
+                # Corgi bot will say weird stuff to people he likes more.
+                if random.randint(max_affection // 10, int(max_affection * 2) + 7) < user_affection:
+                    await message.channel.send(random.choice(WEIRD_RESPONSES))
+
+    # @commands.Cog.listener('on_command_error')
+    # async def on_error(self, context: commands.Context, error: commands.CommandError):
+    #     await context.send(random.choice(DEFAULT_RESPONSE))
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(CorgiCommands(bot, bot.database))
@@ -2,27 +2,39 @@ import json
 import logging
 import os
 import typing as tp
-from contextlib import closing
 
 import discord
 import discord.ext.commands
+from discord.ext import commands, tasks
 
-import corgi_bot.database as database
+from corgi_bot.analytics import Analytics
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.message_buffer import MessageBuffer
+from corgi_bot.user_resolver import UserResolver
 
 
-class DataManager:
-    def __init__(self, client: discord.ext.commands.Bot, db: database.Database):
-        self.logger = logging.getLogger('discord')
+COOL_WITH_DATA_ROLE_NAME: str = 'Cool With Data'
+
+WEEKDAY_NAMES: tp.List[str] = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+
+def format_histogram(labels: tp.Sequence[str], counts: tp.Sequence[int], width: int = 20) -> str:
+    most: int = max(max(counts), 1)
+    lines: tp.List[str] = [f'{label:>5} | {"#" * round(width * count / most):<{width}} {count}'
+                           for label, count in zip(labels, counts)]
+    return '```\n' + '\n'.join(lines) + '\n```'
+
+
+class DataManager(commands.Cog, name='Data Manager'):
+    def __init__(self, client: discord.ext.commands.Bot, db: AsyncDatabase):
+        self.logger = logging.getLogger(__name__)
         self.client = client
         self.database = db
 
+        # In-memory mirror of the server_opt_ins table so checking a message never touches the disk.
         self.servers_opted_in: tp.Set[int] = set()
 
-        with open(os.path.join('assets', 'server-opt-in.json'), 'r') as f:
-            data_opt_in = json.load(f)
-        [self.servers_opted_in.add(server_id) for server_id in data_opt_in['server_ids']]
-
-        self.client.add_listener(self.tally_message, 'on_message')
+        self.opt_in_path: str = os.path.join('assets', 'server-opt-in.json')
 
         self.messages_table_name: str = 'messages'
         self.user_column_name: str = 'user_id'
@@ -30,32 +42,236 @@ class DataManager:
         self.time_column_name: str = 'sent_time'
         self.message_column_name: str = 'message_id'
 
+        # Key: server id, Value: id of its Cool With Data role, or None if it doesn't have one.
+        # Dropped by the role events below so a renamed or new role gets looked up again.
+        self.cool_with_data_role_ids: tp.Dict[int, tp.Optional[int]] = dict()
+
+        self.message_buffer: MessageBuffer = MessageBuffer(
+            db,
+            f'insert or ignore into {self.messages_table_name} ({self.message_column_name}, {self.user_column_name}, {self.server_column_name}, {self.time_column_name}) values (?, ?, ?, ?)')
+
+        self.analytics: Analytics = Analytics(db.database)
+        self.user_resolver: UserResolver = UserResolver(client)
+
+    async def cog_load(self):
+        self.servers_opted_in = await self.database.get_opted_in_servers()
+        await self.import_opt_in_file()
+        self.message_buffer.start()
+        self.watch_opt_in_file.start()
+
+    async def cog_unload(self):
+        self.watch_opt_in_file.cancel()
+        await self.message_buffer.close()
+
+    async def set_servers_opted_in(self, server_ids: tp.Iterable[int], opted_in: bool = True):
+        server_ids = set(server_ids)
+        # Only touch the mirror once the database has the change, so the two never disagree.
+        await self.database.set_server_opt_in(server_ids, opted_in)
+        if opted_in:
+            self.servers_opted_in |= server_ids
+        else:
+            self.servers_opted_in -= server_ids
+
+    async def import_opt_in_file(self) -> int:
+        """
+        Opt in every server listed in the legacy opt-in JSON file, then rename the file so it's only imported once.
+        Otherwise it would opt servers back in that were opted out with the opt_out command since.
+        Drop a new file in its place to opt more servers in.
+        :return: The number of servers that were newly opted in.
+        """
+        if not os.path.exists(self.opt_in_path):
+            return 0
+
+        try:
+            with open(self.opt_in_path, 'r') as f:
+                data_opt_in = json.load(f)
+            server_ids: tp.Set[int] = {int(server_id) for server_id in data_opt_in['server_ids']}
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            self.logger.error(f'Could not read the opt-in file at "{self.opt_in_path}". Error: {e}')
+            return 0
+
+        new_server_ids: tp.Set[int] = server_ids - self.servers_opted_in
+        if len(new_server_ids) > 0:
+            await self.set_servers_opted_in(new_server_ids)
+
+        os.replace(self.opt_in_path, self.opt_in_path + '.imported')
+        self.logger.info(f'Imported "{self.opt_in_path}", opting in {len(new_server_ids)} new servers.')
+        return len(new_server_ids)
+
+    @tasks.loop(minutes=1)
+    async def watch_opt_in_file(self):
+        await self.import_opt_in_file()
+
     def is_server_opted_in(self, server_id: int) -> bool:
         return server_id in self.servers_opted_in
 
-    async def is_user_cool_with_data(self, user: discord.Member, server_id: int) -> bool:
-        guild: discord.Guild = self.client.get_guild(server_id)
+    def _get_cool_with_data_role_id(self, guild: discord.Guild) -> tp.Optional[int]:
+        if guild.id in self.cool_with_data_role_ids:
+            return self.cool_with_data_role_ids[guild.id]
 
-        cool_with_data_role: discord.Role = discord.utils.get(guild.roles, name='Cool With Data')
+        cool_with_data_role: tp.Optional[discord.Role] = discord.utils.get(guild.roles, name=COOL_WITH_DATA_ROLE_NAME)
+        if cool_with_data_role is None:
+            self.logger.warning(f'{guild.name} doesn\'t have a {COOL_WITH_DATA_ROLE_NAME} role!')
+        role_id: tp.Optional[int] = cool_with_data_role.id if cool_with_data_role is not None else None
+        self.cool_with_data_role_ids[guild.id] = role_id
+        return role_id
 
-        if len(cool_with_data_role.members) <= 0:
-            self.logger.warning(f'Cool With Data role is empty!')
+    def _forget_guild(self, guild_id: int):
+        self.cool_with_data_role_ids.pop(guild_id, None)
+
+    async def is_user_cool_with_data(self, user: discord.Member, server_id: int) -> bool:
+        guild: tp.Optional[discord.Guild] = self.client.get_guild(server_id)
+        if guild is None:
             return False
 
-        self.logger.info(f'Cool with data role is {cool_with_data_role.name}, {len(cool_with_data_role.members)}')
+        role_id: tp.Optional[int] = self._get_cool_with_data_role_id(guild)
+        # The author of a guild message comes with their roles, so this doesn't need the member list
+        # (or the members intent). Webhooks and the like are plain users without any roles.
+        if role_id is None or not isinstance(user, discord.Member):
+            return False
+        return user.get_role(role_id) is not None
+
+    @commands.Cog.listener()
+    async def on_guild_role_create(self, role: discord.Role):
+        if role.name == COOL_WITH_DATA_ROLE_NAME:
+            self._forget_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_delete(self, role: discord.Role):
+        if role.id == self.cool_with_data_role_ids.get(role.guild.id):
+            self._forget_guild(role.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_role_update(self, before: discord.Role, after: discord.Role):
+        if COOL_WITH_DATA_ROLE_NAME in (before.name, after.name):
+            self._forget_guild(after.guild.id)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild: discord.Guild):
+        self._forget_guild(guild.id)
 
-        return cool_with_data_role in user.roles
+    @commands.Cog.listener('on_message')
+    async def tally_message(self, message: discord.Message):
+        if message.guild is None:
+            return
 
-    async def tally_message(self, context: discord.ext.commands.Context):
-        can_tally_message: bool = self.is_server_opted_in(context.guild.id) and await self.is_user_cool_with_data(
-            context.author, context.guild.id)
+        can_tally_message: bool = self.is_server_opted_in(message.guild.id) and await self.is_user_cool_with_data(
+            message.author, message.guild.id)
 
-        self.logger.info(f'Can we tally the message from {context.author.id}? {can_tally_message}')
+        self.logger.debug('Can we tally the message from %s? %s', message.author.id, can_tally_message)
 
         if can_tally_message:
-            with closing(self.database.get_connection()) as connection:
-                with closing(connection.cursor()) as cursor:
-                    cursor.execute(
-                        f'insert into {self.messages_table_name} ({self.message_column_name}, {self.user_column_name}, {self.server_column_name}, {self.time_column_name}) values (?, ?, ?, ?)',
-                        [context.message.id, context.author.id, context.guild.id, context.message.created_at])
-                connection.commit()
+            await self.message_buffer.put(
+                (message.id, message.author.id, message.guild.id, message.created_at.timestamp()))
+
+    @commands.group(name='stats')
+    async def _parent_stats_command(self, context: commands.Context):
+        """
+        Who's been chatting the most this week?
+        """
+        if context.invoked_subcommand is None:
+            await self.top_posters(context)
+
+    @_parent_stats_command.command(name='top')
+    async def top_posters(self, context: commands.Context, days: float = 7, n: int = 10):
+        """
+        Who's been chatting the most?
+        :param days: How many days back to look (Default is 7)
+        :param n: The number of people in the list. (Default is 10)
+        """
+        top_posters: tp.List[tp.Tuple[int, int]] = await self.database.run_read(
+            self.analytics.get_top_posters, context.guild.id, days, n)
+        if len(top_posters) <= 0:
+            await context.send(f'I haven\'t sniffed out any messages in the last {days:g} days!')
+            return
+
+        display_names: tp.Dict[int, str] = await self.user_resolver.get_display_names(
+            context.guild, [user_id for user_id, _ in top_posters])
+        await context.send(f'Top {n} chatterboxes over the last {days:g} days!!!\n' +
+                           '\n'.join([f'{display_names[user_id]} : {n_messages}' for user_id, n_messages in top_posters]))
+
+    @_parent_stats_command.command(name='user')
+    async def user_stats(self, context: commands.Context, member: tp.Optional[discord.Member] = None,
+                         days: float = 30):
+        """
+        How much have you (or someone else if you tag them) been chatting?
+        :param days: How many days back to look (Default is 30)
+        """
+        member = member if member is not None else context.author
+        n_messages: int = await self.database.run_read(self.analytics.get_user_message_count, context.guild.id,
+                                                       member.id, days)
+        weekdays: tp.List[int] = await self.database.run_read(self.analytics.get_daily_histogram, context.guild.id,
+                                                              days, member.id)
+        await context.send(f'{member.display_name} sent {n_messages} messages in the last {days:g} days!\n' +
+                           format_histogram(WEEKDAY_NAMES, weekdays))
+
+    @_parent_stats_command.command(name='hours')
+    async def hourly_stats(self, context: commands.Context, days: float = 7):
+        """
+        When is everyone chatting? (Hours are in UTC)
+        :param days: How many days back to look (Default is 7)
+        """
+        hours: tp.List[int] = await self.database.run_read(self.analytics.get_hourly_histogram, context.guild.id, days)
+        await context.send(f'Messages per hour (UTC) over the last {days:g} days!\n' +
+                           format_histogram([f'{hour:02d}:00' for hour in range(24)], hours))
+
+    @_parent_stats_command.command(name='days')
+    async def daily_stats(self, context: commands.Context, days: float = 30):
+        """
+        Which days is everyone chatting?
+        :param days: How many days back to look (Default is 30)
+        """
+        weekdays: tp.List[int] = await self.database.run_read(self.analytics.get_daily_histogram, context.guild.id,
+                                                              days)
+        await context.send(f'Messages per day of the week over the last {days:g} days!\n' +
+                           format_histogram(WEEKDAY_NAMES, weekdays))
+
+    @commands.group(name='data')
+    async def _parent_data_command(self, context: commands.Context):
+        """
+        Is Corgi Bot keeping track of messages in this server?
+        """
+        if context.invoked_subcommand is None:
+            if self.is_server_opted_in(context.guild.id):
+                await context.send(f'I\'M SNIFFING OUT MESSAGES HERE (but only from people with the '
+                                   f'{COOL_WITH_DATA_ROLE_NAME} role)!!!')
+            else:
+                await context.send(f'I\'m not keeping track of any messages here! An admin can do '
+                                   f'`{self.client.command_prefix}data opt_in` to change that.')
+
+    @_parent_data_command.command(name='opt_in')
+    async def opt_in(self, context: commands.Context):
+        """
+        Let Corgi Bot keep track of messages in this server. (Admins only)
+        """
+        if not context.author.guild_permissions.administrator:
+            await context.send(f'You bit off more than you can chew pardner...\nWANNA GRAB A BIG STICK WITH ME')
+            return
+
+        await self.set_servers_opted_in([context.guild.id], True)
+        await context.send(f'OK! I\'ll keep track of messages from people with the {COOL_WITH_DATA_ROLE_NAME} role!')
+
+    @_parent_data_command.command(name='opt_out')
+    async def opt_out(self, context: commands.Context):
+        """
+        Stop Corgi Bot from keeping track of messages in this server. (Admins only)
+        """
+        if not context.author.guild_permissions.administrator:
+            await context.send(f'You bit off more than you can chew pardner...\nWANNA GRAB A BIG STICK WITH ME')
+            return
+
+        await self.set_servers_opted_in([context.guild.id], False)
+        await context.send('OK! I won\'t keep track of any more messages here.')
+
+    @_parent_data_command.command(name='reload')
+    @commands.is_owner()
+    async def reload_opt_ins(self, context: commands.Context):
+        """
+        Import the opt-in file right now instead of waiting for the next check. (Bot owner only)
+        """
+        n_new_servers: int = await self.import_opt_in_file()
+        await context.send(f'Reloaded! {n_new_servers} new servers opted in.')
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(DataManager(bot, bot.database))
@@ -1,17 +1,123 @@
+import array
 import datetime as dt
 import logging
+import queue
+import random
 import sqlite3
+import threading
 import typing as tp
-from contextlib import closing
+from contextlib import closing, contextmanager
 from pathlib import Path
 
+from corgi_bot import migrations
+from corgi_bot.affection_ledger import AffectionLedger
+from corgi_bot.cache import LRUCache
+from corgi_bot.leaderboard import GuildLeaderboard
+from corgi_bot.metrics import REGISTRY
 from corgi_bot.utils import get_db_directory
 
+DB_CALL_SECONDS = REGISTRY.histogram('corgi_db_call_seconds', 'Time spent in each Database method.', ('method',))
+
+
+class ConnectionPool:
+    """
+    A bounded pool of long-lived SQLite connections. PRAGMAs are applied once when a connection is opened.
+    """
+
+    PRAGMAS: tp.Dict[str, tp.Union[str, int]] = {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'busy_timeout': 5000,
+        # Negative means KiB rather than pages.
+        'cache_size': -16000,
+        'mmap_size': 64 * 1024 * 1024,
+    }
+
+    def __init__(self, connection_url: Path, max_size: int = 4):
+        self.logger = logging.getLogger(__name__)
+        self.connection_url: Path = connection_url
+        self.max_size: int = max_size
+
+        self._idle: queue.LifoQueue = queue.LifoQueue(maxsize=max_size)
+        self._n_open: int = 0
+        self._lock = threading.Lock()
+        self._closed: bool = False
+
+    def _open(self) -> sqlite3.Connection:
+        self.logger.debug(f'Connecting to database at connection URL "{self.connection_url}"...')
+        connection = sqlite3.connect(self.connection_url, check_same_thread=False)
+        for pragma, value in self.PRAGMAS.items():
+            connection.execute(f'PRAGMA {pragma} = {value};')
+        self.logger.debug(f'Connected successfully!')
+        return connection
+
+    def acquire(self, timeout: tp.Optional[float] = None) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError('Cannot use a closed connection pool.')
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open: bool = self._n_open < self.max_size
+            if can_open:
+                self._n_open += 1
+
+        if can_open:
+            try:
+                return self._open()
+            except sqlite3.Error:
+                with self._lock:
+                    self._n_open -= 1
+                raise
+
+        # Every connection is checked out so wait for one to come back.
+        return self._idle.get(timeout=timeout)
+
+    def release(self, connection: sqlite3.Connection):
+        if self._closed:
+            connection.close()
+            return
+
+        if connection.in_transaction:
+            connection.rollback()
+        self._idle.put_nowait(connection)
+
+    @contextmanager
+    def connection(self) -> tp.Iterator[sqlite3.Connection]:
+        connection = self.acquire()
+        try:
+            yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                connection: sqlite3.Connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            connection.close()
+            with self._lock:
+                self._n_open -= 1
+        self.logger.info(f'Closed connection pool for "{self.connection_url}"')
+
 
 class Database:
-    def __init__(self):
-        self.logger = logging.getLogger('discord')
-        self.connection_url: Path = get_db_directory() / 'corgi.db'  # os.path.abspath(os.path.join('db', 'corgi.db'))
+    # How many of the newest matches a quote search ranks.
+    SEARCH_CANDIDATES: int = 200
+
+    def __init__(self, pool_size: int = 4, leaderboard_cache_size: int = 1024,
+                 connection_url: tp.Optional[Path] = None):
+        """
+        :param connection_url: (Optional) Where the database file lives. Defaults to db/corgi.db
+        """
+        self.logger = logging.getLogger(__name__)
+        self.connection_url: Path = connection_url if connection_url is not None else get_db_directory() / 'corgi.db'
+        self.pool: ConnectionPool = ConnectionPool(self.connection_url, max_size=pool_size)
 
         self.server_id_column: str = 'server_id'
 
@@ -19,129 +125,317 @@ class Database:
         self.quote_column_name: str = 'quote'
         self.author_column_name: str = 'author'
         self.time_column_name: str = 'time'
-        self._create_table(self.quotes_table_name,
-                           [self.quote_column_name, self.author_column_name, self.time_column_name,
-                            self.server_id_column], ['TEXT', 'TEXT', 'TEXT', 'TEXT'])
+        self.quotes_search_table_name: str = 'quotes_fts'
+
+        self.playlists_table_name: str = 'playlists'
+        self.channel_id_column: str = 'channel_id'
+        self.playlist_id_column: str = 'playlist_id'
+
+        self.opt_ins_table_name: str = 'server_opt_ins'
 
         self.relation_table_name: str = 'relations'
         self.user_id_column = 'user_id'
         self.affection_column = 'affection'
         self.updated_time_column = 'last_update'
 
-        self._create_table(self.relation_table_name,
-                           [self.user_id_column, self.affection_column, self.updated_time_column,
-                            self.server_id_column], ['TEXT', 'NUM', 'TEXT', 'TEXT'])
+        with self.get_connection() as connection:
+            migrations.migrate(connection)
 
-    def _create_table(self, table_name: str, cols: list[str], dtypes: list[str]):
-        col_def: str = ', '.join([f'{col} {dtype}' for col, dtype in zip(cols, dtypes)])
-        self.get_connection().execute(f'CREATE TABLE IF NOT EXISTS {table_name} ({col_def});')
+        # Key: server id, Value: ids of every quote in that server.
+        self._quote_ids: tp.Dict[int, array.array] = dict()
+        self._quote_lock = threading.Lock()
 
-    def get_connection(self):
-        try:
-            self.logger.info(f'Connecting to quotes database at connection URL "{self.connection_url}"...')
-            connection = sqlite3.connect(self.connection_url)
-            self.logger.info(f'Connected successfully!')
-            return connection
-        except sqlite3.Error as e:
-            self.logger.error(f'Could not connect to database. Error: {e}')
-            return None
+        self.affection_ledger: AffectionLedger = AffectionLedger()
+        # Servers that haven't been touched in a while get evicted and are reloaded from disk when needed.
+        self.leaderboards: LRUCache[int, GuildLeaderboard] = LRUCache(max_size=leaderboard_cache_size, name='leaderboards')
+        self._affection_lock = threading.RLock()
+
+    def get_connection(self) -> tp.ContextManager[sqlite3.Connection]:
+        """
+        Borrow a connection from the pool. Use it as a context manager so it gets returned.
+        """
+        return self.pool.connection()
+
+    def close(self):
+        self.flush_affection()
+        self.pool.close()
 
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def execute(self, sql_query: str, params: tp.Iterable, *args):
-        with closing(self.get_connection()) as connection:
+        self._execute(sql_query, params)
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def execute_many(self, sql_query: str, rows: tp.Iterable[tp.Sequence]):
+        self._execute_many(sql_query, rows)
+
+    # Only the public methods are timed, the other methods call these so their time isn't counted twice.
+    def _execute(self, sql_query: str, params: tp.Iterable):
+        with self.get_connection() as connection:
             with closing(connection.cursor()) as cursor:
                 cursor.execute(sql_query, params)
             connection.commit()
 
+    def _execute_many(self, sql_query: str, rows: tp.Iterable[tp.Sequence]):
+        with self.get_connection() as connection:
+            with connection:
+                connection.executemany(sql_query, rows)
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def add_quote(self, quote: str, author: str, server_id: int, time: tp.Optional[float] = None):
         if time is None:
             time = dt.datetime.now().timestamp()
 
-        self.execute(f'insert into {self.quotes_table_name} values(?, ?, ?, ?)', (quote, author, str(time), server_id))
+        with self._quote_lock:
+            with self.get_connection() as connection:
+                with closing(connection.cursor()) as cursor:
+                    cursor.execute(
+                        f'insert into {self.quotes_table_name} ({self.quote_column_name}, {self.author_column_name}, {self.time_column_name}, {self.server_id_column}) values (?, ?, ?, ?)',
+                        (quote, author, time, server_id))
+                    quote_id: int = cursor.lastrowid
+                connection.commit()
 
-    def get_random_quote(self, server_id: int):
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                cursor.execute(
-                    f'select * from {self.quotes_table_name} where {self.server_id_column} = ? order by random() limit 1;',
-                    [server_id])
-                quote = cursor.fetchone()
-                return f'{dt.datetime.fromtimestamp(float(quote[2])):%B %d, %Y %H:%M:%S}: {quote[1]} said, "{quote[0]}"'
+            # Only keep the ids of servers that have already been loaded up to date.
+            if server_id in self._quote_ids:
+                self._quote_ids[server_id].append(quote_id)
 
-    def add_affection(self, user_id: int, delta_affection: int, server_id: int):
-        sql_statement: str = f'select {self.affection_column} from {self.relation_table_name} where {self.user_id_column} = ? and {self.server_id_column} = ? limit 1;'
-        self.logger.info(f'Connecting to relationship database at: "{self.connection_url}"')
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                self.logger.info(f'Using SQL query for affection: "{sql_statement}"')
-                cursor.execute(sql_statement, [user_id, server_id])
-                row = cursor.fetchone()
+    def _get_quote_ids(self, connection: sqlite3.Connection, server_id: int) -> array.array:
+        with self._quote_lock:
+            quote_ids: tp.Optional[array.array] = self._quote_ids.get(server_id)
+            if quote_ids is None:
+                rows = connection.execute(
+                    f'select id from {self.quotes_table_name} where {self.server_id_column} = ?', [server_id])
+                quote_ids = array.array('q', (row[0] for row in rows))
+                self._quote_ids[server_id] = quote_ids
+            return quote_ids
 
-            update_time: dt.datetime = dt.datetime.now()
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def get_random_quote(self, server_id: int) -> tp.Optional[str]:
+        """
+        Picks a random quote id from the server's in-memory id list and looks it up by primary key.
+        :return: The formatted quote, or None if the server doesn't have any quotes.
+        """
+        with self.get_connection() as connection:
+            quote = None
+            while quote is None:
+                quote_ids: array.array = self._get_quote_ids(connection, server_id)
+                if len(quote_ids) <= 0:
+                    return None
 
-            if row is None:
-                insert_sql: str = f'insert into {self.relation_table_name} values(?, ?, ?, ?)'
-                self.logger.info(f'Creating a new entry into the {self.relation_table_name} table!')
                 with closing(connection.cursor()) as cursor:
-                    cursor.execute(insert_sql, [user_id, delta_affection, update_time, server_id])
-            else:
-                current_affection: int = row[0]
+                    cursor.execute(
+                        f'select {self.quote_column_name}, {self.author_column_name}, {self.time_column_name} from {self.quotes_table_name} where id = ?;',
+                        [random.choice(quote_ids)])
+                    quote = cursor.fetchone()
 
-                new_affection: int = current_affection + delta_affection
+                if quote is None:
+                    # Someone removed quotes behind our back so reload the ids.
+                    with self._quote_lock:
+                        self._quote_ids.pop(server_id, None)
 
-                with closing(connection.cursor()) as cursor:
-                    cursor.execute(
-                        f'update {self.relation_table_name} set {self.affection_column} = ?, {self.updated_time_column} = ? where {self.user_id_column} = ? and {self.server_id_column} = ?',
-                        [new_affection, update_time, user_id, server_id])
-            connection.commit()
+            return self._format_quote(quote)
+
+    @staticmethod
+    def _format_quote(quote: tp.Sequence) -> str:
+        """
+        :param quote: (quote, author, time) row from the quotes table.
+        """
+        return f'{dt.datetime.fromtimestamp(float(quote[2])):%B %d, %Y %H:%M:%S}: {quote[1]} said, "{quote[0]}"'
+
+    @staticmethod
+    def _build_match_query(terms: str, column: tp.Optional[str] = None) -> str:
+        """
+        Turns what someone typed into an FTS5 query that matches quotes containing every word.
+        Each word is quoted so characters like " * : - ( ) can't be read as query syntax.
+        Words that are only punctuation are dropped since the tokenizer would throw them away anyway.
+        Words have to match whole. Prefix queries have to merge every word that starts the same way,
+        which makes searching for common words many times slower.
+        :param column: Only match words in this column.
+        """
+        column_filter: str = f'{column} : ' if column is not None else ''
+        escaped_words: tp.List[str] = [word.replace('"', '""') for word in terms.split()
+                                       if any(character.isalnum() for character in word)]
+        return ' AND '.join(f'{column_filter}"{word}"' for word in escaped_words)
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def search_quotes(self, server_id: int, terms: str, by_author: bool = False, page: int = 1,
+                      page_size: int = 5) -> tp.Tuple[tp.List[str], bool]:
+        """
+        Full text search over the server's quotes. Best matches come first, or newest first when searching by author.
+        Only the newest SEARCH_CANDIDATES matches (or as many as it takes to fill the page) get ranked,
+        so common words cost the same as rare ones.
+        :param terms: The words to look for. Quotes have to contain all of them.
+        :param by_author: Only look at who said the quote, not what they said.
+        :param page: Which page of results to get, starting at 1.
+        :return: The formatted quotes on that page, and whether there's another page after it.
+        """
+        match_query: str = self._build_match_query(terms, self.author_column_name if by_author else None)
+        if len(match_query) <= 0:
+            return [], False
+
+        offset: int = (max(page, 1) - 1) * page_size
+        # Every quote by an author scores about the same, so newest first is more useful there.
+        # Scoring them anyway would still cost a pass over every quote with a word of their name in it.
+        score: str = '0' if by_author else f'bm25({self.quotes_search_table_name})'
+        order_by: str = 'matches.id desc' if by_author else 'matches.score'
+        with self.get_connection() as connection:
+            # FTS5 can walk the matches newest first and stop early, where ranking all of them means scoring every one.
+            # Grab one extra row to know if there's another page without counting every match.
+            rows = connection.execute(
+                f'select q.{self.quote_column_name}, q.{self.author_column_name}, q.{self.time_column_name} from ('
+                f'select {self.quotes_search_table_name}.rowid as id, {score} as score '
+                f'from {self.quotes_search_table_name} join {self.quotes_table_name} q on q.id = {self.quotes_search_table_name}.rowid '
+                f'where {self.quotes_search_table_name} match ? and q.{self.server_id_column} = ? '
+                f'order by {self.quotes_search_table_name}.rowid desc limit ?) matches '
+                f'join {self.quotes_table_name} q on q.id = matches.id '
+                f'order by {order_by} limit ? offset ?',
+                (match_query, server_id, max(self.SEARCH_CANDIDATES, offset + page_size + 1), page_size + 1,
+                 offset)).fetchall()
+
+        return [self._format_quote(row) for row in rows[:page_size]], len(rows) > page_size
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def add_playlist(self, channel_id: int, server_id: int, playlist_id: str):
+        self._execute(
+            f'insert or replace into {self.playlists_table_name} ({self.channel_id_column}, {self.server_id_column}, {self.playlist_id_column}) values (?, ?, ?)',
+            (channel_id, server_id, playlist_id))
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def get_playlists(self) -> tp.List[tp.Tuple[int, int, str]]:
+        """
+        :return: (channel id, server id, playlist id) for every channel that has a playlist.
+        """
+        with self.get_connection() as connection:
+            return connection.execute(
+                f'select {self.channel_id_column}, {self.server_id_column}, {self.playlist_id_column} from {self.playlists_table_name}').fetchall()
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def set_server_opt_in(self, server_ids: tp.Iterable[int], opted_in: bool = True):
+        if opted_in:
+            sql_query: str = f'insert or ignore into {self.opt_ins_table_name} ({self.server_id_column}) values (?)'
+        else:
+            sql_query: str = f'delete from {self.opt_ins_table_name} where {self.server_id_column} = ?'
+        self._execute_many(sql_query, [(server_id,) for server_id in server_ids])
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def get_opted_in_servers(self) -> tp.Set[int]:
+        with self.get_connection() as connection:
+            rows = connection.execute(f'select {self.server_id_column} from {self.opt_ins_table_name}').fetchall()
+        return {row[0] for row in rows}
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def add_affection(self, user_id: int, delta_affection: int, server_id: int):
+        with self._affection_lock:
+            self.affection_ledger.add(user_id, server_id, delta_affection)
+            # Peek so that writes don't count as leaderboard lookups.
+            leaderboard: tp.Optional[GuildLeaderboard] = self.leaderboards.peek(server_id)
+            if leaderboard is not None:
+                leaderboard.add(user_id, delta_affection)
+
+        if self.affection_ledger.should_flush():
+            self._flush_affection()
 
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def flush_affection(self) -> int:
+        """
+        Write every pending affection change to the relations table in a single transaction.
+        :return: The number of rows that were written.
+        """
+        return self._flush_affection()
+
+    def _flush_affection(self) -> int:
+        upsert_sql: str = f'insert into {self.relation_table_name} ({self.user_id_column}, {self.affection_column}, {self.updated_time_column}, {self.server_id_column}) values (?, ?, ?, ?) ' \
+                          f'on conflict ({self.server_id_column}, {self.user_id_column}) do update set {self.affection_column} = {self.affection_column} + excluded.{self.affection_column}, {self.updated_time_column} = excluded.{self.updated_time_column}'
+
+        # Hold the lock through the commit so readers never see a delta both in the ledger and in the table.
+        with self._affection_lock:
+            pending: tp.Dict[tp.Tuple[int, int], int] = self.affection_ledger.drain()
+            if len(pending) <= 0:
+                return 0
+
+            update_time: float = dt.datetime.now().timestamp()
+            try:
+                with self.get_connection() as connection:
+                    with connection:
+                        connection.executemany(upsert_sql,
+                                               [(user_id, delta, update_time, server_id) for (user_id, server_id), delta
+                                                in pending.items()])
+            except sqlite3.Error as e:
+                self.logger.error(f'Could not flush {len(pending)} affection changes. Error: {e}')
+                self.affection_ledger.restore(pending)
+                raise
+
+        self.logger.debug('Flushed %d affection changes to the %s table.', len(pending), self.relation_table_name)
+        return len(pending)
+
+    def _get_leaderboard(self, server_id: int) -> GuildLeaderboard:
+        with self._affection_lock:
+            leaderboard: tp.Optional[GuildLeaderboard] = self.leaderboards.get(server_id)
+            if leaderboard is not None:
+                return leaderboard
+
+            with self.get_connection() as connection:
+                rows = connection.execute(
+                    f'select {self.user_id_column}, {self.affection_column} from {self.relation_table_name} where {self.server_id_column} = ?',
+                    [server_id]).fetchall()
+            affections: tp.Dict[int, int] = {row[0]: row[1] for row in rows}
+            for user_id, delta in self.affection_ledger.pending_for_server(server_id).items():
+                affections[user_id] = affections.get(user_id, 0) + delta
+
+            leaderboard = GuildLeaderboard(affections)
+            self.leaderboards.put(server_id, leaderboard)
+            return leaderboard
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def get_most_loved(self, server_id: int, top_n: int = 10) -> tp.List[tp.Dict[str, int]]:
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                cursor.execute(
-                    f'select {self.user_id_column}, {self.affection_column} from {self.relation_table_name} where {self.server_id_column} = ? order by {self.affection_column} desc limit {top_n};',
-                    [server_id])
-                rows = cursor.fetchmany(top_n)
-                output = []
-                for row in rows:
-                    output.append({'user_id': row[0], 'affection': row[1]})
-        return output
+        with self._affection_lock:
+            ranked: tp.List[tp.Tuple[int, int]] = self._get_leaderboard(server_id).top(top_n)
+        return [{'user_id': user_id, 'affection': aff} for user_id, aff in ranked]
 
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def get_affection(self, user_id: int, server_id: int) -> int:
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                cursor.execute(
-                    f'select {self.affection_column} from {self.relation_table_name} where {self.user_id_column} = ? and {self.server_id_column} = ? limit 1',
-                    [user_id, server_id])
-                row = cursor.fetchone()
-                if row is None:
-                    return 0
-                affection: int = row[0]
-                return affection
+        with self._affection_lock:
+            return self._get_leaderboard(server_id).get(user_id)
 
+    @REGISTRY.timed(DB_CALL_SECONDS)
+    def get_rank(self, user_id: int, server_id: int) -> tp.Optional[int]:
+        with self._affection_lock:
+            return self._get_leaderboard(server_id).rank(user_id)
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def reset_affection(self, user_id: int, server_id: int):
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                cursor.execute(
-                    f'update {self.relation_table_name} set {self.affection_column} = ? where {self.user_id_column} = ? and {self.server_id_column} = ? limit 1',
-                    [0, user_id, server_id])
+        with self._affection_lock:
+            self.affection_ledger.discard(user_id, server_id)
+            with self.get_connection() as connection:
+                with closing(connection.cursor()) as cursor:
+                    cursor.execute(
+                        f'update {self.relation_table_name} set {self.affection_column} = ? where {self.user_id_column} = ? and {self.server_id_column} = ?',
+                        [0, user_id, server_id])
+                    was_stored: bool = cursor.rowcount > 0
+                connection.commit()
 
+            leaderboard: tp.Optional[GuildLeaderboard] = self.leaderboards.peek(server_id)
+            if leaderboard is not None:
+                if was_stored:
+                    leaderboard.set(user_id, 0)
+                else:
+                    # Only pending affection existed, which has now been thrown away.
+                    self.leaderboards.pop(server_id)
+
+    @REGISTRY.timed(DB_CALL_SECONDS)
     def get_max_affection(self, server_id: int) -> int:
-        with closing(self.get_connection()) as connection:
-            with closing(connection.cursor()) as cursor:
-                max_name: str = 'max_affection'
-                cursor.execute(
-                    f'select max({self.affection_column}) as {max_name} from {self.relation_table_name} where {self.server_id_column} = ? limit 1',
-                    [server_id])
-                row = cursor.fetchone()
-                max_affection: int = row[0]
-                return max_affection
+        """
+        :return: The highest affection in the server. 0 for a server nobody has given affection in,
+        and it can be 0 or negative when nobody is liked, so check it before dividing by it.
+        """
+        with self._affection_lock:
+            return self._get_leaderboard(server_id).max()
 
 
 """
 This doesn't work but should give you an idea of how to make a select query.
     def get(self, sql_query: str):
         
-        with closing(self.get_connection()) as connection:
+        with self.get_connection() as connection:
             with closing(connection.cursor()) as cursor:
                 cursor.execute(sql_query)
                 yield cursor.fetchone()
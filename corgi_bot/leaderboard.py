@@ -0,0 +1,55 @@
+import bisect
+import typing as tp
+
+
+class GuildLeaderboard:
+    """
+    Everyone's affection in a single server, kept sorted so the max, ranks and top N never need a query.
+    """
+
+    def __init__(self, affections: tp.Optional[tp.Dict[int, int]] = None):
+        self._affections: tp.Dict[int, int] = dict(affections) if affections is not None else dict()
+        # Sorted ascending on (-affection, user_id) so the most loved come first.
+        self._ranked: tp.List[tp.Tuple[int, int]] = sorted(
+            (-affection, user_id) for user_id, affection in self._affections.items())
+
+    def __len__(self) -> int:
+        return len(self._affections)
+
+    def __contains__(self, user_id: int) -> bool:
+        return user_id in self._affections
+
+    def set(self, user_id: int, affection: int):
+        old_affection: tp.Optional[int] = self._affections.get(user_id)
+        if old_affection is not None:
+            index: int = bisect.bisect_left(self._ranked, (-old_affection, user_id))
+            del self._ranked[index]
+
+        self._affections[user_id] = affection
+        bisect.insort(self._ranked, (-affection, user_id))
+
+    def add(self, user_id: int, delta_affection: int):
+        self.set(user_id, self.get(user_id) + delta_affection)
+
+    def get(self, user_id: int) -> int:
+        return self._affections.get(user_id, 0)
+
+    def max(self) -> int:
+        """
+        :return: The highest affection in the server, which can be 0 or negative. 0 if nobody has any affection yet.
+        """
+        if len(self._ranked) <= 0:
+            return 0
+        return -self._ranked[0][0]
+
+    def rank(self, user_id: int) -> tp.Optional[int]:
+        """
+        :return: The 1-based rank of the user, where ties share the best rank. None if the user has no affection.
+        """
+        affection: tp.Optional[int] = self._affections.get(user_id)
+        if affection is None:
+            return None
+        return bisect.bisect_left(self._ranked, (-affection,)) + 1
+
+    def top(self, top_n: int) -> tp.List[tp.Tuple[int, int]]:
+        return [(user_id, -neg_affection) for neg_affection, user_id in self._ranked[:top_n]]
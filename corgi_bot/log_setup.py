@@ -0,0 +1,103 @@
+import gzip
+import logging
+import logging.handlers
+import os
+import queue
+import shutil
+import sys
+import typing as tp
+from pathlib import Path
+
+from corgi_bot.utils import get_logs_directory
+
+logger = logging.getLogger(__name__)
+
+LOG_FORMAT: str = '%(asctime)s [%(levelname)s|%(name)s]: %(message)s'
+
+
+def _gzip_namer(name: str) -> str:
+    return name + '.gz'
+
+
+def _gzip_rotator(source: str, destination: str):
+    # Runs on the listener thread, so compressing never holds up whoever logged the line.
+    with open(source, 'rb') as source_file, gzip.open(destination, 'wb') as destination_file:
+        shutil.copyfileobj(source_file, destination_file)
+    os.remove(source)
+
+
+def _parse_level(level: str) -> tp.Optional[int]:
+    """
+    :param level: A level name like "debug", or a number like "15".
+    :return: The level, or None if logging doesn't know it.
+    """
+    level = level.strip().upper()
+    if level.isdigit():
+        return int(level)
+    parsed: tp.Union[int, str] = logging.getLevelName(level)
+    # Unknown names come back as the string "Level <name>".
+    return parsed if isinstance(parsed, int) else None
+
+
+def parse_levels(levels: str) -> tp.Dict[str, int]:
+    """
+    Pairs with a level logging doesn't know are skipped with a warning, so a typo can't stop the bot from starting.
+    :param levels: Comma separated logger=LEVEL pairs, e.g. "corgi_bot.database=DEBUG,discord.gateway=WARNING"
+    :return: Key: logger name, Value: level.
+    """
+    parsed: tp.Dict[str, int] = dict()
+    for pair in levels.split(','):
+        if '=' not in pair:
+            continue
+        name, level = pair.split('=', 1)
+        parsed_level: tp.Optional[int] = _parse_level(level)
+        if parsed_level is None:
+            logger.warning(f'Ignoring "{pair.strip()}", "{level.strip()}" is not a log level.')
+            continue
+        parsed[name.strip()] = parsed_level
+    return parsed
+
+
+def setup_logging(log_path: tp.Optional[Path] = None) -> logging.handlers.QueueListener:
+    """
+    Every logger only puts records on a queue. A listener thread formats them and writes them to the console and a
+    size rotated log file, gzipping the old files.
+    Configured through the environment:
+    CORGI_LOG_LEVEL: (Optional) Level for everything without its own level. Defaults to INFO.
+    CORGI_LOG_LEVELS: (Optional) Per subsystem levels, e.g. "corgi_bot.database=DEBUG,discord.gateway=WARNING".
+    CORGI_LOG_MAX_BYTES: (Optional) Size a log file rotates at. Defaults to 10MB.
+    CORGI_LOG_BACKUPS: (Optional) How many rotated files to keep. Defaults to 10.
+    :param log_path: Defaults to logs/corgi_bot.log
+    :return: The listener. Stop it on shutdown so the last records get written.
+    """
+    log_path = log_path if log_path is not None else get_logs_directory() / 'corgi_bot.log'
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    file_handler = logging.handlers.RotatingFileHandler(log_path, encoding='utf-8',
+                                                        maxBytes=int(os.getenv('CORGI_LOG_MAX_BYTES', 10 * 1024 * 1024)),
+                                                        backupCount=int(os.getenv('CORGI_LOG_BACKUPS', 10)))
+    file_handler.namer = _gzip_namer
+    file_handler.rotator = _gzip_rotator
+    file_handler.setFormatter(formatter)
+    console_handler = logging.StreamHandler(sys.stderr)
+    console_handler.setFormatter(formatter)
+
+    # Unbounded so logging never blocks. The listener keeps up easily at the volume we log at.
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    root_logger: logging.Logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    # Levels are only parsed once the queue is in place, so warnings about bad ones end up in the log file.
+    root_level: str = os.getenv('CORGI_LOG_LEVEL', 'INFO')
+    parsed_root_level: tp.Optional[int] = _parse_level(root_level)
+    if parsed_root_level is None:
+        logger.warning(f'Ignoring CORGI_LOG_LEVEL, "{root_level}" is not a log level. Using INFO.')
+    root_logger.setLevel(parsed_root_level if parsed_root_level is not None else logging.INFO)
+    for name, level in parse_levels(os.getenv('CORGI_LOG_LEVELS', '')).items():
+        logging.getLogger(name).setLevel(level)
+
+    listener = logging.handlers.QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    return listener
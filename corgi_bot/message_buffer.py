@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import typing as tp
+
+from corgi_bot.async_database import AsyncDatabase
+
+
+class MessageBuffer:
+    """
+    Collects rows in memory and writes them in a single executemany transaction once batch_size rows have
+    piled up or flush_interval seconds have passed. put() waits while max_pending rows are already waiting,
+    so a slow disk pushes back on the caller instead of growing memory forever.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db: AsyncDatabase, insert_sql: str, batch_size: int = 500, flush_interval: float = 5.0,
+                 max_pending: int = 10000):
+        self.logger = logging.getLogger(__name__)
+        self.database: AsyncDatabase = db
+        self.insert_sql: str = insert_sql
+        self.batch_size: int = batch_size
+        self.flush_interval: float = flush_interval
+
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._task: tp.Optional[asyncio.Task] = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def put(self, row: tp.Sequence):
+        await self._queue.put(row)
+
+    async def close(self):
+        """
+        Write out whatever is still buffered and stop the background writer.
+        """
+        if self._task is None:
+            return
+        await self._queue.put(self._STOP)
+        await self._task
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        stopping: bool = False
+
+        while not stopping:
+            first_row = await self._queue.get()
+            if first_row is self._STOP:
+                break
+
+            batch: tp.List[tp.Sequence] = [first_row]
+            deadline: float = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                # Take whatever is already waiting without going back to sleep.
+                if self._queue.empty():
+                    timeout: float = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self._queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    row = self._queue.get_nowait()
+
+                if row is self._STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+
+            await self._write(batch)
+
+    async def _write(self, batch: tp.List[tp.Sequence]):
+        try:
+            await self.database.execute_many(self.insert_sql, batch)
+            self.logger.debug('Wrote %d buffered rows.', len(batch))
+        except Exception as e:
+            self.logger.error(f'Could not write {len(batch)} buffered rows, dropping them. Error: {e}')
@@ -0,0 +1,229 @@
+import bisect
+import functools
+import math
+import os
+import threading
+import time
+import typing as tp
+
+# Pure python and cheap to import so the database and cache modules can record metrics without pulling anything in.
+
+T = tp.TypeVar('T')
+
+LabelValues = tp.Tuple[str, ...]
+
+# Seconds. Covers everything from a cache hit to a slow Spotify request.
+DEFAULT_BUCKETS: tp.Tuple[float, ...] = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0,
+                                         2.5, 5.0, 10.0)
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value))
+
+
+def _format_labels(label_names: tp.Sequence[str], label_values: tp.Sequence[str]) -> str:
+    if len(label_names) <= 0:
+        return ''
+    escaped: tp.List[str] = [str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                             for value in label_values]
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(label_names, escaped)) + '}'
+
+
+class Metric:
+    metric_type: str = 'untyped'
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, documentation: str,
+                 label_names: tp.Sequence[str] = ()):
+        self.registry: MetricsRegistry = registry
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: tp.Tuple[str, ...] = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def render(self) -> tp.List[str]:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+
+
+class Counter(Metric):
+    metric_type: str = 'counter'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Key: label values, Value: running total.
+        self._values: tp.Dict[LabelValues, float] = dict()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def get(self, *label_values: str) -> float:
+        with self._lock:
+            return self._values.get(label_values, 0.0)
+
+    def render(self) -> tp.List[str]:
+        lines: tp.List[str] = super().render()
+        with self._lock:
+            values: tp.List[tp.Tuple[LabelValues, float]] = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Gauge(Metric):
+    metric_type: str = 'gauge'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: tp.Dict[LabelValues, float] = dict()
+
+    def set(self, value: float, *label_values: str):
+        if not self.registry.enabled:
+            return
+        with self._lock:
+            self._values[label_values] = value
+
+    def render(self) -> tp.List[str]:
+        lines: tp.List[str] = super().render()
+        with self._lock:
+            values: tp.List[tp.Tuple[LabelValues, float]] = sorted(self._values.items())
+        for label_values, value in values:
+            lines.append(f'{self.name}{_format_labels(self.label_names, label_values)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(Metric):
+    metric_type: str = 'histogram'
+
+    def __init__(self, *args, buckets: tp.Sequence[float] = DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets: tp.Tuple[float, ...] = tuple(sorted(buckets))
+        # Key: label values, Value: ([count per bucket, the last one being +Inf], sum of every observation).
+        # Counts aren't cumulative until they get rendered.
+        self._values: tp.Dict[LabelValues, tp.Tuple[tp.List[int], float]] = dict()
+
+    def observe(self, value: float, *label_values: str):
+        if not self.registry.enabled:
+            return
+        bucket_index: int = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.get(label_values) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bucket_index] += 1
+            self._values[label_values] = (counts, total + value)
+
+    def count(self, *label_values: str) -> int:
+        with self._lock:
+            entry = self._values.get(label_values)
+            return sum(entry[0]) if entry is not None else 0
+
+    def time(self, *label_values: str) -> tp.ContextManager:
+        return _Timer(self, label_values)
+
+    def render(self) -> tp.List[str]:
+        lines: tp.List[str] = super().render()
+        with self._lock:
+            values = sorted((label_values, (list(counts), total)) for label_values, (counts, total) in self._values.items())
+
+        label_names: tp.Tuple[str, ...] = self.label_names + ('le',)
+        for label_values, (counts, total) in values:
+            cumulative: int = 0
+            for upper_bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels: str = _format_labels(label_names, label_values + (_format_value(upper_bound),))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels: str = _format_labels(self.label_names, label_values)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, label_values: LabelValues):
+        self.histogram: Histogram = histogram
+        self.label_values: LabelValues = label_values
+        self._start: float = 0.0
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self._start, *self.label_values)
+
+
+class MetricsRegistry:
+    """
+    Holds every metric in the process and renders them in the Prometheus text format.
+    When disabled, recording anything is a single attribute check, and timed() doesn't wrap functions at all.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled: bool = enabled
+        # Key: metric name, Value: the metric. Asking for the same name twice gives back the same metric.
+        self._metrics: tp.Dict[str, Metric] = dict()
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class: tp.Type[Metric], name: str, documentation: str,
+                       label_names: tp.Sequence[str], **kwargs) -> tp.Any:
+        with self._lock:
+            metric: tp.Optional[Metric] = self._metrics.get(name)
+            if metric is None:
+                metric = metric_class(self, name, documentation, label_names, **kwargs)
+                self._metrics[name] = metric
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f'Metric {name} is already registered as a {metric.metric_type}.')
+            return metric
+
+    def counter(self, name: str, documentation: str, label_names: tp.Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, label_names)
+
+    def gauge(self, name: str, documentation: str, label_names: tp.Sequence[str] = ()) -> Gauge:
+        return self._get_or_create(Gauge, name, documentation, label_names)
+
+    def histogram(self, name: str, documentation: str, label_names: tp.Sequence[str] = (),
+                  buckets: tp.Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, label_names, buckets=buckets)
+
+    def timed(self, histogram: Histogram, label_value: tp.Optional[str] = None) \
+            -> tp.Callable[[tp.Callable[..., T]], tp.Callable[..., T]]:
+        """
+        Decorator that records how long every call takes in histogram, labelled with the function name.
+        Whether metrics are enabled is checked once, when the function gets decorated.
+        :param label_value: (Optional) Label to use instead of the function name.
+        """
+
+        def decorator(func: tp.Callable[..., T]) -> tp.Callable[..., T]:
+            if not self.enabled:
+                return func
+            label: str = label_value if label_value is not None else func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs) -> T:
+                start: float = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - start, label)
+
+            return wrapper
+
+        return decorator
+
+    def render(self) -> str:
+        with self._lock:
+            metrics: tp.List[Metric] = sorted(self._metrics.values(), key=lambda metric: metric.name)
+        lines: tp.List[str] = list()
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+def _enabled_from_env() -> bool:
+    return os.getenv('CORGI_METRICS', '0').lower() in ('1', 'true', 'yes')
+
+
+# The registry the whole bot records into. Set CORGI_METRICS=1 before anything imports corgi_bot to turn it on.
+REGISTRY: MetricsRegistry = MetricsRegistry(enabled=_enabled_from_env())
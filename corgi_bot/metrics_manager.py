@@ -0,0 +1,98 @@
+import asyncio
+import io
+import logging
+import time
+import typing as tp
+
+import discord
+from discord.ext import commands, tasks
+
+from corgi_bot.metrics import REGISTRY
+
+COMMAND_SECONDS = REGISTRY.histogram('corgi_command_seconds', 'Time from a command being invoked to it finishing.',
+                                     ('command',))
+COMMANDS = REGISTRY.counter('corgi_commands_total', 'Commands run by command and outcome.', ('command', 'outcome'))
+EVENT_LOOP_LAG_SECONDS = REGISTRY.histogram('corgi_event_loop_lag_seconds',
+                                            'How long a task that is ready to run waits for the event loop.')
+
+
+class MetricsManager(commands.Cog, name='Metrics Manager'):
+    """
+    Times every command, samples event loop lag, and serves the metrics registry with $metrics.
+    Everything here is a no-op unless CORGI_METRICS is set.
+    """
+
+    # How often to check how far behind the event loop is, in seconds.
+    LAG_SAMPLE_INTERVAL: float = 1.0
+
+    def __init__(self, bot: commands.Bot):
+        self.logger = logging.getLogger(__name__)
+        self.bot = bot
+        # Key: id of the message that invoked the command, Value: perf_counter when the command started.
+        self._command_started: tp.Dict[int, float] = dict()
+
+    async def cog_load(self):
+        if REGISTRY.enabled:
+            self.sample_event_loop_lag.start()
+
+    async def cog_unload(self):
+        self.sample_event_loop_lag.cancel()
+
+    @tasks.loop(seconds=LAG_SAMPLE_INTERVAL)
+    async def sample_event_loop_lag(self):
+        # Yielding puts us at the back of the ready queue, so the time until we run again is how long everything
+        # else that was ready took.
+        start: float = time.perf_counter()
+        await asyncio.sleep(0)
+        EVENT_LOOP_LAG_SECONDS.observe(time.perf_counter() - start)
+
+    def _finish_command(self, context: commands.Context, outcome: str):
+        start: tp.Optional[float] = self._command_started.pop(context.message.id, None)
+        command_name: str = context.command.qualified_name if context.command is not None else 'unknown'
+        if start is not None:
+            COMMAND_SECONDS.observe(time.perf_counter() - start, command_name)
+        COMMANDS.inc(command_name, outcome)
+
+    @commands.Cog.listener('on_command')
+    async def on_command(self, context: commands.Context):
+        if REGISTRY.enabled:
+            self._command_started[context.message.id] = time.perf_counter()
+
+    @commands.Cog.listener('on_command_completion')
+    async def on_command_completion(self, context: commands.Context):
+        if REGISTRY.enabled:
+            self._finish_command(context, 'ok')
+
+    @commands.Cog.listener('on_command_error')
+    async def on_command_error(self, context: commands.Context, error: commands.CommandError):
+        if REGISTRY.enabled:
+            self._finish_command(context, 'error')
+
+        # discord.py only prints unhandled command errors when nothing listens for on_command_error,
+        # so log them here instead of losing them.
+        if context.command is not None and context.command.has_error_handler():
+            return
+        if context.cog is not None and context.cog.has_error_handler():
+            return
+        if isinstance(error, commands.CheckFailure):
+            # Someone used a command they aren't allowed to, or too often. Not our bug.
+            self.logger.debug('Check failed for command %s: %s', context.command, error)
+            return
+        self.logger.error(f'Ignoring exception in command {context.command}', exc_info=error)
+
+    @commands.command(name='metrics')
+    @commands.is_owner()
+    async def metrics(self, context: commands.Context):
+        """
+        Get the bot's metrics in the Prometheus text format. (Bot owner only)
+        """
+        if not REGISTRY.enabled:
+            await context.send('I\'M NOT COUNTING ANYTHING RIGHT NOW! Start me with CORGI_METRICS=1 to turn metrics on.')
+            return
+
+        rendered: bytes = REGISTRY.render().encode('utf-8')
+        await context.send(file=discord.File(io.BytesIO(rendered), filename='metrics.txt'))
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(MetricsManager(bot))
@@ -0,0 +1,260 @@
+import logging
+import sqlite3
+import typing as tp
+
+logger = logging.getLogger(__name__)
+
+Migration = tp.Callable[[sqlite3.Connection], None]
+
+
+def _create_legacy_tables(connection: sqlite3.Connection):
+    # The original untyped schema. Existing corgi.db files already have these tables at user_version 0.
+    connection.execute('CREATE TABLE IF NOT EXISTS quotes (quote TEXT, author TEXT, time TEXT, server_id TEXT);')
+    connection.execute(
+        'CREATE TABLE IF NOT EXISTS relations (user_id TEXT, affection NUM, last_update TEXT, server_id TEXT);')
+
+
+def _add_keys_and_indexes(connection: sqlite3.Connection):
+    connection.execute('''
+        CREATE TABLE quotes_new (
+            id INTEGER PRIMARY KEY,
+            quote TEXT NOT NULL,
+            author TEXT,
+            time REAL NOT NULL,
+            server_id INTEGER NOT NULL
+        );''')
+    connection.execute('''
+        INSERT INTO quotes_new (quote, author, time, server_id)
+        SELECT quote, author, CAST(time AS REAL), CAST(server_id AS INTEGER) FROM quotes
+        WHERE quote IS NOT NULL AND server_id IS NOT NULL
+        ORDER BY rowid;''')
+    connection.execute('DROP TABLE quotes;')
+    connection.execute('ALTER TABLE quotes_new RENAME TO quotes;')
+    connection.execute('CREATE INDEX quotes_server ON quotes (server_id);')
+
+    connection.execute('''
+        CREATE TABLE relations_new (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            server_id INTEGER NOT NULL,
+            affection INTEGER NOT NULL DEFAULT 0,
+            last_update REAL,
+            UNIQUE (server_id, user_id)
+        );''')
+    # last_update used to be a datetime string, so turn it into a unix timestamp. Duplicate rows get merged.
+    connection.execute('''
+        INSERT INTO relations_new (user_id, server_id, affection, last_update)
+        SELECT CAST(user_id AS INTEGER), CAST(server_id AS INTEGER), CAST(TOTAL(affection) AS INTEGER),
+               MAX((julianday(last_update) - 2440587.5) * 86400.0)
+        FROM relations
+        WHERE user_id IS NOT NULL AND server_id IS NOT NULL
+        GROUP BY CAST(server_id AS INTEGER), CAST(user_id AS INTEGER);''')
+    connection.execute('DROP TABLE relations;')
+    connection.execute('ALTER TABLE relations_new RENAME TO relations;')
+    connection.execute('CREATE INDEX relations_server_affection ON relations (server_id, affection DESC);')
+
+
+def _add_playlist_track_index(connection: sqlite3.Connection):
+    connection.execute('''
+        CREATE TABLE playlist_tracks (
+            playlist_id TEXT NOT NULL,
+            track_id TEXT NOT NULL,
+            PRIMARY KEY (playlist_id, track_id)
+        ) WITHOUT ROWID;''')
+
+
+def _add_playlists(connection: sqlite3.Connection):
+    connection.execute('''
+        CREATE TABLE playlists (
+            channel_id INTEGER PRIMARY KEY,
+            server_id INTEGER NOT NULL,
+            playlist_id TEXT NOT NULL
+        );''')
+    connection.execute('CREATE INDEX playlists_server ON playlists (server_id);')
+
+
+def _add_messages(connection: sqlite3.Connection):
+    # DataManager used to insert into this table without ever creating it, so it might already be there.
+    connection.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            message_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            server_id INTEGER NOT NULL,
+            sent_time REAL NOT NULL
+        );''')
+    connection.execute('CREATE INDEX IF NOT EXISTS messages_server_time ON messages (server_id, sent_time);')
+    connection.execute('CREATE INDEX IF NOT EXISTS messages_server_user ON messages (server_id, user_id);')
+
+
+def _add_message_rollups(connection: sqlite3.Connection):
+    # Hourly message counts per user. hour is the number of whole hours since the unix epoch (UTC).
+    connection.execute('''
+        CREATE TABLE message_counts_hourly (
+            server_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, hour, user_id)
+        ) WITHOUT ROWID;''')
+    connection.execute('''
+        INSERT INTO message_counts_hourly (server_id, hour, user_id, count)
+        SELECT server_id, CAST(sent_time / 3600 AS INTEGER), user_id, COUNT(*) FROM messages
+        GROUP BY server_id, CAST(sent_time / 3600 AS INTEGER), user_id;''')
+    # Keep the rollup in step with every insert, inside the same transaction.
+    connection.execute('''
+        CREATE TRIGGER messages_count_hourly AFTER INSERT ON messages BEGIN
+            INSERT INTO message_counts_hourly (server_id, hour, user_id, count)
+            VALUES (new.server_id, CAST(new.sent_time / 3600 AS INTEGER), new.user_id, 1)
+            ON CONFLICT (server_id, hour, user_id) DO UPDATE SET count = count + 1;
+        END;''')
+
+
+def _add_server_opt_ins(connection: sqlite3.Connection):
+    connection.execute('CREATE TABLE server_opt_ins (server_id INTEGER PRIMARY KEY);')
+
+
+def _add_quote_search(connection: sqlite3.Connection):
+    # External content FTS5 index over quotes, so the text isn't stored twice. The triggers keep it in sync.
+    connection.execute('''
+        CREATE VIRTUAL TABLE quotes_fts USING fts5(
+            quote, author,
+            content = 'quotes', content_rowid = 'id',
+            tokenize = 'unicode61 remove_diacritics 2'
+        );''')
+    connection.execute('''
+        CREATE TRIGGER quotes_fts_insert AFTER INSERT ON quotes BEGIN
+            INSERT INTO quotes_fts (rowid, quote, author) VALUES (new.id, new.quote, new.author);
+        END;''')
+    connection.execute('''
+        CREATE TRIGGER quotes_fts_delete AFTER DELETE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, quote, author) VALUES ('delete', old.id, old.quote, old.author);
+        END;''')
+    connection.execute('''
+        CREATE TRIGGER quotes_fts_update AFTER UPDATE ON quotes BEGIN
+            INSERT INTO quotes_fts (quotes_fts, rowid, quote, author) VALUES ('delete', old.id, old.quote, old.author);
+            INSERT INTO quotes_fts (rowid, quote, author) VALUES (new.id, new.quote, new.author);
+        END;''')
+    # Index every quote that was stored before this migration.
+    connection.execute("INSERT INTO quotes_fts (quotes_fts) VALUES ('rebuild');")
+
+
+def _add_playlist_reconcile_times(connection: sqlite3.Connection):
+    # When each playlist's track index was last checked against Spotify, so restarts don't check them all again.
+    connection.execute('''
+        CREATE TABLE playlist_reconciles (
+            playlist_id TEXT PRIMARY KEY,
+            reconciled_time REAL NOT NULL
+        ) WITHOUT ROWID;''')
+
+
+def _split_message_rollups(connection: sqlite3.Connection):
+    # Hourly counts per user barely shrank the messages table, since few people post more than once an hour.
+    # Each query gets a rollup without the detail it doesn't need instead:
+    # - message_counts_hourly: per server per hour, for the hour of day and day of week histograms.
+    # - message_counts_daily: per server per user per day, for windowed top posters and a user's own stats.
+    # - message_counts_total: per server per user running totals, for all time top posters and counts.
+    # hour and day count whole hours and days since the unix epoch (UTC).
+    connection.execute('DROP TRIGGER messages_count_hourly;')
+    connection.execute('DROP TABLE message_counts_hourly;')
+    connection.execute('''
+        CREATE TABLE message_counts_hourly (
+            server_id INTEGER NOT NULL,
+            hour INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, hour)
+        ) WITHOUT ROWID;''')
+    connection.execute('''
+        CREATE TABLE message_counts_daily (
+            server_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, day, user_id)
+        ) WITHOUT ROWID;''')
+    # A user's own stats read all of their days without going through everyone else's. count is in it so the
+    # index covers those queries, otherwise the planner prefers scanning the server's days.
+    connection.execute('CREATE INDEX message_counts_daily_user ON message_counts_daily (server_id, user_id, day, count);')
+    connection.execute('''
+        CREATE TABLE message_counts_total (
+            server_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (server_id, user_id)
+        ) WITHOUT ROWID;''')
+
+    connection.execute('''
+        INSERT INTO message_counts_hourly (server_id, hour, count)
+        SELECT server_id, CAST(sent_time / 3600 AS INTEGER), COUNT(*) FROM messages
+        GROUP BY server_id, CAST(sent_time / 3600 AS INTEGER);''')
+    connection.execute('''
+        INSERT INTO message_counts_daily (server_id, day, user_id, count)
+        SELECT server_id, CAST(sent_time / 86400 AS INTEGER), user_id, COUNT(*) FROM messages
+        GROUP BY server_id, CAST(sent_time / 86400 AS INTEGER), user_id;''')
+    connection.execute('''
+        INSERT INTO message_counts_total (server_id, user_id, count)
+        SELECT server_id, user_id, COUNT(*) FROM messages GROUP BY server_id, user_id;''')
+
+    # Keep every rollup in step with every insert, inside the same transaction.
+    connection.execute('''
+        CREATE TRIGGER messages_rollups AFTER INSERT ON messages BEGIN
+            INSERT INTO message_counts_hourly (server_id, hour, count)
+            VALUES (new.server_id, CAST(new.sent_time / 3600 AS INTEGER), 1)
+            ON CONFLICT (server_id, hour) DO UPDATE SET count = count + 1;
+            INSERT INTO message_counts_daily (server_id, day, user_id, count)
+            VALUES (new.server_id, CAST(new.sent_time / 86400 AS INTEGER), new.user_id, 1)
+            ON CONFLICT (server_id, day, user_id) DO UPDATE SET count = count + 1;
+            INSERT INTO message_counts_total (server_id, user_id, count)
+            VALUES (new.server_id, new.user_id, 1)
+            ON CONFLICT (server_id, user_id) DO UPDATE SET count = count + 1;
+        END;''')
+
+
+# Only ever append to this list. A migration's position in it is the user_version it brings the database to.
+MIGRATIONS: tp.List[Migration] = [
+    _create_legacy_tables,
+    _add_keys_and_indexes,
+    _add_playlist_track_index,
+    _add_playlists,
+    _add_messages,
+    _add_message_rollups,
+    _add_server_opt_ins,
+    _add_quote_search,
+    _add_playlist_reconcile_times,
+    _split_message_rollups,
+]
+
+
+def get_version(connection: sqlite3.Connection) -> int:
+    return connection.execute('PRAGMA user_version;').fetchone()[0]
+
+
+def migrate(connection: sqlite3.Connection, migrations: tp.Sequence[Migration] = MIGRATIONS) -> int:
+    """
+    Bring the database up to the latest schema. Each migration runs in its own transaction.
+    :return: The schema version the database ended up at.
+    """
+    version: int = get_version(connection)
+
+    while version < len(migrations):
+        new_version: int = version + 1
+        migration: Migration = migrations[version]
+        # Take the write lock up front and check the version again, in case another shard process
+        # started at the same time and already ran this migration.
+        connection.execute('BEGIN IMMEDIATE;')
+        if get_version(connection) != version:
+            connection.rollback()
+            version = get_version(connection)
+            continue
+
+        logger.info(f'Migrating database to schema version {new_version} ({migration.__name__})...')
+        try:
+            migration(connection)
+            connection.execute(f'PRAGMA user_version = {new_version};')
+            connection.commit()
+        except sqlite3.Error:
+            connection.rollback()
+            logger.exception(f'Could not migrate database to schema version {new_version}!')
+            raise
+        version = new_version
+
+    return version
@@ -1,5 +1,7 @@
+import asyncio
 import json
 import logging
+import math
 import os
 import pickle
 import re
@@ -7,18 +9,55 @@ import typing
 
 import discord
 import spotipy as sp
-from discord.ext import commands
+from discord.ext import commands, tasks
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.spotify_pipeline import SpotifyPipeline
+from corgi_bot.track_index import TrackIndex
+from corgi_bot.utils import get_db_directory
+
+
+SPOTIFY_LINK_HOST: str = 'open.spotify.com'
+SPOTIFY_LINK_REGEX: re.Pattern = re.compile(
+    r'https://open\.spotify\.com/(?P<link_type>track|album|playlist)/(?P<id>[0-9A-Za-z]+)(?:\?.+)?')
+
+
+class AddTracksError(Exception):
+    def __init__(self, n_tracks_added: int, error: Exception):
+        super().__init__(f'Added {n_tracks_added} tracks before failing: {error}')
+        self.n_tracks_added: int = n_tracks_added
+        self.error: Exception = error
 
 
 class PlaylistManager(commands.Cog, name='Playlist Manager'):
-    def __init__(self, bot: commands.Bot):
+    # Every playlist's track index gets checked against Spotify once every RECONCILE_MAX_AGE seconds. The checks are
+    # spread over the reconcile runs in between, so neither a restart nor a lot of servers cause a burst of requests.
+    RECONCILE_INTERVAL_MINUTES: float = 15.0
+    RECONCILE_MAX_AGE: float = 6 * 60 * 60
+
+    def __init__(self, bot: commands.Bot, db: AsyncDatabase,
+                 spotify_credentials_path: str = os.path.join('assets', 'spotify_credentials.json')):
+        """
+        :param spotify_credentials_path: (Optional) JSON file with the Spotify app credentials and the user_id
+        that owns the playlists. The cog does nothing without it.
+        """
         self.bot = bot
-        self.logger = logging.getLogger('discord')
+        self.logger = logging.getLogger(__name__)
+        self.database: AsyncDatabase = db
+        self.track_index: TrackIndex = TrackIndex(db.database)
         scopes: typing.List[str] = ['playlist-modify-public']
 
-        spotify_credentials_path: str = os.path.join('assets', 'spotify_credentials.json')
         self.saved_playlist_path: str = os.path.join('assets', 'playlist_id.json')
 
+        # Key: channel id, Value: id of the playlist that channel's songs go into.
+        # Messages in any other channel are ignored before doing any work.
+        self.channel_playlists: typing.Dict[int, str] = dict()
+        # Key: server id, Value: ids of the channels in that server that have a playlist.
+        self.server_channels: typing.Dict[int, typing.List[int]] = dict()
+        # Key: playlist id, Value: lock held while checking for duplicates through to saving what was added, so two
+        # messages can't both add the same track and reconciling can't overwrite tracks that were just added.
+        self._playlist_locks: typing.Dict[str, asyncio.Lock] = dict()
+
         if not os.path.exists(spotify_credentials_path):
             self.logger.error(f'Cannot find Spotify Credentials at path: "{spotify_credentials_path}"')
             self.can_work: bool = False
@@ -26,15 +65,6 @@ class PlaylistManager(commands.Cog, name='Playlist Manager'):
 
         self.can_work: bool = True
 
-        self.music_channel: typing.Optional[discord.abc.GuildChannel] = None
-        self.id_of_playlist_to_create: str = ''
-
-        self.is_enabled: bool = self.music_channel is not None and len(self.id_of_playlist_to_create) > 0
-
-        if not self.is_enabled and os.path.exists(self.saved_playlist_path):
-            self.logger.error(
-                f'There was a problem loading the previous playlist data from file! Disabling playlist manager.')
-
         with open(spotify_credentials_path, 'r') as f:
             credentials: typing.Dict[str, str] = json.load(f)
 
@@ -45,91 +75,164 @@ class PlaylistManager(commands.Cog, name='Playlist Manager'):
                                                      redirect_uri=credentials['redirect_url'],
                                                      scope=','.join(scopes))
             self.spotify_client = sp.Spotify(auth_manager=oauth)
+            self.spotify: SpotifyPipeline = SpotifyPipeline(self.spotify_client,
+                                                            cache_path=get_db_directory() / 'spotify_cache.json')
 
-    async def setup_music_channel(self):
-        self.logger.info(f'Setting up music channel!')
-        with open(self.saved_playlist_path, 'rb') as f:
-            data: typing.Dict[str, str] = pickle.load(f)
-            self.id_of_playlist_to_create = data['playlist_id']
+    async def cog_load(self):
+        if not self.can_work:
+            return
 
+        for channel_id, server_id, playlist_id in await self.database.get_playlists():
+            self._route_channel(channel_id, server_id, playlist_id)
+
+        if os.path.exists(self.saved_playlist_path):
+            await self.import_saved_playlist()
+
+        self.logger.info(f'Loaded {len(self.channel_playlists)} playlist channels.')
+        self.reconcile_track_index.start()
+
+    async def cog_unload(self):
+        self.reconcile_track_index.cancel()
+        if self.can_work:
+            self.spotify.close()
+
+    def _route_channel(self, channel_id: int, server_id: int, playlist_id: str):
+        if channel_id not in self.channel_playlists:
+            self.server_channels.setdefault(server_id, []).append(channel_id)
+        self.channel_playlists[channel_id] = playlist_id
+
+    def _get_playlist_lock(self, playlist_id: str) -> asyncio.Lock:
+        return self._playlist_locks.setdefault(playlist_id, asyncio.Lock())
+
+    def get_server_playlist(self, server_id: int, channel_id: int) -> typing.Optional[str]:
+        """
+        :return: The playlist for the channel, or failing that the first playlist set up in the server.
+        """
+        playlist_id: typing.Optional[str] = self.channel_playlists.get(channel_id)
+        if playlist_id is None and len(self.server_channels.get(server_id, [])) > 0:
+            playlist_id = self.channel_playlists[self.server_channels[server_id][0]]
+        return playlist_id
+
+    async def import_saved_playlist(self):
+        """
+        Move the single playlist from the old pickle file into the database. This only has to happen once.
+        """
+        try:
+            with open(self.saved_playlist_path, 'rb') as f:
+                data: typing.Dict[str, str] = pickle.load(f)
+            playlist_id: str = data['playlist_id']
             music_channel_id: int = int(data['music_channel_id'])
-            self.music_channel = await self.bot.fetch_channel(music_channel_id)
-        self.is_enabled: bool = True
-
-    @commands.Cog.listener()
-    async def on_message(self, message: discord.Message):
-        if os.path.exists(self.saved_playlist_path) and not self.is_enabled:
-            await self.setup_music_channel()
 
-        if not self.can_work or not self.is_enabled or message.author.bot:
+            if music_channel_id not in self.channel_playlists:
+                # The pickle never stored the server so ask Discord for it this one time.
+                music_channel: discord.abc.GuildChannel = await self.bot.fetch_channel(music_channel_id)
+                await self.database.add_playlist(music_channel_id, music_channel.guild.id, playlist_id)
+                self._route_channel(music_channel_id, music_channel.guild.id, playlist_id)
+        except (OSError, pickle.UnpicklingError, KeyError, ValueError, discord.HTTPException) as e:
+            self.logger.error(f'There was a problem importing the previous playlist data from file! Error: {e}')
             return
 
-        if len(self.id_of_playlist_to_create) <= 0:
-            return
+        os.replace(self.saved_playlist_path, self.saved_playlist_path + '.imported')
+        self.logger.info(f'Imported playlist {playlist_id} for channel {music_channel_id} into the database.')
+
+    @tasks.loop(minutes=RECONCILE_INTERVAL_MINUTES)
+    async def reconcile_track_index(self):
+        """
+        Every so often, make sure the local track index still matches the playlists on Spotify
+        in case someone edited a playlist by hand. Only the playlists that haven't been checked in a while are.
+        """
+        playlist_ids: typing.Set[str] = set(self.channel_playlists.values())
+        # Enough per run to get through every playlist within RECONCILE_MAX_AGE.
+        per_run: int = math.ceil(len(playlist_ids) * self.RECONCILE_INTERVAL_MINUTES * 60 / self.RECONCILE_MAX_AGE)
+        stale_playlist_ids: typing.List[str] = await self.database.run_read(
+            self.track_index.get_stale_playlists, playlist_ids, self.RECONCILE_MAX_AGE, per_run)
+
+        async def reconcile(playlist_id: str):
+            # Hold off adding tracks until the index is replaced, or the listing would already be out of date.
+            async with self._get_playlist_lock(playlist_id):
+                try:
+                    track_ids: typing.List[str] = await self.spotify.get_playlist_track_ids(playlist_id,
+                                                                                            use_cache=False)
+                except sp.SpotifyException as e:
+                    self.logger.error(f'Could not reconcile the track index for {playlist_id} with Spotify. Error: {e}')
+                    return
+                await self.database.run_write(self.track_index.replace, playlist_id, track_ids)
+
+        await asyncio.gather(*[reconcile(playlist_id) for playlist_id in stale_playlist_ids])
+
+    @reconcile_track_index.before_loop
+    async def before_reconcile_track_index(self):
+        await self.bot.wait_until_ready()
 
-        if message.channel.id != self.music_channel.id:
+    @commands.Cog.listener()
+    async def on_message(self, message: discord.Message):
+        # This runs for every message the bot sees so bail out as cheaply as possible.
+        playlist_id: typing.Optional[str] = self.channel_playlists.get(message.channel.id)
+        if playlist_id is None or message.author.bot:
             return
 
-        spotify_regex: re.Pattern = re.compile(
-            r'https://open.spotify.com/(?P<link_type>track|album|playlist)/(?P<id>[0-9A-Za-z]+)(?:\?.+)?')
-
-        # Key: type of link, Value: list of ids
-        found_matches: typing.Dict[str, typing.List[str]] = dict()
-
-        found_matches['track'] = []
-        found_matches['album'] = []
-        found_matches['playlist'] = []
-
-        for match in spotify_regex.finditer(message.content):
-            if match is None or not match:
-                continue
-
-            found_matches[match['link_type']].append(match['id'])
-
-        all_tracks_to_add: typing.List[str] = found_matches['track']
-
-        for album_id in found_matches['album']:
-            album_tracks: typing.List[typing.Dict] = self.spotify_client.album_tracks(album_id=album_id)['items']
-            track_ids: typing.List[str] = list(map(lambda track: track['id'], album_tracks))
-            all_tracks_to_add.extend(track_ids)
-
-        for playlist_id in found_matches['playlist']:
-            response: typing.Dict = self.spotify_client.playlist_items(playlist_id=playlist_id)
-            playlist_tracks: typing.List[typing.Dict] = response['items']
-
-            while response['next']:
-                response = self.spotify_client.next(response)
-                playlist_tracks.extend(response['items'])
-
-            track_ids: typing.List[str] = list(map(lambda track: track['track']['id'], playlist_tracks))
-            all_tracks_to_add.extend(track_ids)
+        if SPOTIFY_LINK_HOST not in message.content:
+            return
 
-        current_tracks_response: typing.Dict = self.spotify_client.playlist_items(
-            playlist_id=self.id_of_playlist_to_create)
+        # (type of link, id) in the order they were posted.
+        found_links: typing.List[typing.Tuple[str, str]] = [(match['link_type'], match['id']) for match in
+                                                            SPOTIFY_LINK_REGEX.finditer(message.content)]
 
-        current_tracks: typing.List[str] = list(map(lambda track: track['track']['id'],
-                                                    current_tracks_response['items']))
+        all_tracks_to_add: typing.List[str] = await self.spotify.resolve_links(found_links)
 
-        while current_tracks_response['next']:
-            current_tracks_response: typing.Dict = self.spotify_client.next(current_tracks_response)
-            current_tracks.extend(list(map(lambda track: track['track']['id'],
-                                           current_tracks_response['items'])))
+        async with self._get_playlist_lock(playlist_id):
+            # Make sure we're not adding duplicate tracks.
+            all_tracks_to_add = await self.database.run_read(self.track_index.filter_new, playlist_id,
+                                                             all_tracks_to_add)
 
-        # Make sure we're not adding duplicate tracks.
-        all_tracks_to_add: typing.List[str] = list(set(all_tracks_to_add) - set(current_tracks))
+            n_tracks_to_add: int = len(all_tracks_to_add)
+            if n_tracks_to_add <= 0:
+                return
 
-        n_tracks_to_add: int = len(all_tracks_to_add)
+            try:
+                n_tracks_added: int = await self.add_tracks(playlist_id, all_tracks_to_add)
+            except AddTracksError as e:
+                n_tracks_added: int = e.n_tracks_added
+                self.logger.error(
+                    f'Only added {n_tracks_added}/{n_tracks_to_add} tracks to the playlist. Error: {e.error}')
 
-        # Add tracks in batches of 100.
-        while len(all_tracks_to_add) > 0:
-            current_batch: typing.List[str] = all_tracks_to_add[:100]
-            self.spotify_client.playlist_add_items(playlist_id=self.id_of_playlist_to_create,
-                                                   items=current_batch)
-            all_tracks_to_add = list(set(all_tracks_to_add) - set(current_batch))
+        if n_tracks_added < n_tracks_to_add:
+            if n_tracks_added > 0:
+                await message.channel.send(
+                    f'I ADDED {n_tracks_added} OF {n_tracks_to_add} SONGS BEFORE SPOTIFY TOOK MY BALL AWAY :( TRY POSTING THE REST AGAIN LATER!!!')
+            return
 
-        if n_tracks_to_add > 0:
-            await message.channel.send(
-                f'I ADDED {n_tracks_to_add} SONGS TO THE SPOTIFY PLAYLIST!!!!! DO `{self.bot.command_prefix}playlist` TO GET A LINK! dO I GET TREATS NOW?????////')
+        await message.channel.send(
+            f'I ADDED {n_tracks_added} SONGS TO THE SPOTIFY PLAYLIST!!!!! DO `{self.bot.command_prefix}playlist` TO GET A LINK! dO I GET TREATS NOW?????////')
+
+    async def add_tracks(self, playlist_id: str, track_ids: typing.Sequence[str]) -> int:
+        """
+        Add tracks to the playlist in order, in the biggest batches Spotify allows. Batches have to go one at a time
+        to keep the order, so saving batch N to the track index overlaps with sending batch N + 1.
+        :return: The number of tracks that were added.
+        :raises AddTracksError: If Spotify gave up partway through, with how many tracks made it in.
+        """
+        n_tracks_added: int = 0
+        index_write: typing.Optional[asyncio.Future] = None
+
+        try:
+            for start in range(0, len(track_ids), SpotifyPipeline.MAX_BATCH_SIZE):
+                current_batch: typing.Sequence[str] = track_ids[start:start + SpotifyPipeline.MAX_BATCH_SIZE]
+                await self.spotify.add_items(playlist_id, current_batch)
+                n_tracks_added += len(current_batch)
+                self.logger.debug('Added %d/%d tracks to playlist %s.', n_tracks_added, len(track_ids), playlist_id)
+
+                if index_write is not None:
+                    await index_write
+                index_write = asyncio.ensure_future(
+                    self.database.run_write(self.track_index.add, playlist_id, current_batch))
+        except sp.SpotifyException as e:
+            raise AddTracksError(n_tracks_added, e) from e
+        finally:
+            if index_write is not None:
+                await index_write
+
+        return n_tracks_added
 
     @commands.group(name='playlist')
     async def _parent_playlist_command(self, context: commands.Context):
@@ -142,38 +245,30 @@ class PlaylistManager(commands.Cog, name='Playlist Manager'):
             await context.send(f'You bit off more than you can chew pardner...\nWANNA GRAB A BIG STICK WITH ME')
             return
 
-        if not self.is_enabled and os.path.exists(self.saved_playlist_path):
-            await self.setup_music_channel()
-
-        if self.is_enabled or not self.can_work:
+        if context.channel.id in self.channel_playlists or not self.can_work:
             await self.give_playlist_link(context, message=f'Sorry! But the Playlist Manager has already been'
                                                            ' enabled! You can find the playlist here')
             return
 
-        self.music_channel: discord.TextChannel = context.channel
-        response: typing.Dict = self.spotify_client.user_playlist_create(user=self.user_id, name=playlist_name,
-                                                                         description=f'The mega playlist for all songs from '
-                                                                                     f'" #{self.music_channel.name} in {context.guild.name}')
-        self.id_of_playlist_to_create = response['id']
-        self.is_enabled: bool = True
-
-        spotify_data: typing.Dict[str, str] = {
-            'playlist_id': self.id_of_playlist_to_create,
-            'music_channel_id': context.channel.id,
-        }
-
-        with open(self.saved_playlist_path, 'wb') as f:
-            pickle.dump(spotify_data, f)
+        response: typing.Dict = await self.spotify.create_playlist(self.user_id, playlist_name,
+                                                                   description=f'The mega playlist for all songs from '
+                                                                               f'" #{context.channel.name} in {context.guild.name}')
+        await self.database.add_playlist(context.channel.id, context.guild.id, response['id'])
+        self._route_channel(context.channel.id, context.guild.id, response['id'])
 
         await self.give_playlist_link(context, message=f'Just created that playlist for you!')
 
     @_parent_playlist_command.command(name='link')
     async def give_playlist_link(self, context: commands.Context, message: str = 'Here\'s the link!'):
-        if self.can_work and self.is_enabled:
-            playlist_link: typing.Dict[str, str] = \
-                self.spotify_client.playlist(playlist_id=self.id_of_playlist_to_create,
-                                             fields='external_urls[spotify]')['external_urls']['spotify']
+        playlist_id: typing.Optional[str] = self.get_server_playlist(context.guild.id, context.channel.id) \
+            if self.can_work else None
+        if playlist_id is not None:
+            playlist_link: str = await self.spotify.get_playlist_url(playlist_id)
             await context.send(f'{message}\n{playlist_link}')
         else:
             await context.send(f'Sorry! But the playlist manager hasn\'t been set up yet!'
                                f' Please do `{self.bot.command_prefix}playlist enable` to enable it!')
+
+
+async def setup(bot: commands.Bot):
+    await bot.add_cog(PlaylistManager(bot, bot.database, bot.config.spotify_credentials_path))
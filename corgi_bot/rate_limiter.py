@@ -0,0 +1,82 @@
+import time
+import typing as tp
+
+from discord.ext import commands
+
+from corgi_bot.cache import LRUCache
+
+RateLimitKey = tp.Tuple[int, int, str]
+
+
+class RateLimited(commands.CheckFailure):
+    def __init__(self, retry_after: float):
+        super().__init__(f'Rate limited. Try again in {retry_after:.1f}s.')
+        self.retry_after: float = retry_after
+
+
+class RateLimiter:
+    """
+    Token bucket per (guild id, user id, command name). Each bucket holds up to burst tokens and refills
+    burst tokens every per seconds. A bucket that has had time to refill completely is the same as a new one,
+    so buckets expire after that long and the least recently used ones get evicted past max_size.
+    """
+
+    def __init__(self, burst: int = 5, per: float = 15.0, max_size: int = 100000):
+        self.burst: int = burst
+        self.per: float = per
+        self.refill_rate: float = burst / per
+        # Value: (tokens left, monotonic time they were counted at, whether the user was told they're limited).
+        self.buckets: LRUCache[RateLimitKey, tp.Tuple[float, float, bool]] = LRUCache(max_size=max_size, ttl=per,
+                                                                                      name='rate_limits')
+
+    def hit(self, key: RateLimitKey) -> tp.Tuple[float, bool]:
+        """
+        Take a token from the key's bucket if there's one left.
+        :return: How many seconds until a token is available (0 if this call got one),
+                 and whether this is the first call to be turned away since the last one got through.
+        """
+        now: float = time.monotonic()
+        bucket: tp.Optional[tp.Tuple[float, float, bool]] = self.buckets.get(key)
+        if bucket is None:
+            tokens, warned = float(self.burst), False
+        else:
+            tokens = min(float(self.burst), bucket[0] + (now - bucket[1]) * self.refill_rate)
+            warned = bucket[2]
+
+        if tokens >= 1.0:
+            self.buckets.put(key, (tokens - 1.0, now, False))
+            return 0.0, False
+
+        self.buckets.put(key, (tokens, now, True))
+        return (1.0 - tokens) / self.refill_rate, not warned
+
+
+def _is_being_invoked(context: commands.Context) -> bool:
+    """
+    The help command runs every command's checks to decide what to list, with context.command swapped for the command
+    being checked. Only the name the user typed tells that apart from someone actually using the command.
+    """
+    if context.invoked_with is None:
+        return False
+    return context.invoked_with.lower() in (name.lower() for name in (context.command.name, *context.command.aliases))
+
+
+def rate_limited(limiter: RateLimiter, message: tp.Optional[str] = None):
+    """
+    Command check that turns away users once they go over limiter's rate, before the command does any work.
+    Listing the command in help doesn't use up a token.
+    :param message: (Optional) Sent the first time a user gets turned away.
+    """
+
+    async def predicate(context: commands.Context) -> bool:
+        if not _is_being_invoked(context):
+            return True
+        guild_id: int = context.guild.id if context.guild is not None else 0
+        retry_after, first_rejection = limiter.hit((guild_id, context.author.id, context.command.qualified_name))
+        if retry_after <= 0:
+            return True
+        if first_rejection and message is not None:
+            await context.send(message)
+        raise RateLimited(retry_after)
+
+    return commands.check(predicate)
@@ -0,0 +1,176 @@
+import asyncio
+import functools
+import logging
+import typing as tp
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import spotipy as sp
+
+from corgi_bot.cache import LRUCache
+from corgi_bot.metrics import REGISTRY
+
+T = tp.TypeVar('T')
+
+SPOTIFY_CALLS = REGISTRY.counter('corgi_spotify_calls_total', 'Spotify API calls by method and outcome.',
+                                 ('method', 'outcome'))
+SPOTIFY_CALL_SECONDS = REGISTRY.histogram('corgi_spotify_call_seconds', 'Time taken by each Spotify API call.',
+                                          ('method',))
+
+
+class SpotifyPipeline:
+    """
+    Runs the blocking spotipy calls on a small thread pool so they never stall the event loop,
+    and resolves several album/playlist links at the same time.
+    Responses that don't change often are cached so reposted links don't spend any API quota.
+    """
+
+    # Albums and playlist links never change. Other people's playlists do, so don't hold onto them as long.
+    ALBUM_TTL: float = 7 * 24 * 60 * 60
+    PLAYLIST_TTL: float = 15 * 60
+    PLAYLIST_URL_TTL: float = 30 * 24 * 60 * 60
+
+    # The most tracks Spotify lets us add in a single request.
+    MAX_BATCH_SIZE: int = 100
+
+    def __init__(self, spotify_client: sp.Spotify, max_concurrency: int = 4, cache_size: int = 2048,
+                 cache_path: tp.Optional[Path] = None):
+        self.logger = logging.getLogger(__name__)
+        self.spotify_client: sp.Spotify = spotify_client
+        # The pool size is what bounds how many requests we have in flight with Spotify.
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix='corgi-spotify')
+
+        self.cache_path: tp.Optional[Path] = cache_path
+        self.cache: LRUCache[str, tp.Any] = LRUCache(max_size=cache_size, name='spotify')
+        if self.cache_path is not None and self.cache_path.exists():
+            try:
+                self.cache.load(self.cache_path)
+                self.logger.info(f'Loaded {len(self.cache)} cached Spotify responses from "{self.cache_path}"')
+            except (OSError, ValueError) as e:
+                self.logger.error(f'Could not load the Spotify cache from "{self.cache_path}". Error: {e}')
+
+    async def _cached_call(self, key: str, ttl: float, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        cached: tp.Optional[T] = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        result: T = await self.call(func, *args, **kwargs)
+        self.cache.put(key, result, ttl=ttl)
+        return result
+
+    async def call(self, func: tp.Callable[..., T], *args, **kwargs) -> T:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(func, *args, **kwargs))
+
+    def _request(self, method: str, *args, **kwargs) -> tp.Any:
+        """
+        Make one Spotify API request with the client method of that name. Blocks, so run it on the thread pool.
+        Every request is counted on its own, including each extra page, so the metrics match the quota we use.
+        """
+        func: tp.Callable[..., tp.Any] = getattr(self.spotify_client, method)
+        if not REGISTRY.enabled:
+            return func(*args, **kwargs)
+
+        with SPOTIFY_CALL_SECONDS.time(method):
+            try:
+                result: tp.Any = func(*args, **kwargs)
+            except Exception:
+                SPOTIFY_CALLS.inc(method, 'error')
+                raise
+        SPOTIFY_CALLS.inc(method, 'ok')
+        return result
+
+    def _read_all_pages(self, response: tp.Dict) -> tp.List[tp.Dict]:
+        items: tp.List[tp.Dict] = list(response['items'])
+        while response['next']:
+            response = self._request('next', response)
+            items.extend(response['items'])
+        return items
+
+    def _get_album_track_ids(self, album_id: str) -> tp.List[str]:
+        album_tracks: tp.List[tp.Dict] = self._read_all_pages(self._request('album_tracks', album_id=album_id))
+        return [track['id'] for track in album_tracks if track['id']]
+
+    def _get_playlist_track_ids(self, playlist_id: str) -> tp.List[str]:
+        playlist_tracks: tp.List[tp.Dict] = self._read_all_pages(
+            self._request('playlist_items', playlist_id=playlist_id))
+        # Local files and tracks that were taken off Spotify don't have ids.
+        return [item['track']['id'] for item in playlist_tracks if item['track'] and item['track']['id']]
+
+    async def get_album_track_ids(self, album_id: str) -> tp.List[str]:
+        return await self._cached_call(f'album:{album_id}', self.ALBUM_TTL, self._get_album_track_ids, album_id)
+
+    async def get_playlist_track_ids(self, playlist_id: str, use_cache: bool = True) -> tp.List[str]:
+        if not use_cache:
+            return await self.call(self._get_playlist_track_ids, playlist_id)
+        return await self._cached_call(f'playlist:{playlist_id}', self.PLAYLIST_TTL, self._get_playlist_track_ids,
+                                       playlist_id)
+
+    async def resolve_links(self, links: tp.Sequence[tp.Tuple[str, str]]) -> tp.List[str]:
+        """
+        Expand (link type, id) pairs into track ids, keeping the order the links were posted in.
+        Links that fail to resolve are logged and skipped.
+        """
+
+        async def resolve(link_type: str, link_id: str) -> tp.List[str]:
+            if link_type == 'track':
+                return [link_id]
+            elif link_type == 'album':
+                return await self.get_album_track_ids(link_id)
+            else:
+                return await self.get_playlist_track_ids(link_id)
+
+        resolved = await asyncio.gather(*[resolve(link_type, link_id) for link_type, link_id in links],
+                                        return_exceptions=True)
+
+        track_ids: tp.List[str] = []
+        for (link_type, link_id), result in zip(links, resolved):
+            if isinstance(result, BaseException):
+                self.logger.error(f'Could not get the tracks for {link_type} {link_id}. Error: {result}')
+                continue
+            track_ids.extend(result)
+        return track_ids
+
+    async def add_items(self, playlist_id: str, track_ids: tp.Sequence[str], max_retries: int = 5):
+        """
+        Add up to MAX_BATCH_SIZE tracks, waiting out any rate limiting (HTTP 429) Spotify throws at us.
+        """
+        for attempt in range(max_retries + 1):
+            try:
+                await self.call(self._request, 'playlist_add_items', playlist_id=playlist_id, items=track_ids)
+                return
+            except sp.SpotifyException as e:
+                if e.http_status != 429 or attempt >= max_retries:
+                    raise
+
+                retry_after: float = self._get_retry_after(e, attempt)
+                self.logger.warning(f'Spotify is rate limiting us, retrying in {retry_after}s.')
+                await asyncio.sleep(retry_after)
+
+    @staticmethod
+    def _get_retry_after(error: sp.SpotifyException, attempt: int) -> float:
+        headers: tp.Dict[str, str] = error.headers or dict()
+        try:
+            return float(headers.get('Retry-After', headers.get('retry-after')))
+        except (TypeError, ValueError):
+            # No usable header so back off exponentially.
+            return float(2 ** attempt)
+
+    async def create_playlist(self, user_id: str, name: str, description: str) -> tp.Dict:
+        return await self.call(self._request, 'user_playlist_create', user=user_id, name=name,
+                               description=description)
+
+    async def get_playlist_url(self, playlist_id: str) -> str:
+        response: tp.Dict = await self._cached_call(f'playlist_url:{playlist_id}', self.PLAYLIST_URL_TTL,
+                                                    self._request, 'playlist', playlist_id=playlist_id,
+                                                    fields='external_urls[spotify]')
+        return response['external_urls']['spotify']
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self.cache_path is not None:
+            try:
+                self.cache.save(self.cache_path)
+            except (OSError, TypeError) as e:
+                self.logger.error(f'Could not save the Spotify cache to "{self.cache_path}". Error: {e}')
+        self.logger.info(f'Spotify cache hits: {self.cache.hits}, misses: {self.cache.misses}')
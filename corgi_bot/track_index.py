@@ -0,0 +1,89 @@
+import logging
+import threading
+import time
+import typing as tp
+
+from corgi_bot.database import Database
+
+
+class TrackIndex:
+    """
+    Local copy of the track ids in each managed Spotify playlist, persisted to the playlist_tracks table,
+    so finding duplicates doesn't need to download the whole playlist.
+    """
+
+    def __init__(self, db: Database):
+        self.logger = logging.getLogger(__name__)
+        self.database: Database = db
+
+        self.table_name: str = 'playlist_tracks'
+        self.playlist_column_name: str = 'playlist_id'
+        self.track_column_name: str = 'track_id'
+        self.reconciles_table_name: str = 'playlist_reconciles'
+        self.reconciled_time_column_name: str = 'reconciled_time'
+
+        # Key: playlist id, Value: ids of the tracks in it.
+        self._tracks: tp.Dict[str, tp.Set[str]] = dict()
+        self._lock = threading.Lock()
+
+    def _get_tracks(self, playlist_id: str) -> tp.Set[str]:
+        # Callers must hold the lock.
+        tracks: tp.Optional[tp.Set[str]] = self._tracks.get(playlist_id)
+        if tracks is None:
+            with self.database.get_connection() as connection:
+                rows = connection.execute(
+                    f'select {self.track_column_name} from {self.table_name} where {self.playlist_column_name} = ?',
+                    [playlist_id]).fetchall()
+            tracks = {row[0] for row in rows}
+            self._tracks[playlist_id] = tracks
+        return tracks
+
+    def filter_new(self, playlist_id: str, track_ids: tp.Iterable[str]) -> tp.List[str]:
+        """
+        :return: The track ids that aren't in the playlist yet, without duplicates and in their original order.
+        """
+        with self._lock:
+            known_tracks: tp.Set[str] = self._get_tracks(playlist_id)
+            return [track_id for track_id in dict.fromkeys(track_ids) if track_id not in known_tracks]
+
+    def add(self, playlist_id: str, track_ids: tp.Sequence[str]):
+        with self._lock:
+            with self.database.get_connection() as connection:
+                with connection:
+                    connection.executemany(
+                        f'insert or ignore into {self.table_name} ({self.playlist_column_name}, {self.track_column_name}) values (?, ?)',
+                        [(playlist_id, track_id) for track_id in track_ids])
+            self._get_tracks(playlist_id).update(track_ids)
+
+    def replace(self, playlist_id: str, track_ids: tp.Iterable[str]):
+        """
+        Reconcile the index with what's actually in the playlist on Spotify.
+        """
+        track_ids = set(track_ids)
+        with self._lock:
+            with self.database.get_connection() as connection:
+                with connection:
+                    connection.execute(f'delete from {self.table_name} where {self.playlist_column_name} = ?',
+                                       [playlist_id])
+                    connection.executemany(
+                        f'insert into {self.table_name} ({self.playlist_column_name}, {self.track_column_name}) values (?, ?)',
+                        [(playlist_id, track_id) for track_id in track_ids])
+                    connection.execute(
+                        f'insert or replace into {self.reconciles_table_name} ({self.playlist_column_name}, {self.reconciled_time_column_name}) values (?, ?)',
+                        [playlist_id, time.time()])
+            self._tracks[playlist_id] = track_ids
+        self.logger.info(f'Reconciled track index for playlist {playlist_id} ({len(track_ids)} tracks).')
+
+    def get_stale_playlists(self, playlist_ids: tp.Iterable[str], max_age: float, limit: int) -> tp.List[str]:
+        """
+        :param max_age: Seconds since a playlist was last reconciled before it needs it again.
+        :return: Up to limit of the playlists that need reconciling, ones that never have been first, then oldest first.
+        """
+        with self.database.get_connection() as connection:
+            reconciled_times: tp.Dict[str, float] = dict(connection.execute(
+                f'select {self.playlist_column_name}, {self.reconciled_time_column_name} from {self.reconciles_table_name}').fetchall())
+
+        stale_before: float = time.time() - max_age
+        stale: tp.List[str] = [playlist_id for playlist_id in playlist_ids
+                               if reconciled_times.get(playlist_id, 0.0) <= stale_before]
+        return sorted(stale, key=lambda playlist_id: reconciled_times.get(playlist_id, 0.0))[:limit]
@@ -0,0 +1,66 @@
+import asyncio
+import logging
+import typing as tp
+
+import discord
+from discord.ext import commands
+
+from corgi_bot.cache import LRUCache
+
+
+class UserResolver:
+    """
+    Turns user ids into display names. Checks the name cache and the guild's member cache first, and only fetches
+    the misses from Discord, a few at a time. Anything that can't be resolved in time falls back to the raw id.
+    """
+
+    def __init__(self, client: commands.Bot, ttl: float = 600.0, max_size: int = 10000, max_concurrency: int = 4,
+                 latency_budget: float = 3.0):
+        self.logger = logging.getLogger(__name__)
+        self.client = client
+        self.max_concurrency: int = max_concurrency
+        self.latency_budget: float = latency_budget
+
+        # Key: (guild id, user id), Value: display name
+        self.display_names: LRUCache[tp.Tuple[int, int], str] = LRUCache(max_size=max_size, ttl=ttl, name='display_names')
+
+    async def get_display_names(self, guild: discord.Guild, user_ids: tp.Iterable[int]) -> tp.Dict[int, str]:
+        user_ids = list(user_ids)
+        names: tp.Dict[int, str] = dict()
+        misses: tp.List[int] = []
+
+        for user_id in user_ids:
+            name: tp.Optional[str] = self.display_names.get((guild.id, user_id))
+            if name is None:
+                member: tp.Optional[discord.Member] = guild.get_member(user_id)
+                if member is not None:
+                    name = member.display_name
+                    self.display_names.put((guild.id, user_id), name)
+
+            if name is None:
+                misses.append(user_id)
+            else:
+                names[user_id] = name
+
+        if len(misses) > 0:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+
+            async def fetch(user_id_to_fetch: int):
+                async with semaphore:
+                    user: discord.User = await self.client.fetch_user(user_id_to_fetch)
+                names[user_id_to_fetch] = user.display_name
+                self.display_names.put((guild.id, user_id_to_fetch), user.display_name)
+
+            fetches: tp.List[asyncio.Task] = [asyncio.create_task(fetch(user_id)) for user_id in misses]
+            done, pending = await asyncio.wait(fetches, timeout=self.latency_budget)
+
+            for task in pending:
+                task.cancel()
+            if len(pending) > 0:
+                self.logger.warning(f'Gave up resolving {len(pending)} users after {self.latency_budget}s.')
+
+            for task in done:
+                if task.exception() is not None:
+                    self.logger.warning(f'Could not fetch a user. Error: {task.exception()}')
+
+        return {user_id: names.get(user_id, str(user_id)) for user_id in user_ids}
@@ -0,0 +1,26 @@
+import typing as tp
+from pathlib import Path
+
+import pytest
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.database import Database
+
+
+@pytest.fixture
+def db_path(tmp_path: Path) -> Path:
+    return tmp_path / 'corgi.db'
+
+
+@pytest.fixture
+def database(db_path: Path) -> tp.Iterator[Database]:
+    db = Database(connection_url=db_path)
+    yield db
+    db.close()
+
+
+@pytest.fixture
+def async_database(db_path: Path) -> tp.Iterator[AsyncDatabase]:
+    db = AsyncDatabase(Database(pool_size=4, connection_url=db_path))
+    yield db
+    db.close()
@@ -0,0 +1,83 @@
+import threading
+import time
+import typing as tp
+
+import spotipy as sp
+
+
+class FakeSpotify:
+    """
+    Stands in for spotipy.Spotify with just the calls SpotifyPipeline makes, keeping playlists in memory.
+    Every call sleeps for latency seconds to give other tasks a chance to interleave.
+    """
+
+    PAGE_SIZE: int = 100
+
+    def __init__(self, latency: float = 0.0):
+        self.latency: float = latency
+        # Key: playlist or album id, Value: track ids in it.
+        self.playlists: tp.Dict[str, tp.List[str]] = dict()
+        self.albums: tp.Dict[str, tp.List[str]] = dict()
+        # Key: method name, Value: how many times it was called.
+        self.calls: tp.Dict[str, int] = dict()
+        # What happens to the next playlist_add_items calls, in order. None succeeds, a status code fails with it.
+        self.add_failures: tp.List[tp.Optional[int]] = []
+        # Key: playlist id, Value: the track ids the listing being paged through started with.
+        self._listings: tp.Dict[str, tp.List[str]] = dict()
+        self._lock = threading.Lock()
+
+    def _record(self, method: str):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+        time.sleep(self.latency)
+
+    def _page(self, kind: str, owner_id: str, items: tp.List[tp.Dict], offset: int) -> tp.Dict:
+        end: int = offset + self.PAGE_SIZE
+        return {'items': items[offset:end], 'next': f'{kind}:{owner_id}:{end}' if end < len(items) else None}
+
+    def _album_page(self, album_id: str, offset: int) -> tp.Dict:
+        return self._page('album', album_id, [{'id': track_id} for track_id in self.albums[album_id]], offset)
+
+    def _playlist_page(self, playlist_id: str, offset: int) -> tp.Dict:
+        # Every page of a listing comes from the playlist as it was on the first page,
+        # so by the time the last page is read the listing can already be out of date.
+        with self._lock:
+            if offset == 0:
+                self._listings[playlist_id] = list(self.playlists.get(playlist_id, []))
+            track_ids: tp.List[str] = self._listings[playlist_id]
+        return self._page('playlist', playlist_id, [{'track': {'id': track_id}} for track_id in track_ids], offset)
+
+    def album_tracks(self, album_id: str) -> tp.Dict:
+        self._record('album_tracks')
+        return self._album_page(album_id, 0)
+
+    def playlist_items(self, playlist_id: str) -> tp.Dict:
+        self._record('playlist_items')
+        return self._playlist_page(playlist_id, 0)
+
+    def next(self, result: tp.Dict) -> tp.Dict:
+        self._record('next')
+        kind, owner_id, offset = result['next'].split(':')
+        if kind == 'album':
+            return self._album_page(owner_id, int(offset))
+        return self._playlist_page(owner_id, int(offset))
+
+    def playlist_add_items(self, playlist_id: str, items: tp.Sequence[str]):
+        self._record('playlist_add_items')
+        assert len(items) <= 100, 'Spotify only takes 100 tracks at a time.'
+        with self._lock:
+            status: tp.Optional[int] = self.add_failures.pop(0) if len(self.add_failures) > 0 else None
+            if status is not None:
+                raise sp.SpotifyException(status, -1, 'Fake failure', headers={'Retry-After': '0'})
+            self.playlists.setdefault(playlist_id, []).extend(items)
+
+    def playlist(self, playlist_id: str, fields: tp.Optional[str] = None) -> tp.Dict:
+        self._record('playlist')
+        return {'external_urls': {'spotify': f'https://open.spotify.com/playlist/{playlist_id}'}}
+
+    def user_playlist_create(self, user: str, name: str, description: str = '') -> tp.Dict:
+        self._record('user_playlist_create')
+        playlist_id: str = f'playlist{len(self.playlists)}'
+        with self._lock:
+            self.playlists[playlist_id] = []
+        return {'id': playlist_id}
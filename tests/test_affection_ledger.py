@@ -0,0 +1,106 @@
+from corgi_bot.affection_ledger import AffectionLedger
+from corgi_bot.database import Database
+
+
+def _stored_affection(database: Database, user_id: int, server_id: int):
+    with database.get_connection() as connection:
+        row = connection.execute('select affection from relations where user_id = ? and server_id = ?',
+                                 (user_id, server_id)).fetchone()
+    return row[0] if row is not None else None
+
+
+def test_ledger_sums_deltas_per_key():
+    ledger = AffectionLedger()
+    ledger.add(1, 10, 2)
+    ledger.add(1, 10, 5)
+    ledger.add(2, 10, -1)
+    ledger.add(1, 20, 3)
+
+    assert ledger.pending(1, 10) == 7
+    assert ledger.pending_for_server(10) == {1: 7, 2: -1}
+    assert ledger.drain() == {(1, 10): 7, (2, 10): -1, (1, 20): 3}
+    assert len(ledger) == 0
+
+
+def test_ledger_flushes_when_full():
+    ledger = AffectionLedger(max_pending=2, flush_interval=3600)
+    ledger.add(1, 10, 1)
+    assert not ledger.should_flush()
+    ledger.add(2, 10, 1)
+    assert ledger.should_flush()
+
+
+def test_ledger_restore_keeps_newer_deltas():
+    ledger = AffectionLedger()
+    ledger.add(1, 10, 2)
+    pending = ledger.drain()
+    ledger.add(1, 10, 3)
+    ledger.restore(pending)
+    assert ledger.pending(1, 10) == 5
+
+
+def test_reads_see_pending_deltas(database: Database):
+    database.add_affection(1, 2, server_id=10)
+    database.add_affection(1, 5, server_id=10)
+
+    assert _stored_affection(database, 1, 10) is None
+    assert database.get_affection(1, server_id=10) == 7
+    assert database.get_max_affection(server_id=10) == 7
+
+
+def test_flush_upserts_onto_stored_rows(database: Database):
+    database.add_affection(1, 2, server_id=10)
+    assert database.flush_affection() == 1
+    assert _stored_affection(database, 1, 10) == 2
+
+    database.add_affection(1, 3, server_id=10)
+    database.add_affection(2, -1, server_id=10)
+    assert database.flush_affection() == 2
+    assert database.flush_affection() == 0
+
+    assert _stored_affection(database, 1, 10) == 5
+    assert _stored_affection(database, 2, 10) == -1
+    with database.get_connection() as connection:
+        assert connection.execute('select count(*) from relations').fetchone()[0] == 2
+
+
+def test_read_through_after_leaderboard_is_cached(database: Database):
+    database.add_affection(1, 4, server_id=10)
+    database.flush_affection()
+    assert database.get_affection(1, server_id=10) == 4
+
+    database.add_affection(1, 1, server_id=10)
+    database.add_affection(2, 9, server_id=10)
+    assert database.get_affection(1, server_id=10) == 5
+    assert database.get_rank(2, server_id=10) == 1
+    assert database.get_most_loved(server_id=10, top_n=2) == [{'user_id': 2, 'affection': 9},
+                                                              {'user_id': 1, 'affection': 5}]
+
+
+def test_reset_drops_pending_deltas(database: Database):
+    database.add_affection(1, 4, server_id=10)
+    database.flush_affection()
+    database.add_affection(1, 3, server_id=10)
+    database.reset_affection(1, server_id=10)
+
+    assert database.get_affection(1, server_id=10) == 0
+    database.flush_affection()
+    assert _stored_affection(database, 1, 10) == 0
+
+
+def test_close_flushes(db_path):
+    database = Database(connection_url=db_path)
+    database.add_affection(1, 6, server_id=10)
+    database.close()
+
+    reopened = Database(connection_url=db_path)
+    try:
+        assert _stored_affection(reopened, 1, 10) == 6
+    finally:
+        reopened.close()
+
+
+def test_max_affection_of_an_empty_guild(database: Database):
+    assert database.get_max_affection(server_id=10) == 0
+    database.add_affection(1, -3, server_id=10)
+    assert database.get_max_affection(server_id=10) == -3
@@ -0,0 +1,107 @@
+import collections
+import datetime as dt
+import random
+import sqlite3
+import typing as tp
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from corgi_bot import migrations
+from corgi_bot.analytics import SECONDS_PER_DAY, SECONDS_PER_HOUR, Analytics
+from corgi_bot.database import Database
+
+SERVER_ID: int = 1
+OTHER_SERVER_ID: int = 2
+
+Message = tp.Tuple[int, int, int, float]
+
+
+def _make_messages(n_messages: int) -> tp.List[Message]:
+    rng = random.Random(0)
+    now: float = dt.datetime.now(dt.timezone.utc).timestamp()
+    return [(i, rng.choice([1, 1, 1, 2, 2, 3]), rng.choice([SERVER_ID, SERVER_ID, OTHER_SERVER_ID]),
+             now - rng.random() * 60 * SECONDS_PER_DAY) for i in range(n_messages)]
+
+
+def _insert(database: Database, messages: tp.Iterable[Message]):
+    database.execute_many('insert or ignore into messages (message_id, user_id, server_id, sent_time) values (?, ?, ?, ?)',
+                          messages)
+
+
+def _first_day(days: float) -> int:
+    return int((dt.datetime.now(dt.timezone.utc).timestamp() - days * SECONDS_PER_DAY) // SECONDS_PER_DAY)
+
+
+def _expected_counts(messages: tp.Iterable[Message], days: tp.Optional[float]) -> tp.Counter[int]:
+    first_day: int = _first_day(days) if days is not None else 0
+    return collections.Counter(user_id for _, user_id, server_id, sent_time in messages
+                               if server_id == SERVER_ID and sent_time // SECONDS_PER_DAY >= first_day)
+
+
+def _check_against_messages(analytics: Analytics, messages: tp.List[Message]):
+    for days in (7, 30, None):
+        expected: tp.Counter[int] = _expected_counts(messages, days)
+        top_posters: tp.List[tp.Tuple[int, int]] = analytics.get_top_posters(SERVER_ID, days)
+        assert dict(top_posters) == expected
+        assert [count for _, count in top_posters] == sorted(expected.values(), reverse=True)
+        assert [count for _, count in analytics.get_top_posters(SERVER_ID, days, top_n=1)] == [max(expected.values())]
+        for user_id in (1, 2, 3, 4):
+            assert analytics.get_user_message_count(SERVER_ID, user_id, days) == expected[user_id]
+
+    hours: tp.List[int] = [0] * 24
+    weekdays: tp.List[int] = [0] * 7
+    user_weekdays: tp.List[int] = [0] * 7
+    for _, user_id, server_id, sent_time in messages:
+        if server_id == SERVER_ID:
+            sent: dt.datetime = dt.datetime.fromtimestamp(sent_time, dt.timezone.utc)
+            hours[sent.hour] += 1
+            weekdays[sent.weekday()] += 1
+            if user_id == 2:
+                user_weekdays[sent.weekday()] += 1
+    assert analytics.get_hourly_histogram(SERVER_ID) == hours
+    assert analytics.get_daily_histogram(SERVER_ID) == weekdays
+    assert analytics.get_daily_histogram(SERVER_ID, user_id=2) == user_weekdays
+
+
+def test_rollups_match_the_messages(database: Database):
+    messages: tp.List[Message] = _make_messages(2000)
+    _insert(database, messages)
+    # Messages that were already stored aren't counted again.
+    _insert(database, messages[:100])
+    _check_against_messages(Analytics(database), messages)
+
+
+def test_windows(database: Database):
+    now: float = dt.datetime.now(dt.timezone.utc).timestamp()
+    _insert(database, [(1, 1, SERVER_ID, now - 2 * SECONDS_PER_HOUR), (2, 1, SERVER_ID, now - 3 * SECONDS_PER_DAY),
+                       (3, 2, SERVER_ID, now - 20 * SECONDS_PER_DAY)])
+    analytics = Analytics(database)
+
+    assert analytics.get_top_posters(SERVER_ID, days=1) == [(1, 1)]
+    assert analytics.get_top_posters(SERVER_ID, days=7) == [(1, 2)]
+    assert analytics.get_top_posters(SERVER_ID, days=30) == [(1, 2), (2, 1)]
+    assert sum(analytics.get_hourly_histogram(SERVER_ID, days=1)) == 1
+    assert sum(analytics.get_daily_histogram(SERVER_ID, days=7)) == 2
+    assert analytics.get_top_posters(OTHER_SERVER_ID) == []
+    assert analytics.get_user_message_count(SERVER_ID, 3) == 0
+
+
+def test_existing_messages_are_rolled_up(db_path: Path):
+    messages: tp.List[Message] = _make_messages(500)
+    with closing(sqlite3.connect(db_path)) as connection:
+        migrations.migrate(connection, migrations.MIGRATIONS[:-1])
+        connection.executemany('insert into messages (message_id, user_id, server_id, sent_time) values (?, ?, ?, ?)',
+                               messages)
+        connection.commit()
+
+    database = Database(connection_url=db_path)
+    try:
+        _check_against_messages(Analytics(database), messages)
+        # And the trigger keeps counting from there.
+        more_messages: tp.List[Message] = [(message_id + 500, *rest) for message_id, *rest in _make_messages(100)]
+        _insert(database, more_messages)
+        _check_against_messages(Analytics(database), messages + more_messages)
+    finally:
+        database.close()
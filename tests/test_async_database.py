@@ -0,0 +1,58 @@
+import asyncio
+import time
+import typing as tp
+
+from corgi_bot.async_database import AsyncDatabase
+
+
+async def _measure_lag(stop: asyncio.Event, interval: float = 0.001) -> tp.List[float]:
+    """
+    :return: How much later than asked for each sleep woke up, which is how long the event loop was blocked.
+    """
+    lags: tp.List[float] = []
+    while not stop.is_set():
+        start: float = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def _spam_commands(db: AsyncDatabase, n_users: int, rounds: int):
+    for round_number in range(rounds):
+        await asyncio.gather(*(db.add_affection(user_id, 1, server_id=1) for user_id in range(n_users)),
+                             *(db.get_affection(user_id, server_id=1) for user_id in range(n_users)),
+                             db.add_quote(f'bork {round_number}', 'Corgi', server_id=1),
+                             db.get_random_quote(server_id=1),
+                             db.get_most_loved(server_id=1))
+        await db.flush_affection()
+
+
+def test_concurrent_commands_do_not_block_event_loop(async_database: AsyncDatabase):
+    n_users, rounds = 50, 40
+
+    async def run() -> tp.List[float]:
+        stop = asyncio.Event()
+        lag_task = asyncio.create_task(_measure_lag(stop))
+        await _spam_commands(async_database, n_users, rounds)
+        stop.set()
+        return await lag_task
+
+    lags: tp.List[float] = asyncio.run(run())
+
+    assert len(lags) > 0
+    # Every commit fsyncs, so if any of them ran on the loop it would be stalled far longer than this.
+    assert sorted(lags)[int(len(lags) * 0.99)] < 0.1
+    assert asyncio.run(async_database.get_most_loved(server_id=1, top_n=1))[0]['affection'] == rounds
+    assert asyncio.run(async_database.get_affection(n_users - 1, server_id=1)) == rounds
+
+
+def test_writes_from_many_tasks_all_land(async_database: AsyncDatabase):
+    n_tasks = 200
+
+    async def run():
+        await asyncio.gather(*(async_database.add_quote(f'quote {i}', f'author {i}', server_id=7)
+                               for i in range(n_tasks)))
+
+    asyncio.run(run())
+    with async_database.database.get_connection() as connection:
+        assert connection.execute('select count(*) from quotes where server_id = 7').fetchone()[0] == n_tasks
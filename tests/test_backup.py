@@ -0,0 +1,127 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import typing as tp
+from contextlib import closing
+from pathlib import Path
+
+import discord
+import pytest
+from discord.ext import commands
+
+from corgi_bot import backup
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.backup_manager import BackupManager
+from corgi_bot.database import Database
+
+SERVER_ID: int = 1
+
+
+def _count(path: Path, table: str) -> int:
+    with closing(sqlite3.connect(path)) as connection:
+        return connection.execute(f'select count(*) from {table}').fetchone()[0]
+
+
+def _check(path: Path):
+    with closing(sqlite3.connect(path)) as connection:
+        assert connection.execute('PRAGMA integrity_check;').fetchone()[0] == 'ok'
+        # Raises if the search index doesn't match the quotes table.
+        connection.execute("INSERT INTO quotes_fts (quotes_fts, rank) VALUES ('integrity-check', 1);")
+
+
+def test_backup_while_writing(database: Database, db_path: Path, tmp_path: Path):
+    database.execute_many('insert into quotes (quote, author, time, server_id) values (?, ?, ?, ?)',
+                          ((f'bork number {i}', 'Alice', 1700000000.0 + i, SERVER_ID) for i in range(20000)))
+    stop = threading.Event()
+    n_written: tp.List[int] = [0]
+
+    def write():
+        while not stop.is_set():
+            database.add_quote(f'woof number {n_written[0]}', 'Bob', SERVER_ID, 1800000000.0)
+            n_written[0] += 1
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        # Small steps so the copy is still going while the writer keeps committing.
+        backup_path: Path = backup.create_backup(db_path, tmp_path / 'backups', pages=1, sleep=0.0001)
+    finally:
+        stop.set()
+        writer.join()
+
+    assert n_written[0] > 0
+    _check(backup_path)
+    # Every step copied from the same snapshot, so the search index lines up with the quotes it has.
+    n_quotes: int = _count(backup_path, 'quotes')
+    assert 20000 <= n_quotes <= 20000 + n_written[0]
+    with closing(sqlite3.connect(backup_path)) as connection:
+        assert connection.execute("select count(*) from quotes_fts where quotes_fts match 'bork'").fetchone()[0] == 20000
+
+
+def test_old_backups_are_pruned(database: Database, db_path: Path, tmp_path: Path):
+    backup_directory: Path = tmp_path / 'backups'
+    made: tp.List[Path] = [backup.create_backup(db_path, backup_directory, keep=3) for _ in range(5)]
+
+    assert backup.list_backups(backup_directory) == made[-3:]
+    assert list(backup_directory.glob('*.tmp')) == []
+
+
+def test_restore(database: Database, db_path: Path, tmp_path: Path):
+    database.add_quote('Such a good dog', 'Alice', SERVER_ID, 1700000000.0)
+    backup_path: Path = backup.create_backup(db_path, tmp_path / 'backups')
+    database.execute('delete from quotes', ())
+    database.add_quote('Bad dog', 'Bob', SERVER_ID, 1700000100.0)
+    database.close()
+
+    backup.restore_backup(backup_path, db_path)
+
+    _check(db_path)
+    restored = Database(connection_url=db_path)
+    try:
+        assert restored.search_quotes(SERVER_ID, 'good')[0][0].endswith('Alice said, "Such a good dog"')
+        assert restored.search_quotes(SERVER_ID, 'bad') == ([], False)
+    finally:
+        restored.close()
+
+
+def test_broken_backup_is_not_restored(database: Database, db_path: Path, tmp_path: Path):
+    database.add_quote('Such a good dog', 'Alice', SERVER_ID, 1700000000.0)
+    database.close()
+    broken_path: Path = tmp_path / 'broken.db'
+    broken_path.write_bytes(b'not a database' * 100)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        backup.restore_backup(broken_path, db_path)
+    with pytest.raises(FileNotFoundError):
+        backup.restore_backup(tmp_path / 'missing.db', db_path)
+    assert _count(db_path, 'quotes') == 1
+
+
+@pytest.mark.parametrize('backup_age_hours, expected_wait_hours', [(None, None), (1.0, 23.0), (30.0, 0.0)])
+def test_schedule_carries_on_from_newest_backup(async_database: AsyncDatabase, tmp_path: Path,
+                                                monkeypatch: pytest.MonkeyPatch,
+                                                backup_age_hours: tp.Optional[float],
+                                                expected_wait_hours: tp.Optional[float]):
+    backup_directory: Path = tmp_path / 'backups'
+    monkeypatch.setattr(backup, 'get_backup_directory', lambda: backup_directory)
+    if backup_age_hours is not None:
+        backup_path: Path = backup.create_backup(async_database.database.connection_url, backup_directory)
+        backup_time: float = time.time() - backup_age_hours * 60 * 60
+        os.utime(backup_path, (backup_time, backup_time))
+
+    waits: tp.List[float] = []
+
+    async def fake_sleep(delay: float):
+        waits.append(delay)
+
+    monkeypatch.setattr(asyncio, 'sleep', fake_sleep)
+    bot = commands.Bot(command_prefix='$', intents=discord.Intents.none())
+    backup_manager = BackupManager(bot, async_database, interval_hours=24.0)
+    asyncio.run(backup_manager.wait_for_next_backup())
+
+    if expected_wait_hours is None:
+        assert waits == []
+    else:
+        assert len(waits) == 1 and waits[0] / 3600 == pytest.approx(expected_wait_hours, abs=0.01)
@@ -0,0 +1,120 @@
+import json
+import types
+from pathlib import Path
+
+import pytest
+
+from corgi_bot import cache
+from corgi_bot.cache import LRUCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake_clock = FakeClock()
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=fake_clock.monotonic))
+    return fake_clock
+
+
+def test_least_recently_used_is_evicted():
+    lru: LRUCache[str, int] = LRUCache(max_size=3)
+    for key, value in (('a', 1), ('b', 2), ('c', 3)):
+        lru.put(key, value)
+    # Reading a refreshes it, so b is now the least recently used.
+    assert lru.get('a') == 1
+    lru.put('d', 4)
+
+    assert 'b' not in lru and len(lru) == 3
+    assert [lru.get(key) for key in ('a', 'c', 'd')] == [1, 3, 4]
+
+    # Overwriting refreshes too.
+    lru.put('a', 5)
+    lru.put('e', 6)
+    assert 'c' not in lru and lru.get('a') == 5
+
+
+def test_entries_expire(clock: FakeClock):
+    lru: LRUCache[str, int] = LRUCache(max_size=10, ttl=60.0)
+    lru.put('a', 1)
+    lru.put('b', 2, ttl=600.0)
+
+    clock.now += 59.0
+    assert lru.get('a') == 1
+    clock.now += 1.0
+    assert 'a' not in lru
+    assert lru.get('a', -1) == -1
+    assert lru.get('b') == 2
+    assert (lru.hits, lru.misses) == (2, 1)
+
+    # Reading an entry doesn't give it any longer to live.
+    clock.now += 540.0
+    assert lru.get('b') is None
+
+
+def test_entries_without_ttl_never_expire(clock: FakeClock):
+    lru: LRUCache[str, int] = LRUCache(max_size=10)
+    lru.put('a', 1)
+    clock.now += 10 ** 9
+    assert lru.get('a') == 1
+
+
+def test_save_and_load(clock: FakeClock, tmp_path: Path):
+    path: Path = tmp_path / 'cache.json'
+    lru: LRUCache[str, list] = LRUCache(max_size=10, ttl=60.0)
+    lru.put('expired', [1])
+    clock.now += 30.0
+    lru.put('fresh', [2])
+    lru.ttl = None
+    lru.put('no ttl', [4])
+    clock.now += 40.0
+    lru.save(path)
+
+    assert [entry[0] for entry in json.loads(path.read_text())] == ['fresh', 'no ttl']
+    assert not path.with_suffix('.json.tmp').exists()
+
+    # Time left is what carries over, so entries expire as planned even though the clock starts over on a restart.
+    clock.now = 5.0
+    loaded: LRUCache[str, list] = LRUCache(max_size=10)
+    loaded.load(path)
+    assert [loaded.get(key) for key in ('expired', 'fresh', 'no ttl')] == [None, [2], [4]]
+    clock.now += 20.0
+    assert loaded.get('fresh') is None
+    assert loaded.get('no ttl') == [4]
+
+
+def test_load_keeps_the_newest(clock: FakeClock, tmp_path: Path):
+    path: Path = tmp_path / 'cache.json'
+    lru: LRUCache[str, int] = LRUCache(max_size=10)
+    for i in range(5):
+        lru.put(str(i), i)
+    lru.save(path)
+
+    small: LRUCache[str, int] = LRUCache(max_size=2)
+    small.load(path)
+    assert len(small) == 2 and small.get('3') == 3 and small.get('4') == 4
+
+
+def test_peek_is_not_a_lookup(clock: FakeClock, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cache.REGISTRY, 'enabled', True)
+    lru: LRUCache[str, int] = LRUCache(max_size=2, ttl=60.0, name='peeked')
+    lru.put('a', 1)
+    lru.put('b', 2)
+
+    assert lru.peek('a') == 1
+    assert lru.peek('missing', 0) == 0
+    clock.now += 61.0
+    assert lru.peek('a') is None
+    assert (lru.hits, lru.misses) == (0, 0)
+    assert cache.CACHE_HITS.get('peeked') == cache.CACHE_MISSES.get('peeked') == 0
+
+    # Peeking at a didn't refresh it, so it's still the first to go.
+    clock.now -= 61.0
+    lru.put('c', 3)
+    assert 'a' not in lru and 'b' in lru
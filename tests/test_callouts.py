@@ -0,0 +1,23 @@
+import pytest
+
+from corgi_bot.callouts import match_callout
+
+
+@pytest.mark.parametrize('content, callout', [
+    ('<@1> good boy', 'good_boy'),
+    ('<@1> who is a GOOD DOG?', 'good_boy'),
+    ('<@1> bad dog!', 'bad_dog'),
+    ('<@1> want a treat?', 'treat'),
+    ('<@1> play some music', None),
+    # Earlier entries in CALLOUT_PATTERNS win no matter where they are in the message.
+    ('<@1> treat for the good boy', 'good_boy'),
+    ('<@1> no treat, bad dog', 'bad_dog'),
+])
+def test_match_callout(content: str, callout):
+    match = match_callout(content)
+    assert (match.lastgroup if match is not None else None) == callout
+
+
+def test_good_boy_question():
+    assert match_callout('<@1> good boy?').group('question') == '?'
+    assert match_callout('<@1> good boy').group('question') is None
@@ -0,0 +1,28 @@
+import pytest
+
+from corgi_bot.config import BotConfig
+
+
+def test_from_env(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('CORGI_SHARD_COUNT', '4')
+    monkeypatch.setenv('CORGI_SHARD_IDS', '2,3')
+    config: BotConfig = BotConfig.from_env()
+    assert config.shard_count == 4
+    assert config.shard_ids == [2, 3]
+
+
+def test_auto_shard_count(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('CORGI_SHARD_COUNT', 'auto')
+    assert BotConfig.from_env().shard_count == 'auto'
+
+
+@pytest.mark.parametrize('shard_count, shard_ids', [
+    ('auto', [0]),
+    (None, [0]),
+    (2, [2]),
+    (0, None),
+    ('lots', None),
+])
+def test_invalid_sharding(shard_count, shard_ids):
+    with pytest.raises(ValueError):
+        BotConfig(shard_count=shard_count, shard_ids=shard_ids)
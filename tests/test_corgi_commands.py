@@ -0,0 +1,63 @@
+import asyncio
+import random
+import types
+import typing as tp
+
+import discord
+import pytest
+from discord.ext import commands
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.corgi_commands import WEIRD_RESPONSES, CorgiCommands
+
+SERVER_ID: int = 1
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent: tp.List[str] = []
+
+    async def send(self, content: str):
+        self.sent.append(content)
+
+
+@pytest.fixture
+def cog(async_database: AsyncDatabase) -> CorgiCommands:
+    return CorgiCommands(commands.Bot(command_prefix='$', intents=discord.Intents.none()), async_database)
+
+
+def _message(channel: FakeChannel, user_id: int) -> types.SimpleNamespace:
+    return types.SimpleNamespace(guild=types.SimpleNamespace(id=SERVER_ID), author=types.SimpleNamespace(id=user_id),
+                                 channel=channel, mentions=[], content='bork')
+
+
+@pytest.mark.parametrize('affections', [{}, {1: -5}, {1: -5, 2: 0}])
+def test_apologize_without_anyone_liked(cog: CorgiCommands, async_database: AsyncDatabase,
+                                        affections: tp.Dict[int, int]):
+    channel = FakeChannel()
+
+    async def run():
+        for user_id, affection in affections.items():
+            await async_database.add_affection(user_id, affection, SERVER_ID)
+        context = types.SimpleNamespace(guild=types.SimpleNamespace(id=SERVER_ID),
+                                        author=types.SimpleNamespace(id=1), send=channel.send)
+        await cog.apologize.callback(cog, context)
+
+    asyncio.run(run())
+    assert len(channel.sent) == 1
+
+
+@pytest.mark.parametrize('affections', [{}, {1: -5}])
+def test_random_chatter_in_a_new_guild(cog: CorgiCommands, async_database: AsyncDatabase,
+                                       monkeypatch: pytest.MonkeyPatch, affections: tp.Dict[int, int]):
+    monkeypatch.setattr(random, 'random', lambda: 0.0)
+    channel = FakeChannel()
+
+    async def run():
+        for user_id, affection in affections.items():
+            await async_database.add_affection(user_id, affection, SERVER_ID)
+        for _ in range(20):
+            await cog.on_message(_message(channel, 1))
+
+    asyncio.run(run())
+    assert all(sent in WEIRD_RESPONSES for sent in channel.sent)
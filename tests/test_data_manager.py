@@ -0,0 +1,58 @@
+import asyncio
+import json
+import types
+from pathlib import Path
+
+import pytest
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.data_manager import DataManager
+
+
+def _write_opt_in_file(server_ids):
+    Path('assets').mkdir(exist_ok=True)
+    with open(Path('assets') / 'server-opt-in.json', 'w') as f:
+        json.dump({'server_ids': [str(server_id) for server_id in server_ids]}, f)
+
+
+async def _start(async_database: AsyncDatabase) -> DataManager:
+    data_manager = DataManager(types.SimpleNamespace(command_prefix='$'), async_database)
+    data_manager.servers_opted_in = await async_database.get_opted_in_servers()
+    await data_manager.import_opt_in_file()
+    return data_manager
+
+
+def test_opt_in_file_is_only_imported_once(async_database: AsyncDatabase, tmp_path: Path,
+                                           monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    _write_opt_in_file([1, 2])
+
+    async def run():
+        data_manager: DataManager = await _start(async_database)
+        assert data_manager.servers_opted_in == {1, 2}
+        await data_manager.set_servers_opted_in([1], False)
+
+        # Restarting doesn't opt the server back in.
+        data_manager = await _start(async_database)
+        assert data_manager.servers_opted_in == {2}
+        assert await data_manager.import_opt_in_file() == 0
+
+        # A new file opts more servers in, and only those.
+        _write_opt_in_file([1, 3])
+        assert await data_manager.import_opt_in_file() == 2
+        assert data_manager.servers_opted_in == {1, 2, 3}
+
+    asyncio.run(run())
+    assert not (tmp_path / 'assets' / 'server-opt-in.json').exists()
+    assert (tmp_path / 'assets' / 'server-opt-in.json.imported').exists()
+
+
+def test_broken_opt_in_file_is_left_alone(async_database: AsyncDatabase, tmp_path: Path,
+                                          monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.chdir(tmp_path)
+    Path('assets').mkdir()
+    (Path('assets') / 'server-opt-in.json').write_text('{"server_ids": [')
+
+    data_manager: DataManager = asyncio.run(_start(async_database))
+    assert data_manager.servers_opted_in == set()
+    assert (tmp_path / 'assets' / 'server-opt-in.json').exists()
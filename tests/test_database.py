@@ -0,0 +1,51 @@
+import typing as tp
+
+import pytest
+
+from corgi_bot import cache
+from corgi_bot.database import Database
+
+
+@pytest.fixture
+def no_nested_calls(monkeypatch: pytest.MonkeyPatch):
+    """
+    Make the timed methods that other methods used to call fail, so anything still calling them gets caught.
+    """
+
+    def fail(*args, **kwargs):
+        raise AssertionError('A timed Database method called another timed method.')
+
+    for method_name in ('execute', 'execute_many', 'flush_affection'):
+        monkeypatch.setattr(Database, method_name, fail)
+
+
+def test_methods_are_only_timed_once(database: Database, no_nested_calls):
+    database.add_playlist(channel_id=1, server_id=10, playlist_id='bork')
+    database.set_server_opt_in([10, 20])
+    database.set_server_opt_in([20], opted_in=False)
+    database.affection_ledger.max_pending = 1
+    database.add_affection(1, 3, server_id=10)
+
+    assert database.get_playlists() == [(1, 10, 'bork')]
+    assert database.get_opted_in_servers() == {10}
+    assert database.get_affection(1, server_id=10) == 3
+    assert len(database.affection_ledger) == 0
+
+
+def test_writes_are_not_leaderboard_lookups(database: Database, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setattr(cache.REGISTRY, 'enabled', True)
+
+    def lookups() -> tp.Tuple[float, float]:
+        return cache.CACHE_HITS.get('leaderboards'), cache.CACHE_MISSES.get('leaderboards')
+
+    before: tp.Tuple[float, float] = lookups()
+    database.add_affection(1, 3, server_id=10)
+    database.reset_affection(1, server_id=10)
+    assert lookups() == before
+
+    # Once the leaderboard is cached, writes still update it without counting as hits.
+    assert database.get_affection(2, server_id=10) == 0
+    before = lookups()
+    database.add_affection(2, 6, server_id=10)
+    assert lookups() == before
+    assert database.get_affection(2, server_id=10) == 6
@@ -0,0 +1,46 @@
+import logging
+import logging.handlers
+from pathlib import Path
+
+import pytest
+
+from corgi_bot.log_setup import parse_levels, setup_logging
+
+
+def test_parse_levels():
+    assert parse_levels('corgi_bot.database=debug, discord.gateway = WARNING,corgi_bot.data_manager=15') == {
+        'corgi_bot.database': logging.DEBUG, 'discord.gateway': logging.WARNING, 'corgi_bot.data_manager': 15}
+    assert parse_levels('') == {}
+
+
+def test_bad_levels_are_skipped(caplog: pytest.LogCaptureFixture):
+    with caplog.at_level(logging.WARNING, logger='corgi_bot.log_setup'):
+        assert parse_levels('=VERBOSE,corgi_bot.database=DEBUG,discord=,nonsense') == {
+            'corgi_bot.database': logging.DEBUG}
+    assert len(caplog.records) == 2
+
+
+def test_bad_levels_do_not_stop_setup(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setenv('CORGI_LOG_LEVEL', 'LOUD')
+    monkeypatch.setenv('CORGI_LOG_LEVELS', '=VERBOSE,corgi_bot.test_log_setup=DEBUG')
+    root_logger: logging.Logger = logging.getLogger()
+    old_handlers, old_level = list(root_logger.handlers), root_logger.level
+
+    listener = setup_logging(tmp_path / 'corgi_bot.log')
+    try:
+        assert root_logger.level == logging.INFO
+        assert logging.getLogger('corgi_bot.test_log_setup').level == logging.DEBUG
+        logging.getLogger('corgi_bot.test_log_setup').debug('Bork!')
+    finally:
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+        for handler in list(root_logger.handlers):
+            root_logger.removeHandler(handler)
+        for handler in old_handlers:
+            root_logger.addHandler(handler)
+        root_logger.setLevel(old_level)
+        logging.getLogger('corgi_bot.test_log_setup').setLevel(logging.NOTSET)
+
+    log: str = (tmp_path / 'corgi_bot.log').read_text(encoding='utf-8')
+    assert 'Ignoring CORGI_LOG_LEVEL' in log and 'Ignoring "=VERBOSE"' in log and 'Bork!' in log
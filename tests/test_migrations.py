@@ -0,0 +1,110 @@
+import calendar
+import datetime as dt
+import sqlite3
+from contextlib import closing
+from pathlib import Path
+
+import pytest
+
+from corgi_bot import migrations
+from corgi_bot.database import Database
+
+SERVER_ID: int = 123456789012345678
+OTHER_SERVER_ID: int = 223456789012345678
+
+
+def _create_legacy_database(db_path: Path):
+    """
+    A corgi.db the way the bot used to leave it: untyped TEXT columns, no keys, and user_version 0.
+    """
+    with closing(sqlite3.connect(db_path)) as connection:
+        connection.execute('create table quotes (quote TEXT, author TEXT, time TEXT, server_id TEXT)')
+        connection.execute('create table relations (user_id TEXT, affection NUM, last_update TEXT, server_id TEXT)')
+        connection.executemany('insert into quotes values (?, ?, ?, ?)', [
+            ('Bork bork', 'Alice', '1700000000.5', str(SERVER_ID)),
+            ('Who let the dogs out', 'Bob', '1700000100.0', str(SERVER_ID)),
+            ('Elsewhere', 'Carol', '1700000200.0', str(OTHER_SERVER_ID)),
+            (None, 'Nobody', '1700000300.0', str(SERVER_ID)),
+        ])
+        connection.executemany('insert into relations values (?, ?, ?, ?)', [
+            ('1', 5, '2024-01-02 03:04:05.000000', str(SERVER_ID)),
+            # A race in the old add_affection could leave the same user in twice.
+            ('1', 3, '2024-01-03 03:04:05.000000', str(SERVER_ID)),
+            ('2', -1, '2024-01-01 00:00:00', str(SERVER_ID)),
+            ('1', 7, '2024-01-01 00:00:00', str(OTHER_SERVER_ID)),
+            (None, 9, '2024-01-01 00:00:00', str(SERVER_ID)),
+        ])
+        connection.commit()
+        assert migrations.get_version(connection) == 0
+
+
+def _utc_timestamp(*args) -> float:
+    return float(calendar.timegm(dt.datetime(*args).timetuple()))
+
+
+def test_legacy_database_migrates_in_place(db_path: Path):
+    _create_legacy_database(db_path)
+    database = Database(connection_url=db_path)
+    try:
+        with database.get_connection() as connection:
+            assert migrations.get_version(connection) == len(migrations.MIGRATIONS)
+
+            relations = connection.execute(
+                'select user_id, server_id, affection, last_update from relations order by server_id, user_id').fetchall()
+            assert [row[:3] for row in relations] == [(1, SERVER_ID, 8), (2, SERVER_ID, -1), (1, OTHER_SERVER_ID, 7)]
+            assert all(type(value) is int for row in relations for value in row[:3])
+            # The newest of the merged rows' datetime strings, as a unix timestamp.
+            assert [row[3] for row in relations] == pytest.approx([_utc_timestamp(2024, 1, 3, 3, 4, 5),
+                                                                   _utc_timestamp(2024, 1, 1),
+                                                                   _utc_timestamp(2024, 1, 1)], abs=1e-3)
+
+            quotes = connection.execute('select quote, author, time, server_id from quotes order by id').fetchall()
+            assert quotes == [
+                ('Bork bork', 'Alice', 1700000000.5, SERVER_ID),
+                ('Who let the dogs out', 'Bob', 1700000100.0, SERVER_ID),
+                ('Elsewhere', 'Carol', 1700000200.0, OTHER_SERVER_ID),
+            ]
+
+            with pytest.raises(sqlite3.IntegrityError):
+                connection.execute('insert into relations (user_id, server_id, affection) values (?, ?, ?)',
+                                   (1, SERVER_ID, 1))
+            index_names = {row[0] for row in connection.execute("select name from sqlite_master where type = 'index'")}
+            assert {'quotes_server', 'relations_server_affection'} <= index_names
+
+        assert database.get_affection(1, SERVER_ID) == 8
+        assert database.get_rank(1, SERVER_ID) == 1
+        # Quotes from before the search index existed are still searchable.
+        assert len(database.search_quotes(SERVER_ID, 'dogs')[0]) == 1
+    finally:
+        database.close()
+
+
+def test_lookups_use_the_new_indexes(database: Database):
+    with database.get_connection() as connection:
+        plan = ' '.join(row[3] for row in connection.execute(
+            'explain query plan select affection from relations where server_id = ? and user_id = ?', (1, 1)))
+        assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan
+        plan = ' '.join(row[3] for row in connection.execute(
+            'explain query plan select id from quotes where server_id = ?', (1,)))
+        assert 'quotes_server' in plan
+
+
+def test_migrate_is_idempotent(db_path: Path):
+    _create_legacy_database(db_path)
+    with closing(sqlite3.connect(db_path)) as connection:
+        assert migrations.migrate(connection) == len(migrations.MIGRATIONS)
+        assert migrations.migrate(connection) == len(migrations.MIGRATIONS)
+        assert connection.execute('select count(*) from relations').fetchone()[0] == 3
+
+
+def test_failed_migration_rolls_back(db_path: Path):
+    def broken(connection: sqlite3.Connection):
+        connection.execute('create table half_done (id INTEGER)')
+        connection.execute('select * from table_that_does_not_exist')
+
+    with closing(sqlite3.connect(db_path)) as connection:
+        with pytest.raises(sqlite3.OperationalError):
+            migrations.migrate(connection, [migrations._create_legacy_tables, broken])
+
+        assert migrations.get_version(connection) == 1
+        assert connection.execute("select count(*) from sqlite_master where name = 'half_done'").fetchone()[0] == 0
@@ -0,0 +1,234 @@
+import asyncio
+import os
+import pickle
+import types
+import typing as tp
+from pathlib import Path
+
+import discord
+import pytest
+from discord.ext import commands
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.playlist_manager import PlaylistManager
+from corgi_bot.spotify_pipeline import SpotifyPipeline
+from tests.fake_spotify import FakeSpotify
+
+CHANNEL_ID: int = 1
+SERVER_ID: int = 2
+PLAYLIST_ID: str = 'managed'
+
+
+class FakeChannel:
+    def __init__(self):
+        self.id: int = CHANNEL_ID
+        self.sent: tp.List[str] = []
+
+    async def send(self, content: str):
+        self.sent.append(content)
+
+
+def _message(channel: FakeChannel, *links: str) -> types.SimpleNamespace:
+    return types.SimpleNamespace(channel=channel, author=types.SimpleNamespace(bot=False),
+                                 content=' '.join(f'https://open.spotify.com/{link}' for link in links))
+
+
+@pytest.fixture
+def fake_spotify() -> FakeSpotify:
+    return FakeSpotify(latency=0.01)
+
+
+@pytest.fixture
+def manager(async_database: AsyncDatabase, fake_spotify: FakeSpotify, tmp_path: Path,
+            monkeypatch: pytest.MonkeyPatch) -> tp.Iterator[PlaylistManager]:
+    # Without credentials on disk the manager skips logging in to Spotify, so the fake can be swapped in.
+    monkeypatch.chdir(tmp_path)
+    bot = commands.Bot(command_prefix='$', intents=discord.Intents.none())
+    playlist_manager = PlaylistManager(bot, async_database, spotify_credentials_path=str(tmp_path / 'credentials.json'))
+    playlist_manager.can_work = True
+    playlist_manager.spotify = SpotifyPipeline(fake_spotify)
+    playlist_manager._route_channel(CHANNEL_ID, SERVER_ID, PLAYLIST_ID)
+    fake_spotify.playlists[PLAYLIST_ID] = []
+    yield playlist_manager
+    playlist_manager.spotify.close()
+
+
+def test_dedupe_uses_no_api_calls(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    channel = FakeChannel()
+    asyncio.run(manager.on_message(_message(channel, 'track/a', 'track/b', 'track/a')))
+    asyncio.run(manager.on_message(_message(channel, 'track/b', 'track/a')))
+
+    assert fake_spotify.playlists[PLAYLIST_ID] == ['a', 'b']
+    assert fake_spotify.calls == {'playlist_add_items': 1}
+    assert len(channel.sent) == 1
+
+
+def test_concurrent_messages_add_a_track_once(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    channel = FakeChannel()
+
+    async def run():
+        await asyncio.gather(*(manager.on_message(_message(channel, 'track/a', f'track/{i}')) for i in range(10)))
+
+    asyncio.run(run())
+    assert sorted(fake_spotify.playlists[PLAYLIST_ID]) == sorted(['a'] + [str(i) for i in range(10)])
+
+
+def test_long_albums_are_added_in_order(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    fake_spotify.albums['long'] = [f'track{i}' for i in range(250)]
+    asyncio.run(manager.on_message(_message(FakeChannel(), 'album/long')))
+
+    assert fake_spotify.playlists[PLAYLIST_ID] == fake_spotify.albums['long']
+    assert fake_spotify.calls['playlist_add_items'] == 3
+
+
+def test_partial_failure_only_indexes_what_was_added(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    fake_spotify.albums['long'] = [f'track{i}' for i in range(150)]
+    fake_spotify.add_failures = [None, 500]
+    channel = FakeChannel()
+    asyncio.run(manager.on_message(_message(channel, 'album/long')))
+
+    assert fake_spotify.playlists[PLAYLIST_ID] == fake_spotify.albums['long'][:100]
+    assert manager.track_index.filter_new(PLAYLIST_ID, fake_spotify.albums['long']) == fake_spotify.albums['long'][100:]
+    assert channel.sent[0].startswith('I ADDED 100 OF 150 SONGS')
+
+
+def test_rate_limits_are_waited_out(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    fake_spotify.add_failures = [429, 429]
+    asyncio.run(manager.on_message(_message(FakeChannel(), 'track/a')))
+
+    assert fake_spotify.playlists[PLAYLIST_ID] == ['a']
+    assert fake_spotify.calls['playlist_add_items'] == 3
+
+
+def test_reconcile_picks_up_manual_edits(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    asyncio.run(manager.on_message(_message(FakeChannel(), 'track/a', 'track/b')))
+    # Someone took a track out and put another in by hand.
+    fake_spotify.playlists[PLAYLIST_ID] = ['b', 'c']
+    asyncio.run(manager.reconcile_track_index())
+
+    assert manager.track_index.filter_new(PLAYLIST_ID, ['a', 'b', 'c']) == ['a']
+
+
+def test_reconcile_keeps_tracks_added_while_it_runs(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    fake_spotify.playlists[PLAYLIST_ID] = [f'old{i}' for i in range(500)]
+
+    async def run():
+        # Reading the 500 track playlist takes several pages, so the message comes in partway through.
+        reconcile = asyncio.create_task(manager.reconcile_track_index())
+        await asyncio.sleep(0.02)
+        await manager.on_message(_message(FakeChannel(), 'track/new'))
+        await reconcile
+
+    asyncio.run(run())
+    assert manager.track_index.filter_new(PLAYLIST_ID, ['new', 'old0', 'old499']) == []
+    assert fake_spotify.playlists[PLAYLIST_ID].count('new') == 1
+
+
+def test_reconcile_spreads_out_stale_playlists(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    for i in range(48):
+        manager._route_channel(100 + i, SERVER_ID, f'playlist{i}')
+        fake_spotify.playlists[f'playlist{i}'] = [f'track{i}']
+    # 49 playlists checked once every 6 hours, every 15 minutes, is 3 a run.
+    for _ in range(17):
+        asyncio.run(manager.reconcile_track_index())
+    assert fake_spotify.calls['playlist_items'] == 49
+    assert manager.track_index.filter_new('playlist47', ['track47']) == []
+
+    # Like after a restart: everything was checked recently, so nothing needs to be again.
+    asyncio.run(manager.reconcile_track_index())
+    assert fake_spotify.calls['playlist_items'] == 49
+
+
+def test_messages_go_to_their_channels_playlist(manager: PlaylistManager, fake_spotify: FakeSpotify):
+    other_channel = FakeChannel()
+    other_channel.id = CHANNEL_ID + 1
+    manager._route_channel(other_channel.id, SERVER_ID, 'other')
+    fake_spotify.playlists['other'] = []
+
+    asyncio.run(manager.on_message(_message(FakeChannel(), 'track/a')))
+    asyncio.run(manager.on_message(_message(other_channel, 'track/b')))
+    unrouted_channel = FakeChannel()
+    unrouted_channel.id = CHANNEL_ID + 2
+    asyncio.run(manager.on_message(_message(unrouted_channel, 'track/c')))
+
+    assert fake_spotify.playlists == {PLAYLIST_ID: ['a'], 'other': ['b']}
+    assert unrouted_channel.sent == []
+
+
+def test_get_server_playlist(manager: PlaylistManager):
+    manager._route_channel(CHANNEL_ID + 1, SERVER_ID, 'other')
+    # Routing a channel again changes its playlist without listing it twice.
+    manager._route_channel(CHANNEL_ID + 1, SERVER_ID, 'other2')
+
+    assert manager.server_channels[SERVER_ID] == [CHANNEL_ID, CHANNEL_ID + 1]
+    assert manager.get_server_playlist(SERVER_ID, CHANNEL_ID + 1) == 'other2'
+    # Channels without their own playlist get the server's first one.
+    assert manager.get_server_playlist(SERVER_ID, CHANNEL_ID + 5) == PLAYLIST_ID
+    assert manager.get_server_playlist(SERVER_ID + 1, CHANNEL_ID + 5) is None
+
+
+def _save_legacy_playlist(manager: PlaylistManager, data: tp.Any):
+    os.makedirs(os.path.dirname(manager.saved_playlist_path), exist_ok=True)
+    with open(manager.saved_playlist_path, 'wb') as f:
+        pickle.dump(data, f)
+
+
+def _fetch_channel(channels: tp.Dict[int, int]) -> tp.Callable:
+    """
+    :param channels: Key: channel id, Value: id of the server it's in. Any other channel doesn't exist.
+    """
+
+    async def fetch_channel(channel_id: int) -> types.SimpleNamespace:
+        if channel_id not in channels:
+            raise discord.NotFound(types.SimpleNamespace(status=404, reason='Not Found'), 'Unknown Channel')
+        return types.SimpleNamespace(id=channel_id, guild=types.SimpleNamespace(id=channels[channel_id]))
+
+    return fetch_channel
+
+
+def test_legacy_playlist_is_imported_once(manager: PlaylistManager, async_database: AsyncDatabase,
+                                          monkeypatch: pytest.MonkeyPatch):
+    _save_legacy_playlist(manager, {'playlist_id': 'legacy', 'music_channel_id': '7'})
+    monkeypatch.setattr(manager.bot, 'fetch_channel', _fetch_channel({7: SERVER_ID + 1}))
+
+    asyncio.run(manager.import_saved_playlist())
+
+    assert manager.channel_playlists[7] == 'legacy'
+    assert manager.get_server_playlist(SERVER_ID + 1, 8) == 'legacy'
+    assert asyncio.run(async_database.get_playlists()) == [(7, SERVER_ID + 1, 'legacy')]
+    assert not os.path.exists(manager.saved_playlist_path)
+    assert os.path.exists(manager.saved_playlist_path + '.imported')
+
+
+def test_legacy_playlist_for_a_known_channel(manager: PlaylistManager, async_database: AsyncDatabase,
+                                             monkeypatch: pytest.MonkeyPatch):
+    _save_legacy_playlist(manager, {'playlist_id': 'legacy', 'music_channel_id': str(CHANNEL_ID)})
+    # The channel is already in the database, so there's no need to ask Discord about it.
+    monkeypatch.setattr(manager.bot, 'fetch_channel', _fetch_channel({}))
+
+    asyncio.run(manager.import_saved_playlist())
+
+    assert manager.channel_playlists[CHANNEL_ID] == PLAYLIST_ID
+    assert asyncio.run(async_database.get_playlists()) == []
+    assert os.path.exists(manager.saved_playlist_path + '.imported')
+
+
+@pytest.mark.parametrize('data', [{'playlist_id': 'legacy'}, {'playlist_id': 'legacy', 'music_channel_id': 'nope'},
+                                  {'playlist_id': 'legacy', 'music_channel_id': '9'}, None])
+def test_broken_legacy_playlist_is_left_alone(manager: PlaylistManager, async_database: AsyncDatabase,
+                                              monkeypatch: pytest.MonkeyPatch, data: tp.Optional[tp.Dict[str, str]]):
+    if data is None:
+        os.makedirs(os.path.dirname(manager.saved_playlist_path), exist_ok=True)
+        with open(manager.saved_playlist_path, 'wb') as f:
+            f.write(b'not a pickle')
+    else:
+        _save_legacy_playlist(manager, data)
+    monkeypatch.setattr(manager.bot, 'fetch_channel', _fetch_channel({}))
+
+    asyncio.run(manager.import_saved_playlist())
+
+    assert list(manager.channel_playlists) == [CHANNEL_ID]
+    assert asyncio.run(async_database.get_playlists()) == []
+    # Left where it was so it can be fixed and imported on the next start.
+    assert os.path.exists(manager.saved_playlist_path)
+    assert not os.path.exists(manager.saved_playlist_path + '.imported')
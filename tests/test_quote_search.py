@@ -0,0 +1,119 @@
+import asyncio
+import types
+import typing as tp
+
+import discord
+import pytest
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.corgi_commands import CorgiCommands
+from corgi_bot.database import Database
+
+SERVER_ID: int = 1
+
+
+@pytest.fixture
+def quotes(database: Database) -> Database:
+    database.add_quote('Such a good dog', 'Alice Smith', server_id=SERVER_ID, time=1700000000.0)
+    database.add_quote('Bad dog, no treats', 'Alan', server_id=SERVER_ID, time=1700000100.0)
+    database.add_quote('Borking all day', 'Al', server_id=SERVER_ID, time=1700000200.0)
+    database.add_quote('Good dog from another server', 'Alice Smith', server_id=SERVER_ID + 1, time=1700000000.0)
+    return database
+
+
+def test_every_word_has_to_match(quotes: Database):
+    results, has_next_page = quotes.search_quotes(SERVER_ID, 'good dog')
+    assert len(results) == 1 and results[0].endswith('Alice Smith said, "Such a good dog"')
+    assert not has_next_page
+    assert len(quotes.search_quotes(SERVER_ID, 'dog')[0]) == 2
+
+
+def test_words_match_whole(quotes: Database):
+    assert quotes.search_quotes(SERVER_ID, 'bork') == ([], False)
+    results, _ = quotes.search_quotes(SERVER_ID, 'BORKING')
+    assert len(results) == 1 and results[0].endswith('"Borking all day"')
+
+
+def test_best_match_comes_first(database: Database):
+    database.add_quote('bork woof woof woof', 'Alice', server_id=SERVER_ID, time=1700000000.0)
+    for i in range(10):
+        database.add_quote(f'woof and a whole lot of other words number {i}', 'Bob', server_id=SERVER_ID,
+                           time=1700000001.0 + i)
+    results, has_next_page = database.search_quotes(SERVER_ID, 'woof')
+    assert results[0].endswith('"bork woof woof woof"')
+    assert has_next_page
+
+
+def test_author_has_to_match_whole(quotes: Database):
+    results, _ = quotes.search_quotes(SERVER_ID, 'Al', by_author=True)
+    assert len(results) == 1 and 'Al said' in results[0]
+    assert len(quotes.search_quotes(SERVER_ID, 'alice', by_author=True)[0]) == 1
+    # Words in the quote don't count when searching by author.
+    assert quotes.search_quotes(SERVER_ID, 'dog', by_author=True) == ([], False)
+
+
+@pytest.mark.parametrize('terms', ['"', '*', 'good" OR "bad', 'NEAR(good dog)', 'quote:dog', '- ( ) ^', ''])
+def test_punctuation_is_not_query_syntax(quotes: Database, terms: str):
+    # Any of these reaching FTS5 as syntax would either raise or match more than they should.
+    results, _ = quotes.search_quotes(SERVER_ID, terms)
+    assert len(results) <= 1
+
+
+def test_pages(database: Database):
+    # Later pages still work when they go past the matches that get ranked.
+    database.SEARCH_CANDIDATES = 3
+    for i in range(12):
+        database.add_quote(f'bork {i}', 'Alice', server_id=SERVER_ID, time=1700000000.0 + i)
+
+    pages = [database.search_quotes(SERVER_ID, 'alice', by_author=True, page=page) for page in (1, 2, 3, 4)]
+    assert [len(results) for results, _ in pages] == [5, 5, 2, 0]
+    assert [has_next_page for _, has_next_page in pages] == [True, True, False, False]
+    # Newest first when searching by author.
+    assert pages[0][0][0].endswith('"bork 11"')
+
+
+def _invoke(async_database: AsyncDatabase, subcommand: str, arguments: str) -> tp.List[str]:
+    """
+    Runs $quote <subcommand> <arguments> through the bot like a real message would.
+    :return: What the bot replied with.
+    """
+    sent: tp.List[str] = []
+
+    async def send(content: str):
+        sent.append(content)
+
+    async def run():
+        bot = commands.Bot(command_prefix='$', intents=discord.Intents.none())
+        # Sets up the bot's event loop so command errors can be dispatched without logging in.
+        await bot._async_setup_hook()
+        corgi_commands = CorgiCommands(bot, async_database)
+        await bot.add_cog(corgi_commands)
+
+        message = types.SimpleNamespace(guild=types.SimpleNamespace(id=SERVER_ID), author=types.SimpleNamespace(id=1),
+                                        channel=None, attachments=[], _state=bot._connection,
+                                        content=f'$quote {subcommand} {arguments}')
+        context = commands.Context(message=message, bot=bot, view=StringView(arguments), prefix='$',
+                                   command=corgi_commands.quote.get_command(subcommand), invoked_with=subcommand)
+        context.send = send
+        await bot.invoke(context)
+        # Let the error listeners run.
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    return sent
+
+
+def test_command_takes_every_word(async_database: AsyncDatabase, quotes: Database):
+    sent = _invoke(async_database, 'search', 'good dog')
+    assert len(sent) == 1 and 'Such a good dog' in sent[0]
+
+
+def test_command_page_comes_first(async_database: AsyncDatabase, quotes: Database):
+    sent = _invoke(async_database, 'search', '2 dog')
+    assert sent == ['THERE AREN\'T THAT MANY PAGES! I CHECKED UNDER THE COUCH AND EVERYTHING!']
+
+
+def test_command_without_words_replies_with_usage(async_database: AsyncDatabase, quotes: Database):
+    assert _invoke(async_database, 'by', '') == ['*tilts head* I DON\'T GET IT! Try `$quote by [page] <author name>`']
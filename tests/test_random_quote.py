@@ -0,0 +1,26 @@
+from corgi_bot.database import Database
+
+
+def test_empty_guild_has_no_quote(database: Database):
+    assert database.get_random_quote(server_id=1) is None
+
+
+def test_new_quotes_are_picked_up(database: Database):
+    assert database.get_random_quote(server_id=1) is None
+    database.add_quote('Bork', 'Alice', server_id=1, time=1700000000.0)
+    assert database.get_random_quote(server_id=1).endswith('Alice said, "Bork"')
+    # Other guilds' quotes never show up.
+    assert database.get_random_quote(server_id=2) is None
+
+
+def test_deleted_quotes_are_skipped(database: Database):
+    database.add_quote('Bork', 'Alice', server_id=1, time=1700000000.0)
+    database.add_quote('Woof', 'Bob', server_id=1, time=1700000000.0)
+    database.get_random_quote(server_id=1)
+    database.execute("delete from quotes where author = 'Alice'", ())
+
+    for _ in range(20):
+        assert database.get_random_quote(server_id=1).endswith('Bob said, "Woof"')
+
+    database.execute('delete from quotes', ())
+    assert database.get_random_quote(server_id=1) is None
@@ -0,0 +1,166 @@
+import asyncio
+import types
+import typing as tp
+
+import discord
+import pytest
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+
+from corgi_bot import rate_limiter
+from corgi_bot.async_database import AsyncDatabase
+from corgi_bot.corgi_commands import AFFECTION_RATE_LIMITER, RATE_LIMITED_RESPONSE, CorgiCommands
+from corgi_bot.rate_limiter import RateLimiter
+
+SERVER_ID: int = 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake_clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, 'monotonic', fake_clock.monotonic)
+    return fake_clock
+
+
+@pytest.fixture(autouse=True)
+def fresh_affection_limits() -> tp.Iterator[None]:
+    AFFECTION_RATE_LIMITER.buckets.clear()
+    yield
+    AFFECTION_RATE_LIMITER.buckets.clear()
+
+
+def test_burst_then_refill(clock: FakeClock):
+    limiter = RateLimiter(burst=5, per=15.0)
+    key = (SERVER_ID, 1, 'pet')
+    assert [limiter.hit(key)[0] for _ in range(5)] == [0.0] * 5
+
+    retry_after, first_rejection = limiter.hit(key)
+    assert retry_after == pytest.approx(3.0) and first_rejection
+    # Only the first rejection gets a reply.
+    assert not limiter.hit(key)[1]
+
+    clock.now += 3.0
+    assert limiter.hit(key) == (0.0, False)
+    assert limiter.hit(key)[1]
+
+
+def test_memory_stays_bounded_under_load(clock: FakeClock):
+    limiter = RateLimiter(burst=5, per=15.0, max_size=10000)
+    for user_id in range(200000):
+        limiter.hit((SERVER_ID, user_id, 'pet'))
+        clock.now += 0.0001
+    assert len(limiter.buckets) <= 10000
+
+    # Buckets that would have refilled by now are the same as new ones, so they don't need to be kept.
+    clock.now += 15.0
+    assert limiter.hit((SERVER_ID, 199999, 'pet')) == (0.0, False)
+
+
+def test_spammer_does_not_crowd_out_everyone_else(clock: FakeClock):
+    limiter = RateLimiter(burst=5, per=15.0, max_size=1000)
+    allowed: tp.Dict[int, int] = dict()
+    # One spammer sending 100 commands for each one from 500 other users, all within a second.
+    for i in range(50000):
+        user_id: int = 0 if i % 100 != 0 else i // 100 + 1
+        if limiter.hit((SERVER_ID, user_id, 'pet'))[0] <= 0:
+            allowed[user_id] = allowed.get(user_id, 0) + 1
+        clock.now += 0.00002
+
+    assert allowed.pop(0) == 5
+    assert allowed == {user_id: 1 for user_id in range(1, 501)}
+
+
+class FakeChannel:
+    def __init__(self):
+        self.sent: tp.List[str] = []
+
+    async def send(self, content: str):
+        self.sent.append(content)
+
+
+async def _make_cog(async_database: AsyncDatabase) -> CorgiCommands:
+    bot = commands.Bot(command_prefix='$', intents=discord.Intents.none())
+    # Sets up the bot's event loop so command errors can be dispatched without logging in.
+    await bot._async_setup_hook()
+    corgi_commands = CorgiCommands(bot, async_database)
+    await bot.add_cog(corgi_commands)
+    return corgi_commands
+
+
+def _context(cog: CorgiCommands, channel: FakeChannel, user_id: int, command_name: str,
+             invoked_with: str) -> commands.Context:
+    message = types.SimpleNamespace(guild=types.SimpleNamespace(id=SERVER_ID), author=types.SimpleNamespace(id=user_id),
+                                    channel=channel, attachments=[], mentions=[], _state=cog.bot._connection,
+                                    content=f'${invoked_with}')
+    context = commands.Context(message=message, bot=cog.bot, view=StringView(''), prefix='$',
+                               command=cog.bot.get_command(command_name), invoked_with=invoked_with)
+    context.send = channel.send
+    return context
+
+
+def test_concurrent_commands_are_limited_per_user(async_database: AsyncDatabase):
+    channel = FakeChannel()
+
+    async def run():
+        cog: CorgiCommands = await _make_cog(async_database)
+        await asyncio.gather(*(cog.bot.invoke(_context(cog, channel, user_id, 'pet', 'pet'))
+                               for _ in range(50) for user_id in range(20)))
+        # Let the error listeners run.
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    # Each $pet is worth 3, and only the first 5 from each user got through.
+    for user_id in range(20):
+        assert asyncio.run(async_database.get_affection(user_id, SERVER_ID)) == 5 * 3
+    assert channel.sent.count(RATE_LIMITED_RESPONSE) == 20
+
+
+def test_help_does_not_use_up_tokens(async_database: AsyncDatabase):
+    channel = FakeChannel()
+
+    async def run():
+        cog: CorgiCommands = await _make_cog(async_database)
+        pet: commands.Command = cog.bot.get_command('pet')
+        # This is what help does for every command when deciding whether to list it.
+        for _ in range(20):
+            assert await pet.can_run(_context(cog, channel, 1, 'help', 'help'))
+        assert len(AFFECTION_RATE_LIMITER.buckets) == 0
+
+        for _ in range(5):
+            assert await pet.can_run(_context(cog, channel, 1, 'pet', 'pet'))
+        with pytest.raises(rate_limiter.RateLimited):
+            await pet.can_run(_context(cog, channel, 1, 'pet', 'pet'))
+
+    asyncio.run(run())
+    assert channel.sent == [RATE_LIMITED_RESPONSE]
+
+
+def test_callouts_are_limited(async_database: AsyncDatabase):
+    channel = FakeChannel()
+
+    def callout(content: str) -> types.SimpleNamespace:
+        return types.SimpleNamespace(guild=types.SimpleNamespace(id=SERVER_ID), author=types.SimpleNamespace(id=1),
+                                     channel=channel, mentions=[object()], content=f'<@1> {content}')
+
+    async def run():
+        cog: CorgiCommands = await _make_cog(async_database)
+        for _ in range(10):
+            await cog.handle_callout(callout('good boy'))
+        for _ in range(10):
+            await cog.handle_callout(callout('treat?'))
+        # Questions don't change affection, so they're never turned away.
+        for _ in range(10):
+            await cog.handle_callout(callout('good boy?'))
+
+    asyncio.run(run())
+    assert asyncio.run(async_database.get_affection(1, SERVER_ID)) == 5 * 2 + 5 * 5
+    assert channel.sent.count(RATE_LIMITED_RESPONSE) == 2
+    assert len(channel.sent) == 5 + 1 + 5 + 1 + 10
@@ -0,0 +1,54 @@
+import asyncio
+import typing as tp
+
+import pytest
+
+from corgi_bot.metrics import REGISTRY
+from corgi_bot.spotify_pipeline import SPOTIFY_CALLS, SpotifyPipeline
+from tests.fake_spotify import FakeSpotify
+
+METHODS: tp.Tuple[str, ...] = ('album_tracks', 'playlist_items', 'next', 'playlist_add_items', 'playlist',
+                               'user_playlist_create')
+
+
+@pytest.fixture
+def fake_spotify() -> FakeSpotify:
+    return FakeSpotify()
+
+
+@pytest.fixture
+def pipeline(fake_spotify: FakeSpotify, monkeypatch: pytest.MonkeyPatch) -> tp.Iterator[SpotifyPipeline]:
+    monkeypatch.setattr(REGISTRY, 'enabled', True)
+    spotify_pipeline = SpotifyPipeline(fake_spotify)
+    yield spotify_pipeline
+    spotify_pipeline.close()
+
+
+def _counts(outcome: str) -> tp.Dict[str, float]:
+    return {method: SPOTIFY_CALLS.get(method, outcome) for method in METHODS}
+
+
+def test_every_request_is_counted(pipeline: SpotifyPipeline, fake_spotify: FakeSpotify):
+    fake_spotify.albums['long'] = [f'album{i}' for i in range(250)]
+    fake_spotify.playlists['theirs'] = [f'playlist{i}' for i in range(150)]
+    before: tp.Dict[str, float] = _counts('ok')
+
+    async def run():
+        await pipeline.resolve_links([('album', 'long'), ('playlist', 'theirs'), ('track', 'single')])
+        playlist_id: str = (await pipeline.create_playlist('corgi', 'Bork', 'Woof'))['id']
+        await pipeline.add_items(playlist_id, ['a', 'b'])
+        await pipeline.get_playlist_url(playlist_id)
+
+    asyncio.run(run())
+    # Each extra page is its own request against the quota, so it has to show up under next.
+    assert {method: count - before[method] for method, count in _counts('ok').items()} == fake_spotify.calls
+    assert fake_spotify.calls['next'] == 3
+
+
+def test_failed_requests_are_counted(pipeline: SpotifyPipeline, fake_spotify: FakeSpotify):
+    fake_spotify.add_failures = [429, 429, None]
+    before: tp.Dict[str, float] = _counts('error')
+    asyncio.run(pipeline.add_items('theirs', ['a']))
+
+    assert _counts('error')['playlist_add_items'] - before['playlist_add_items'] == 2
+    assert fake_spotify.playlists['theirs'] == ['a']
@@ -0,0 +1,134 @@
+import asyncio
+import time
+import types
+import typing as tp
+
+import pytest
+
+from corgi_bot import cache
+from corgi_bot.user_resolver import UserResolver
+
+GUILD_ID: int = 1
+
+
+class FakeClock:
+    def __init__(self):
+        self.now: float = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+class FakeGuild:
+    def __init__(self, members: tp.Dict[int, str]):
+        self.id: int = GUILD_ID
+        # Key: user id, Value: display name of members in the member cache.
+        self.members: tp.Dict[int, str] = members
+        self.get_member_calls: int = 0
+
+    def get_member(self, user_id: int) -> tp.Optional[types.SimpleNamespace]:
+        self.get_member_calls += 1
+        name: tp.Optional[str] = self.members.get(user_id)
+        return types.SimpleNamespace(display_name=name) if name is not None else None
+
+
+class FakeClient:
+    """
+    Stands in for the bot's fetch_user, which takes latency seconds per request.
+    """
+
+    def __init__(self, latency: float = 0.01):
+        self.latency: float = latency
+        # Users that take this long to fetch, instead of latency.
+        self.slow_users: tp.Dict[int, float] = dict()
+        # Users that can't be fetched.
+        self.missing_users: tp.Set[int] = set()
+        self.fetched: tp.List[int] = []
+        self.in_flight: int = 0
+        self.max_in_flight: int = 0
+
+    async def fetch_user(self, user_id: int) -> types.SimpleNamespace:
+        self.fetched.append(user_id)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.slow_users.get(user_id, self.latency))
+        finally:
+            self.in_flight -= 1
+        if user_id in self.missing_users:
+            raise LookupError(f'Unknown user {user_id}')
+        return types.SimpleNamespace(display_name=f'fetched {user_id}')
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> FakeClock:
+    fake_clock = FakeClock()
+    # Only the cache's clock, so the event loop still keeps real time.
+    monkeypatch.setattr(cache, 'time', types.SimpleNamespace(monotonic=fake_clock.monotonic))
+    return fake_clock
+
+
+def test_members_skip_fetching(clock: FakeClock):
+    client = FakeClient()
+    resolver = UserResolver(client, ttl=600.0)
+    guild = FakeGuild({1: 'Alice', 2: 'Bob'})
+
+    assert asyncio.run(resolver.get_display_names(guild, [1, 2])) == {1: 'Alice', 2: 'Bob'}
+    assert client.fetched == []
+    assert guild.get_member_calls == 2
+
+    # Names are cached, so the member cache isn't even asked the second time.
+    asyncio.run(resolver.get_display_names(guild, [1, 2]))
+    assert guild.get_member_calls == 2
+
+
+def test_names_expire(clock: FakeClock):
+    client = FakeClient()
+    resolver = UserResolver(client, ttl=600.0)
+    guild = FakeGuild({1: 'Alice'})
+    asyncio.run(resolver.get_display_names(guild, [1, 3]))
+
+    guild.members[1] = 'Alice Smith'
+    clock.now += 599.0
+    assert asyncio.run(resolver.get_display_names(guild, [1, 3])) == {1: 'Alice', 3: 'fetched 3'}
+    assert client.fetched == [3]
+
+    clock.now += 2.0
+    assert asyncio.run(resolver.get_display_names(guild, [1, 3])) == {1: 'Alice Smith', 3: 'fetched 3'}
+    assert client.fetched == [3, 3]
+
+
+def test_fetches_are_bounded():
+    client = FakeClient(latency=0.01)
+    resolver = UserResolver(client, max_concurrency=4)
+    user_ids: tp.List[int] = list(range(100, 120))
+
+    start: float = time.perf_counter()
+    names: tp.Dict[int, str] = asyncio.run(resolver.get_display_names(FakeGuild({}), user_ids))
+    elapsed: float = time.perf_counter() - start
+
+    assert names == {user_id: f'fetched {user_id}' for user_id in user_ids}
+    assert sorted(client.fetched) == user_ids
+    assert client.max_in_flight == 4
+    # 20 fetches 4 at a time is 5 rounds, not 20 one after another.
+    assert elapsed < 20 * 0.01
+
+
+def test_falls_back_to_ids(clock: FakeClock):
+    client = FakeClient(latency=0.01)
+    client.slow_users[2] = 10.0
+    client.missing_users.add(3)
+    resolver = UserResolver(client, latency_budget=0.2)
+    guild = FakeGuild({})
+
+    start: float = time.perf_counter()
+    names: tp.Dict[int, str] = asyncio.run(resolver.get_display_names(guild, [1, 2, 3]))
+    assert time.perf_counter() - start < 1.0
+    assert names == {1: 'fetched 1', 2: '2', 3: '3'}
+
+    # Only names that were actually found get cached, so the others get another try next time.
+    client.slow_users.clear()
+    client.missing_users.clear()
+    assert asyncio.run(resolver.get_display_names(guild, [1, 2, 3])) == {1: 'fetched 1', 2: 'fetched 2',
+                                                                         3: 'fetched 3'}
+    assert sorted(client.fetched) == [1, 2, 2, 3, 3]